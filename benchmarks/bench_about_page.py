@@ -0,0 +1,80 @@
+"""Measure the cost per about page of:
+- building the document,
+- looking up the fields with one find per field, as parse_about_page did,
+- extracting the fields with parse_about_page, which indexes the document
+in a single traversal.
+
+Usage:
+    python3 -m benchmarks.bench_about_page
+    python3 -m benchmarks.bench_about_page captured-about-page.html
+"""
+
+from benchmarks.pages import generate_about_page
+from core import common
+from core.facebook_soup_parser import FacebookSoupParser, create_soup
+
+from collections import OrderedDict
+import argparse
+import re
+import time
+
+FIELDS = [
+    'AIM', 'Address', 'BBM', 'Birth Name', 'Birthday',
+    'Facebook', 'Foursquare', 'Gadu-Gadu', 'Gender', 'ICQ',
+    'Instagram', 'Interested in', 'Languages', 'LinkedIn',
+    'Maiden Name', 'Mobile', 'Nickname', 'Political Views',
+    'Religious views', 'Skype', 'Snapchat', 'Twitter', 'VK',
+    'Websites', 'Windows Live Messenger', 'Year of birth']
+
+
+def find_fields_with_separate_scans(soup):
+    soup.find("title")
+    soup.find(href=re.compile(r"^/.*\?v=timeline.lst=\d+%3A\d+%3A"))
+    for field in FIELDS:
+        soup.find("div", attrs={"title": field})
+    for div_id in ["work", "education", "relationship"]:
+        soup.find("div", attrs={"id": div_id})
+
+
+def ms_per_page(function, arguments, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for argument in arguments:
+            function(argument)
+    return round(
+        (time.perf_counter() - start) * 1000 / (repeat * len(arguments)), 3)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        'files', nargs='*',
+        help="Captured about pages, generated if none is passed")
+    parser.add_argument(
+        '-r', dest='repeat', type=int, default=50,
+        help="Number of times every page is processed")
+    args = parser.parse_args()
+
+    if args.files:
+        pages = []
+        for filename in args.files:
+            with open(filename, "r") as f:
+                pages.append(f.read())
+    else:
+        pages = [generate_about_page()]
+
+    documents = [create_soup(page) for page in pages]
+
+    print(common.prettify(OrderedDict([
+        ("pages", len(pages)),
+        ("ms_per_page_building_document",
+            ms_per_page(create_soup, pages, args.repeat)),
+        ("ms_per_page_finding_fields_separately",
+            ms_per_page(
+                find_fields_with_separate_scans, documents, args.repeat)),
+        ("ms_per_page_extracting_fields_in_one_pass",
+            ms_per_page(
+                FacebookSoupParser().parse_about_page, documents,
+                args.repeat))
+    ])))
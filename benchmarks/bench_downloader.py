@@ -0,0 +1,134 @@
+"""Compare connection reuse of Downloader against per-call requests.get.
+
+A local stand-in server counts the TCP connections (and therefore TCP / TLS
+handshakes) it accepts while the same number of pages is fetched with:
+- requests.get, as Downloader used to do,
+- Downloader, which keeps connections alive in a pooled session.
+
+Usage:
+    python3 -m benchmarks.bench_downloader -n 200
+    python3 -m benchmarks.bench_downloader -n 200 \\
+        --certfile cert.pem --keyfile key.pem
+
+A self-signed certificate can be generated with:
+    openssl req -x509 -newkey rsa:2048 -nodes -days 1 -subj /CN=localhost \\
+        -keyout key.pem -out cert.pem
+"""
+
+from core import common
+from core.downloader import Downloader
+
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import requests
+import ssl
+import threading
+import time
+import urllib3
+
+PAGE = b"<html><body>" + b"<a href='/user'>User</a>" * 200 + b"</body></html>"
+
+
+class PageHandler(BaseHTTPRequestHandler):
+
+    # Required for keep-alive
+    protocol_version = "HTTP/1.1"
+    # Avoid delayed ACKs when headers and body are sent separately
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(PAGE)))
+        self.end_headers()
+        self.wfile.write(PAGE)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ConnectionCountingServer(ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.connections = 0
+        self.lock = threading.Lock()
+
+    def get_request(self):
+        request = super().get_request()
+        with self.lock:
+            self.connections += 1
+        return request
+
+
+def start_server(certfile=None, keyfile=None):
+    server = ConnectionCountingServer(("127.0.0.1", 0), PageHandler)
+    scheme = "http"
+    if certfile:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile, keyfile)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        scheme = "https"
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    return server, "{0}://127.0.0.1:{1}/page".format(
+        scheme, server.server_address[1])
+
+
+def run(server, name, fetch, nb_pages):
+    connections_before = server.connections
+    start = time.perf_counter()
+    for _ in range(nb_pages):
+        fetch()
+    elapsed = time.perf_counter() - start
+    connections = server.connections - connections_before
+
+    return OrderedDict([
+        ("name", name),
+        ("pages", nb_pages),
+        ("handshakes", connections),
+        ("handshakes_per_page", connections / nb_pages),
+        ("pages_per_sec", round(nb_pages / elapsed, 1))
+    ])
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '-n', dest='nb_pages', type=int, default=200,
+        help="Number of pages to fetch for every run")
+    parser.add_argument(
+        '--certfile', dest='certfile', action='store',
+        help="Certificate used to serve pages over HTTPS")
+    parser.add_argument(
+        '--keyfile', dest='keyfile', action='store',
+        help="Private key of the certificate")
+    args = parser.parse_args()
+
+    urllib3.disable_warnings()
+    server, url = start_server(args.certfile, args.keyfile)
+
+    # The stand-in server uses a self-signed certificate
+    downloader = Downloader()
+    downloader.session.verify = False
+    downloader.session.trust_env = False
+
+    results = [
+        run(server, "requests.get",
+            lambda: requests.get(
+                url=url, headers=downloader.HEADERS, verify=False),
+            args.nb_pages),
+        run(server, "Downloader",
+            lambda: downloader.fetch_url(cookie="", url=url),
+            args.nb_pages)
+    ]
+
+    server.shutdown()
+
+    print(common.prettify(results))
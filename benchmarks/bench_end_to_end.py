@@ -0,0 +1,177 @@
+"""Run every fetch-* entry point against a local fake Facebook, see
+benchmarks.fake_facebook, and measure for every one of them:
+- the pages fetched per second,
+- the 50th and 99th percentiles of the latency of the requests,
+- the peak resident memory of the process.
+
+Every entry point runs in its own process, with its usual arguments, its
+requests to Facebook being redirected to the fake Facebook.
+
+Usage:
+    python3 -m benchmarks.bench_end_to_end
+    python3 -m benchmarks.bench_end_to_end --latency-ms 50 --workers 4 \\
+        --unavailable-rate 0.05
+"""
+
+from benchmarks import fake_facebook
+from core import common
+from core import downloader
+
+from collections import OrderedDict
+import argparse
+import json
+import logging
+import math
+import os
+import resource
+import runpy
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def get_entry_points(workers, nb_posts):
+    """ Return (entry point, arguments, standard input) for every
+    entry point run."""
+
+    posts = json.dumps([
+        {"post_id": post_id, "like_count": 0}
+        for post_id in range(1, nb_posts + 1)])
+    workers_arguments = ["--workers", str(workers)]
+
+    return [
+        ("fetch-last-active-times", [], ""),
+        ("fetch-friend-list", [], ""),
+        ("fetch-user-infos", ["-u", "username", "-f"] + workers_arguments,
+            ""),
+        ("fetch-timeline-posts", ["-u", "username"] + workers_arguments, ""),
+        ("fetch-likes-for-posts", ["-e"] + workers_arguments, posts),
+    ]
+
+
+def percentile(values, percent):
+    """
+    >>> percentile([3, 1, 2, 4], 50), percentile([3, 1, 2, 4], 99)
+    (2, 4)
+    >>> percentile([], 50)
+    0
+    """
+    if not values:
+        return 0
+    # Nearest rank
+    values = sorted(values)
+    return values[max(0, math.ceil(len(values) * percent / 100) - 1)]
+
+
+def run_entry_point(entry_point, arguments, server_url, metrics_filepath):
+    """ Run the entry point in this process, its requests being sent to the
+    server at server_url, and write its metrics to metrics_filepath."""
+
+    latencies = []
+    statuses = []
+    lock = threading.Lock()
+
+    def record(response, *args, **kwargs):
+        with lock:
+            latencies.append(response.elapsed.total_seconds())
+            statuses.append(response.status_code)
+
+    create_session = downloader.create_session
+
+    def create_redirected_session(pool_size):
+        session = create_session(pool_size)
+        fake_facebook.redirect_session(session, server_url, pool_size)
+        session.hooks["response"].append(record)
+        return session
+
+    downloader.create_session = create_redirected_session
+    common.load_config = lambda: common.Config(
+        caching_secs=-1, cookie_c_user="123", cookie_datr="456",
+        cookie_xs="abc", logging_level=logging.ERROR)
+
+    sys.argv = [entry_point] + arguments
+    start = time.perf_counter()
+    try:
+        runpy.run_path(
+            os.path.join(ROOT_DIR, entry_point), run_name="__main__")
+    except SystemExit:
+        pass
+    elapsed = time.perf_counter() - start
+
+    pages = statuses.count(200)
+    with open(metrics_filepath, "w") as f:
+        json.dump(OrderedDict([
+            ("entry_point", entry_point),
+            ("requests", len(statuses)),
+            ("pages", pages),
+            ("secs", round(elapsed, 2)),
+            ("pages_per_sec", round(pages / elapsed, 1) if elapsed else 0),
+            ("latency_ms_p50", round(percentile(latencies, 50) * 1000, 1)),
+            ("latency_ms_p99", round(percentile(latencies, 99) * 1000, 1)),
+            # Kilobytes on Linux
+            ("peak_rss_mb", round(
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                1))
+        ]), f)
+
+
+def run_in_process(entry_point, arguments, stdin, server_url):
+    """ Run the entry point in a new process, return its metrics."""
+
+    with tempfile.NamedTemporaryFile(suffix=".json") as metrics_file:
+        subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_end_to_end",
+             "--run", entry_point, "--server-url", server_url,
+             "--metrics", metrics_file.name, "--"] + arguments,
+            input=stdin.encode(), stdout=subprocess.DEVNULL,
+            cwd=ROOT_DIR, check=True)
+        return json.load(metrics_file, object_pairs_hook=OrderedDict)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    fake_facebook.add_server_arguments(parser)
+    parser.add_argument(
+        '--workers', dest='workers', type=int, default=1,
+        help="--workers passed to the entry points supporting it")
+    parser.add_argument(
+        '--posts', dest='nb_posts', type=int, default=10,
+        help="Number of posts passed to fetch-likes-for-posts")
+    parser.add_argument(
+        '--entry-point', dest='entry_points', action='append',
+        help="Only run this entry point, can be repeated")
+    # Used to run a single entry point in its own process
+    parser.add_argument('--run', dest='run', help=argparse.SUPPRESS)
+    parser.add_argument(
+        '--server-url', dest='server_url', help=argparse.SUPPRESS)
+    parser.add_argument('--metrics', dest='metrics', help=argparse.SUPPRESS)
+    parser.add_argument(
+        'arguments', nargs='*', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run_entry_point(
+            args.run, args.arguments, args.server_url, args.metrics)
+        sys.exit(0)
+
+    server = fake_facebook.create_server(args).start()
+
+    results = []
+    for entry_point, arguments, stdin in get_entry_points(
+            args.workers, args.nb_posts):
+        if args.entry_points and entry_point not in args.entry_points:
+            continue
+        results.append(
+            run_in_process(entry_point, arguments, stdin, server.url))
+
+    server.shutdown()
+
+    print(common.prettify(OrderedDict([
+        ("results", results),
+        ("server_requests", server.get_stats())
+    ])))
@@ -0,0 +1,136 @@
+"""Measure the CPU time of a large friends crawl, logging at ERROR level,
+when log messages are:
+- formatted eagerly, as when messages were built with str.format, whole
+friend lists being serialized whether they are logged or not,
+- formatted lazily by logging, only when they are emitted.
+
+Pages are served and parsed by fakes, so that only the crawl itself and its
+logging are measured.
+
+Usage:
+    python3 -m benchmarks.bench_lazy_logging
+    python3 -m benchmarks.bench_lazy_logging -p 200 -n 100
+"""
+
+from core import common
+from core.facebook_fetcher import FacebookFetcher
+from core.facebook_soup_parser import GenericResult
+
+from collections import OrderedDict
+from contextlib import contextmanager
+import argparse
+import logging
+import time
+
+LOGGING_FUNCTIONS = ["debug", "info", "warn", "warning", "error"]
+
+
+class FakeResponse:
+
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeDownloader:
+    """ Return the url requested as the content of the page."""
+
+    def fetch_url(self, cookie, url, timeout_secs=15, retries=1):
+        return FakeResponse(url)
+
+
+class FakeFriendsParser:
+    """ Return nb_friends friends for every page, and a link to the next
+    page until nb_pages pages are returned."""
+
+    def __init__(self, nb_pages, nb_friends):
+        self.nb_pages = nb_pages
+        self.nb_friends = nb_friends
+        self.pages_parsed = 0
+
+    def parse_friends_page(self, content):
+        page_no = self.pages_parsed
+        self.pages_parsed += 1
+
+        friends = OrderedDict(
+            ("username{0}?fref=fr_tab".format(
+                page_no * self.nb_friends + i),
+             "Friend {0}".format(page_no * self.nb_friends + i))
+            for i in range(self.nb_friends))
+        see_more_links = []
+        if self.pages_parsed < self.nb_pages:
+            see_more_links.append(
+                "/friends?startindex={0}".format(self.pages_parsed))
+
+        return GenericResult(
+            content=OrderedDict([("friends", friends)]),
+            see_more_links=see_more_links)
+
+
+@contextmanager
+def eager_logging():
+    """ Format every log message when logged, even if it is not emitted."""
+
+    functions = {
+        name: getattr(logging, name) for name in LOGGING_FUNCTIONS}
+
+    def make_eager(function):
+        def log(msg, *args, **kwargs):
+            return function(msg % args if args else msg, **kwargs)
+        return log
+
+    for name, function in functions.items():
+        setattr(logging, name, make_eager(function))
+    try:
+        yield
+    finally:
+        for name, function in functions.items():
+            setattr(logging, name, function)
+
+
+def crawl_cpu_secs(nb_pages, nb_friends, repeat):
+    config = common.Config(
+        caching_secs=-1, cookie_c_user="123", cookie_datr="456",
+        cookie_xs="abc", logging_level=logging.ERROR)
+
+    start = time.process_time()
+    for _ in range(repeat):
+        fb_fetcher = FacebookFetcher(
+            FakeDownloader(), FakeFriendsParser(nb_pages, nb_friends),
+            config)
+        friend_list = fb_fetcher.fetch_user_friend_list()
+    secs = (time.process_time() - start) / repeat
+
+    assert len(friend_list) == nb_pages * nb_friends
+    return secs
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '-p', dest='nb_pages', type=int, default=100,
+        help="Number of friends pages crawled")
+    parser.add_argument(
+        '-n', dest='nb_friends', type=int, default=50,
+        help="Number of friends per page")
+    parser.add_argument(
+        '-r', dest='repeat', type=int, default=5,
+        help="Number of times the crawl is run")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+
+    with eager_logging():
+        secs_eager = crawl_cpu_secs(
+            args.nb_pages, args.nb_friends, args.repeat)
+    secs_lazy = crawl_cpu_secs(args.nb_pages, args.nb_friends, args.repeat)
+
+    print(common.prettify(OrderedDict([
+        ("pages", args.nb_pages),
+        ("friends", args.nb_pages * args.nb_friends),
+        ("cpu_ms_per_crawl_eager_logging", round(secs_eager * 1000, 2)),
+        ("cpu_ms_per_crawl_lazy_logging", round(secs_lazy * 1000, 2)),
+        ("cpu_saved_percent",
+            round((1 - secs_lazy / secs_eager) * 100, 1) if secs_eager
+            else 0.0)
+    ])))
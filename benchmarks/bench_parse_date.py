@@ -0,0 +1,146 @@
+"""Measure the time to parse the dates of posts (date_org) with:
+- the previous parse_date: strptime, then dateutil, then relative dates,
+- model.parse_date: fast paths and a cache of absolute dates,
+and check that both return the same dates.
+
+Usage:
+    python3 -m benchmarks.bench_parse_date
+    ./fetch-timeline-posts -u zuck > posts.json
+    python3 -m benchmarks.bench_parse_date posts.json
+"""
+
+from benchmarks.pages import DATES
+from core import common
+from core import model
+
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from dateutil import parser
+import argparse
+import logging
+import time
+
+
+def previous_parse_date(date_str):
+
+    try:
+        return datetime.strptime(date_str, "%d %B %Y at %H:%M")
+
+    except Exception:
+
+        logging.info("Parsing date: {0} - date incomplete".format(date_str))
+        try:
+            return parser.parse(
+                date_str, default=datetime(
+                    year=datetime.now().year, month=1, day=1))
+
+        except Exception:
+
+            relative_time = model.parse_relative_time(date_str)
+            if relative_time:
+                return datetime.now() - relative_time
+
+            fuzzy_t = model.parse_fuzzy_time(date_str)
+            if fuzzy_t:
+                fuzzy_time = fuzzy_t[0]
+                delta = fuzzy_t[1]
+                return datetime.now().replace(
+                    hour=fuzzy_time.hour,
+                    minute=fuzzy_time.minute,
+                    second=fuzzy_time.second) - delta
+
+            else:
+                logging.error("Failed to parse date: {0}".format(date_str))
+                return datetime.now()
+
+
+def find_date_orgs(decoded_json):
+    """ Return all the date_org values found, e.g. in the output of
+    fetch-timeline-posts."""
+
+    date_orgs = []
+    if isinstance(decoded_json, dict):
+        for key, value in decoded_json.items():
+            if key == "date_org":
+                date_orgs.append(value)
+            else:
+                date_orgs += find_date_orgs(value)
+    elif isinstance(decoded_json, list):
+        for value in decoded_json:
+            date_orgs += find_date_orgs(value)
+    return date_orgs
+
+
+def generate_date_orgs(nb_dates):
+    """ Dates as shown on timelines: mostly absolute dates, several posts
+    sharing the same day, and a few recent posts with relative dates."""
+
+    months = list(model.MONTH_NUMBERS)
+    date_orgs = []
+    for i in range(nb_dates):
+        if i % 10 == 0:
+            date_orgs.append(DATES[i // 10 % len(DATES)])
+        else:
+            date_orgs.append("{0} {1} {2} at {3}:{4:02}".format(
+                i // 3 % 28 + 1, months[i // 84 % 12], 2008 + i // 1008 % 10,
+                i % 24, i % 60))
+    return date_orgs
+
+
+def same_dates(date, expected_date):
+    # Relative dates depend on the time of parsing
+    return abs(date - expected_date) < timedelta(seconds=1)
+
+
+def secs_per_date(parse_function, date_orgs, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for date_org in date_orgs:
+            parse_function(date_org)
+    return (time.perf_counter() - start) / (repeat * len(date_orgs))
+
+
+if __name__ == "__main__":
+
+    parser_args = argparse.ArgumentParser()
+    parser_args.add_argument(
+        'files', nargs='*',
+        help="JSON files containing date_org values, e.g. output of "
+             "fetch-timeline-posts, a corpus is generated if none is passed")
+    parser_args.add_argument(
+        '-n', dest='nb_dates', type=int, default=10000,
+        help="Number of dates generated")
+    parser_args.add_argument(
+        '-r', dest='repeat', type=int, default=3,
+        help="Number of times every date is parsed")
+    args = parser_args.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+
+    if args.files:
+        date_orgs = []
+        for filename in args.files:
+            date_orgs += find_date_orgs(common.load_json_from_file(filename))
+    else:
+        date_orgs = generate_date_orgs(args.nb_dates)
+
+    for date_org in date_orgs:
+        if not same_dates(
+                model.parse_date(date_org), previous_parse_date(date_org)):
+            raise RuntimeError(
+                "Dates differ for date_org '{0}'".format(date_org))
+
+    model.parse_absolute_date.cache_clear()
+    secs_per_date_before = secs_per_date(
+        previous_parse_date, date_orgs, args.repeat)
+    secs_per_date_after = secs_per_date(
+        model.parse_date, date_orgs, args.repeat)
+
+    print(common.prettify(OrderedDict([
+        ("dates", len(date_orgs)),
+        ("distinct_dates", len(set(date_orgs))),
+        ("us_per_date_before", round(secs_per_date_before * 1e6, 2)),
+        ("us_per_date_after", round(secs_per_date_after * 1e6, 2)),
+        ("speedup", round(secs_per_date_before / secs_per_date_after, 2)),
+        ("cache", model.parse_absolute_date.cache_info()._asdict())
+    ])))
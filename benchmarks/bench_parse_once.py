@@ -0,0 +1,76 @@
+"""Measure parsing time per timeline page, as processed by
+FacebookFetcher.fetch_articles_from_timeline (year links + posts), when:
+- every parse_* call builds its own document,
+- parse_* calls share the document of the page.
+
+Usage:
+    python3 -m benchmarks.bench_parse_once
+    python3 -m benchmarks.bench_parse_once captured-page1.html ...
+"""
+
+from benchmarks.pages import generate_timeline_page
+from core import common
+from core.facebook_soup_parser import FacebookSoupParser, create_soup
+
+from collections import OrderedDict
+import argparse
+import logging
+import time
+
+
+def process_timeline_page(fb_parser, content):
+    fb_parser.parse_timeline_years_links(content)
+    fb_parser.parse_timeline_page(content)
+
+
+def time_per_page(pages, create_parser, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for page in pages:
+            process_timeline_page(create_parser(), page)
+    return (time.perf_counter() - start) / (repeat * len(pages))
+
+
+class UncachedFacebookSoupParser(FacebookSoupParser):
+    """ Parser building a new document for every parse_* call."""
+
+    def parse_document(self, content):
+        return create_soup(content)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        'files', nargs='*',
+        help="Captured timeline pages, generated if none is passed")
+    parser.add_argument(
+        '-a', dest='nb_articles', type=int, default=100,
+        help="Number of posts per generated page")
+    parser.add_argument(
+        '-r', dest='repeat', type=int, default=5,
+        help="Number of times every page is processed")
+    args = parser.parse_args()
+
+    # Parsing posts logs at info level
+    logging.basicConfig(level=logging.ERROR)
+
+    if args.files:
+        pages = []
+        for filename in args.files:
+            with open(filename, "r") as f:
+                pages.append(f.read())
+    else:
+        pages = [generate_timeline_page(nb_articles=args.nb_articles)]
+
+    secs_per_page_before = time_per_page(
+        pages, UncachedFacebookSoupParser, args.repeat)
+    secs_per_page_after = time_per_page(
+        pages, FacebookSoupParser, args.repeat)
+
+    print(common.prettify(OrderedDict([
+        ("pages", len(pages)),
+        ("ms_per_page_parsing_twice", round(secs_per_page_before * 1000, 2)),
+        ("ms_per_page_parsing_once", round(secs_per_page_after * 1000, 2)),
+        ("speedup", round(secs_per_page_before / secs_per_page_after, 2))
+    ])))
@@ -0,0 +1,99 @@
+"""Measure the number of pages parsed per second by FacebookSoupParser and
+FacebookLxmlParser, processing timeline, friends and reaction pages as
+FacebookFetcher does, and check that both return the same results.
+
+Usage:
+    python3 -m benchmarks.bench_parser_backends
+    python3 -m benchmarks.bench_parser_backends -r 20
+"""
+
+from benchmarks.pages import generate_friends_page, \
+    generate_reaction_page, generate_timeline_page
+from core import common
+from core.facebook_lxml_parser import FacebookLxmlParser
+from core.facebook_soup_parser import FacebookSoupParser, TimelineResult
+
+from collections import OrderedDict
+import argparse
+import logging
+import time
+
+
+def process_timeline_page(fb_parser, content):
+    return (
+        fb_parser.parse_timeline_years_links(content),
+        fb_parser.parse_timeline_page(content))
+
+
+def process_friends_page(fb_parser, content):
+    return fb_parser.parse_friends_page(content)
+
+
+def process_reaction_page(fb_parser, content):
+    return fb_parser.parse_reaction_page(content)
+
+
+def without_dates(result):
+    """ Dates of posts with a relative date, e.g. "3 hrs", depend on the
+    time of parsing."""
+    if isinstance(result, tuple) and isinstance(result[-1], TimelineResult):
+        return result[:-1] + (
+            [[(key, value) for key, value in post.items() if key != "date"]
+                for post in result[-1].articles.values()],
+            result[-1].show_more_link)
+    return result
+
+
+def pages_per_sec(create_parser, process_page, pages, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for page in pages:
+            process_page(create_parser(), page)
+    return repeat * len(pages) / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '-n', dest='nb_items', type=int, default=100,
+        help="Number of posts, friends or likers per generated page")
+    parser.add_argument(
+        '-r', dest='repeat', type=int, default=5,
+        help="Number of times every page is processed")
+    args = parser.parse_args()
+
+    # Parsing posts logs at info level
+    logging.basicConfig(level=logging.ERROR)
+
+    benchmarks = [
+        ("timeline", process_timeline_page,
+            [generate_timeline_page(nb_articles=args.nb_items)]),
+        ("friends", process_friends_page,
+            [generate_friends_page(nb_friends=args.nb_items)]),
+        ("reactions", process_reaction_page,
+            [generate_reaction_page(nb_likers=args.nb_items)])
+    ]
+
+    results = OrderedDict()
+    for name, process_page, pages in benchmarks:
+
+        for page in pages:
+            if without_dates(process_page(FacebookSoupParser(), page)) != \
+               without_dates(process_page(FacebookLxmlParser(), page)):
+                raise RuntimeError(
+                    "Parsers returned different results for "
+                    "{0} pages".format(name))
+
+        soup_pages_per_sec = pages_per_sec(
+            FacebookSoupParser, process_page, pages, args.repeat)
+        lxml_pages_per_sec = pages_per_sec(
+            FacebookLxmlParser, process_page, pages, args.repeat)
+
+        results[name] = OrderedDict([
+            ("soup_pages_per_sec", round(soup_pages_per_sec, 2)),
+            ("lxml_pages_per_sec", round(lxml_pages_per_sec, 2)),
+            ("speedup", round(lxml_pages_per_sec / soup_pages_per_sec, 2))
+        ])
+
+    print(common.prettify(results))
@@ -0,0 +1,71 @@
+"""Measure the number of timeline pages parsed per second by threads
+parsing pages themselves, and by threads handing pages to a pool of
+processes, as the threads of AsyncFacebookFetcher do with --parsing-processes.
+
+Usage:
+    python3 -m benchmarks.bench_parsing_pool
+    python3 -m benchmarks.bench_parsing_pool -p 8 -t 16 -n 64
+"""
+
+from benchmarks.pages import generate_timeline_page
+from core import common
+from core.facebook_soup_parser import FacebookSoupParser
+from core.parsing_pool import ProcessPoolParser
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import logging
+import os
+import time
+
+
+def pages_per_sec(fb_parser, pages, threads):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        list(executor.map(fb_parser.parse_timeline_page, pages))
+    return len(pages) / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '-p', dest='processes', type=int, default=os.cpu_count(),
+        help="Number of parsing processes")
+    parser.add_argument(
+        '-t', dest='threads', type=int, default=2 * os.cpu_count(),
+        help="Number of threads handing pages to the parser")
+    parser.add_argument(
+        '-n', dest='nb_pages', type=int, default=4 * os.cpu_count(),
+        help="Number of pages parsed")
+    args = parser.parse_args()
+
+    # Parsing posts logs at info level
+    logging.basicConfig(level=logging.ERROR)
+
+    # Different pages, so that parsers cannot reuse the last document
+    pages = [
+        generate_timeline_page(nb_articles=50, first_post_id=i * 100)
+        for i in range(args.nb_pages)]
+
+    pool_parser = ProcessPoolParser(FacebookSoupParser, args.processes)
+    # Start the processes before measuring
+    pages_per_sec(pool_parser, pages[:args.processes], args.processes)
+
+    threads_pages_per_sec = pages_per_sec(
+        FacebookSoupParser(), pages, args.threads)
+    processes_pages_per_sec = pages_per_sec(
+        pool_parser, pages, args.threads)
+    pool_parser.shutdown()
+
+    print(common.prettify(OrderedDict([
+        ("processes", args.processes),
+        ("threads", args.threads),
+        ("pages", len(pages)),
+        ("pages_per_sec_parsed_in_threads",
+            round(threads_pages_per_sec, 2)),
+        ("pages_per_sec_parsed_in_processes",
+            round(processes_pages_per_sec, 2)),
+        ("speedup", round(processes_pages_per_sec / threads_pages_per_sec, 2))
+    ])))
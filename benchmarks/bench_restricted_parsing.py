@@ -0,0 +1,71 @@
+"""Measure parsing time per reaction, friends and mutual friends page when:
+- the whole document is built,
+- only the objects_container subtree is built.
+
+Usage:
+    python3 -m benchmarks.bench_restricted_parsing
+    python3 -m benchmarks.bench_restricted_parsing -n 10 -r 50
+"""
+
+from benchmarks.pages import generate_friends_page, generate_reaction_page
+from core import common
+from core.facebook_soup_parser import FacebookSoupParser
+
+from collections import OrderedDict
+import argparse
+import time
+
+
+def time_per_page(parsing_function, page, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        parsing_function(page)
+    return (time.perf_counter() - start) / repeat
+
+
+class FullDocumentFacebookSoupParser(FacebookSoupParser):
+    """ Parser building the whole document of every page."""
+
+    def find_objects_container(self, content):
+        return self.parse_document(content).find(id="objects_container")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '-n', dest='nb_items', type=int, default=50,
+        help="Number of friends or likers per generated page")
+    parser.add_argument(
+        '-r', dest='repeat', type=int, default=20,
+        help="Number of times every page is processed")
+    args = parser.parse_args()
+
+    benchmarks = [
+        ("reactions", "parse_reaction_page",
+            generate_reaction_page(nb_likers=args.nb_items)),
+        ("friends", "parse_friends_page",
+            generate_friends_page(nb_friends=args.nb_items))
+    ]
+
+    results = OrderedDict()
+    for name, method_name, page in benchmarks:
+
+        # New parsers, so that pages are not found in their cache
+        secs_per_page_before = time_per_page(
+            lambda page: getattr(
+                FullDocumentFacebookSoupParser(), method_name)(page),
+            page, args.repeat)
+        secs_per_page_after = time_per_page(
+            lambda page: getattr(FacebookSoupParser(), method_name)(page),
+            page, args.repeat)
+
+        results[name] = OrderedDict([
+            ("ms_per_page_full_document",
+                round(secs_per_page_before * 1000, 2)),
+            ("ms_per_page_objects_container",
+                round(secs_per_page_after * 1000, 2)),
+            ("speedup", round(secs_per_page_before / secs_per_page_after, 2))
+        ])
+
+    print(common.prettify(results))
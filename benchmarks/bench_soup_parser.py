@@ -0,0 +1,183 @@
+"""Measure every parsing method of FacebookSoupParser, and
+detect_error_type, on generated pages of configurable size: operations per
+second, and memory allocated per operation (peak, and retained once the
+operation returns, i.e. its result).
+
+Results can be saved and passed as a baseline to a later run, e.g. on
+another commit, to compare the operations per second.
+
+Usage:
+    python3 -m benchmarks.bench_soup_parser
+    python3 -m benchmarks.bench_soup_parser --timeline-sizes 10,100 \\
+        --only timeline --output before.json
+    python3 -m benchmarks.bench_soup_parser --baseline before.json
+"""
+
+from benchmarks.pages import generate_about_page, generate_buddy_feed, \
+    generate_friends_page, generate_likes_page, generate_login_page, \
+    generate_reaction_page, generate_timeline_page
+from core import common
+from core.facebook_soup_parser import FacebookSoupParser, create_soup, \
+    detect_error_type
+
+from collections import OrderedDict
+import argparse
+import itertools
+import logging
+import time
+import tracemalloc
+
+
+def create_benchmarks(args):
+    """ Return (name, operation) for every benchmark, every operation
+    processing one page, or one post for parse_post.
+
+    Pages are parsed by a new parser every time, so that documents are not
+    found in the cache of the parser."""
+
+    benchmarks = []
+    for nb_articles in args.timeline_sizes:
+        page = generate_timeline_page(nb_articles=nb_articles)
+        benchmarks.append((
+            "parse_timeline_page_{0}_posts".format(nb_articles),
+            lambda page=page: FacebookSoupParser().parse_timeline_page(page)))
+
+    timeline_page = generate_timeline_page(nb_articles=10)
+    articles = itertools.cycle(
+        create_soup(generate_timeline_page(nb_articles=100)).find_all(
+            "article"))
+    reaction_page = generate_reaction_page(nb_likers=args.nb_likers)
+    friends_page = generate_friends_page(nb_friends=args.nb_friends)
+    likes_page = generate_likes_page()
+    about_page = generate_about_page(all_fields=True)
+    buddy_feed = generate_buddy_feed(nb_buddies=args.nb_buddies)
+    login_page = generate_login_page()
+
+    return benchmarks + [
+        ("parse_timeline_years_links",
+            lambda: FacebookSoupParser().parse_timeline_years_links(
+                timeline_page)),
+        ("parse_post",
+            lambda: FacebookSoupParser().parse_post(next(articles))),
+        ("parse_reaction_page_{0}_likers".format(args.nb_likers),
+            lambda: FacebookSoupParser().parse_reaction_page(reaction_page)),
+        ("parse_friends_page_{0}_friends".format(args.nb_friends),
+            lambda: FacebookSoupParser().parse_friends_page(friends_page)),
+        ("parse_mutual_friends_page_{0}_friends".format(args.nb_friends),
+            lambda: FacebookSoupParser().parse_mutual_friends_page(
+                friends_page)),
+        ("parse_likes_page",
+            lambda: FacebookSoupParser().parse_likes_page(likes_page)),
+        ("parse_about_page_all_fields",
+            lambda: FacebookSoupParser().parse_about_page(about_page)),
+        ("parse_buddy_list_{0}_users".format(args.nb_buddies),
+            lambda: FacebookSoupParser().parse_buddy_list(buddy_feed)),
+        ("parse_document",
+            lambda: FacebookSoupParser().parse_document(timeline_page)),
+        ("detect_error_type_login_page",
+            lambda: detect_error_type(login_page)),
+        ("detect_error_type_timeline_page",
+            lambda: detect_error_type(timeline_page)),
+    ]
+
+
+def ops_per_sec(operation, min_secs):
+    """ Run operation for at least min_secs, return the operations run per
+    second."""
+
+    nb_ops = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_secs or not nb_ops:
+        operation()
+        nb_ops += 1
+        elapsed = time.perf_counter() - start
+    return nb_ops / elapsed
+
+
+def allocated_kb(operation):
+    """ Return the peak memory allocated by operation, and the memory still
+    allocated once it returned, in kilobytes."""
+
+    tracemalloc.start()
+    try:
+        result = operation()
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return round(peak / 1024, 1), round(retained / 1024, 1)
+
+
+def parse_sizes(value):
+    """
+    >>> parse_sizes("10,100,1000")
+    [10, 100, 1000]
+    """
+    return [int(size) for size in value.split(",")]
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--timeline-sizes', dest='timeline_sizes', type=parse_sizes,
+        default=[10, 100, 1000],
+        help="Number of posts of the timeline pages, comma separated")
+    parser.add_argument(
+        '--likers', dest='nb_likers', type=int, default=500,
+        help="Number of likers of the reaction page")
+    parser.add_argument(
+        '--friends', dest='nb_friends', type=int, default=36,
+        help="Number of friends of the friends page")
+    parser.add_argument(
+        '--buddies', dest='nb_buddies', type=int, default=100,
+        help="Number of users of the buddy feed")
+    parser.add_argument(
+        '--min-secs', dest='min_secs', type=float, default=0.5,
+        help="Minimum time every benchmark runs")
+    parser.add_argument(
+        '--only', dest='only', action='append',
+        help="Only run the benchmarks whose name contains this, "
+             "can be repeated")
+    parser.add_argument(
+        '--output', dest='output', action='store',
+        help="Save the results to this file, to be used as a baseline")
+    parser.add_argument(
+        '--baseline', dest='baseline', action='store',
+        help="Results of a previous run, the speedup against them is added")
+    args = parser.parse_args()
+
+    # Parsing posts logs at info level
+    logging.basicConfig(level=logging.ERROR)
+
+    baseline = {}
+    if args.baseline:
+        baseline = common.load_json_from_file(args.baseline)
+
+    results = OrderedDict()
+    for name, operation in create_benchmarks(args):
+        if args.only and not any(only in name for only in args.only):
+            continue
+
+        # Warm up caches shared by parsers, e.g. parsed dates
+        operation()
+        ops = ops_per_sec(operation, args.min_secs)
+        peak_kb, retained_kb = allocated_kb(operation)
+
+        result = OrderedDict([
+            ("ops_per_sec", round(ops, 1)),
+            ("us_per_op", round(1e6 / ops, 1)),
+            ("peak_allocated_kb", peak_kb),
+            ("retained_allocated_kb", retained_kb)
+        ])
+        if name in baseline:
+            result["speedup"] = round(
+                ops / baseline[name]["ops_per_sec"], 2)
+        results[name] = result
+
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(common.prettify(results))
+
+    print(common.prettify(results))
@@ -0,0 +1,297 @@
+"""A local stand-in for the mobile version of Facebook, serving generated
+friends, about, timeline, reaction and buddy feed pages, with configurable
+latency and errors, so that the fetchers can be run end to end.
+
+Requests sent by a Downloader to Facebook hosts are sent to the server
+instead once its session is redirected, see redirect_session.
+
+Usage:
+    python3 -m benchmarks.fake_facebook --latency-ms 50 --port 8080
+"""
+
+from benchmarks.pages import generate_about_page, generate_friends_page, \
+    generate_reaction_page, generate_timeline_page
+
+from collections import Counter, OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from requests.adapters import HTTPAdapter
+from urllib.parse import parse_qs, urlsplit, urlunsplit
+import argparse
+import json
+import random
+import threading
+import time
+
+FACEBOOK_HOSTS = [
+    "https://mbasic.facebook.com", "https://5-edge-chat.facebook.com"]
+
+REACTIONS_PATH = "/ufi/reaction/profile/browser/fetch/"
+
+
+class Site:
+    """ Size of what the server serves: every timeline has a chain of
+    pages_per_chain pages from its first page, and from every one of its
+    nb_years years."""
+
+    def __init__(self, nb_friends=500, friends_per_page=36, nb_years=5,
+                 pages_per_chain=3, posts_per_page=10, likers_per_post=1000,
+                 nb_buddies=100):
+        self.nb_friends = nb_friends
+        self.friends_per_page = friends_per_page
+        self.nb_years = nb_years
+        self.pages_per_chain = pages_per_chain
+        self.posts_per_page = posts_per_page
+        self.likers_per_post = likers_per_post
+        self.nb_buddies = nb_buddies
+
+    def get_page(self, path, query):
+        """ Return (url class, page) for the path and query string
+        requested, page being None if nothing is served there.
+
+        >>> site = Site(nb_friends=5, friends_per_page=3)
+        >>> url_class, page = site.get_page(
+        ...     "/profile.php", "v=friends&id=123")
+        >>> url_class, page.count("fref=fr_tab"), "startindex=3" in page
+        ('friends', 3, True)
+        >>> "m_more_friends" in site.get_page(
+        ...     "/username/friends", "startindex=3")[1]
+        False
+        >>> site.get_page("/username", "v=likes")
+        ('other', None)
+        """
+        parameters = {
+            key: values[0] for key, values in parse_qs(query).items()}
+
+        if path == "/pull":
+            return "buddy_feed", self.get_buddy_feed()
+        if path == REACTIONS_PATH:
+            return "reactions", self.get_reaction_page(parameters)
+        if parameters.get("v") == "friends" or path.endswith("/friends"):
+            return "friends", self.get_friends_page(parameters)
+        if parameters.get("v") == "info" or path.endswith("/about"):
+            return "about", generate_about_page()
+        if parameters.get("v") == "timeline":
+            return "timeline", self.get_timeline_page(path, parameters)
+        return "other", None
+
+    def get_buddy_feed(self):
+        now = int(time.time())
+        buddy_list = OrderedDict(
+            (str(1000 + i), {"lat": now - i * 60})
+            for i in range(self.nb_buddies))
+        return "for (;;); " + json.dumps({
+            "ms": [{"type": "chatproxy-presence", "buddyList": buddy_list}],
+            "t": "msg", "seq": 1})
+
+    def get_friends_page(self, parameters):
+        start = int(parameters.get("startindex", 0))
+        end = min(self.nb_friends, start + self.friends_per_page)
+        see_more_link = None
+        if end < self.nb_friends and parameters.get("mutual") != "1":
+            see_more_link = "/username/friends?startindex={0}".format(end)
+        return generate_friends_page(
+            end - start, first_friend_id=start, see_more_link=see_more_link)
+
+    def get_timeline_page(self, path, parameters):
+        timeline_link = path + "?v=timeline"
+        if "id" in parameters:
+            timeline_link = path + "?id={0}&v=timeline".format(
+                parameters["id"])
+
+        year = parameters.get("timecutoff")
+        cursor = int(parameters.get("cursor", 0))
+        chain_link = timeline_link
+        if year:
+            chain_link += "&timecutoff=" + year
+
+        show_more_link = None
+        if cursor + 1 < self.pages_per_chain:
+            show_more_link = chain_link + "&cursor={0}".format(cursor + 1)
+
+        chain_no = 2019 - int(year) if year else 0
+        return generate_timeline_page(
+            nb_articles=self.posts_per_page,
+            nb_years=0 if year or cursor else self.nb_years,
+            first_post_id=(chain_no * self.pages_per_chain + cursor) *
+            self.posts_per_page + 1,
+            show_more_link=show_more_link,
+            year_link=timeline_link + "&timecutoff={0}")
+
+    def get_reaction_page(self, parameters):
+        post_id = int(parameters.get("ft_ent_identifier", 1))
+        shown = int(parameters.get("shown_ids", 0))
+        limit = int(parameters.get("limit", 10))
+        nb_likers = max(0, min(limit, self.likers_per_post - shown))
+
+        see_more_link = None
+        if shown + nb_likers < self.likers_per_post:
+            see_more_link = (
+                REACTIONS_PATH + "?limit=10&shown_ids={0}&total_count={1}&"
+                "ft_ent_identifier={2}".format(
+                    shown + nb_likers, self.likers_per_post, post_id))
+        return generate_reaction_page(
+            nb_likers, post_id, first_liker_id=post_id * 100000 + shown,
+            see_more_link=see_more_link)
+
+
+class FakeFacebookHandler(BaseHTTPRequestHandler):
+
+    # Required for keep-alive
+    protocol_version = "HTTP/1.1"
+    # Avoid delayed ACKs when headers and body are sent separately
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        server = self.server
+        parts = urlsplit(self.path)
+        url_class, page = server.site.get_page(parts.path, parts.query)
+
+        if server.latency_secs:
+            time.sleep(server.latency_secs)
+
+        status = 200 if page is not None else 404
+        headers = {}
+        draw = server.draw()
+        if draw < server.error_rate:
+            status, page = 500, "Internal Server Error"
+        elif draw < server.error_rate + server.unavailable_rate:
+            status, page = 503, "Service Unavailable"
+            headers["Retry-After"] = str(server.retry_after_secs)
+        server.count(url_class, status)
+
+        body = (page or "Not Found").encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeFacebookServer(ThreadingHTTPServer):
+    """ Serve the pages of site, after latency_secs, a fraction error_rate
+    of the requests failing with a 500 error and a fraction
+    unavailable_rate with a 503 error and a Retry-After header."""
+
+    daemon_threads = True
+
+    def __init__(self, site=None, latency_secs=0.0, error_rate=0.0,
+                 unavailable_rate=0.0, retry_after_secs=0, seed=0,
+                 address=("127.0.0.1", 0)):
+        super().__init__(address, FakeFacebookHandler)
+        self.site = site or Site()
+        self.latency_secs = latency_secs
+        self.error_rate = error_rate
+        self.unavailable_rate = unavailable_rate
+        self.retry_after_secs = retry_after_secs
+        self.random = random.Random(seed)
+        self.requests = Counter()
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return "http://{0}:{1}".format(*self.server_address)
+
+    def draw(self):
+        with self.lock:
+            return self.random.random()
+
+    def count(self, url_class, status):
+        with self.lock:
+            self.requests["{0} {1}".format(url_class, status)] += 1
+
+    def get_stats(self):
+        """ Return the number of requests per url class and status."""
+
+        with self.lock:
+            return OrderedDict(sorted(self.requests.items()))
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+
+class RedirectingAdapter(HTTPAdapter):
+    """ Send the requests to the server at server_url instead."""
+
+    def __init__(self, server_url, **kwargs):
+        super().__init__(**kwargs)
+        self.server = urlsplit(server_url)
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        request.url = urlunsplit((
+            self.server.scheme, self.server.netloc, parts.path, parts.query,
+            ""))
+        return super().send(request, **kwargs)
+
+
+def redirect_session(session, server_url, pool_size=10):
+    """ Send the requests of session to Facebook hosts to the server at
+    server_url."""
+
+    adapter = RedirectingAdapter(server_url, pool_maxsize=pool_size)
+    for host in FACEBOOK_HOSTS:
+        session.mount(host, adapter)
+
+
+def add_server_arguments(parser):
+    parser.add_argument(
+        '--latency-ms', dest='latency_ms', type=float, default=0,
+        help="Time the server takes to answer every request")
+    parser.add_argument(
+        '--error-rate', dest='error_rate', type=float, default=0,
+        help="Fraction of requests failing with a 500 error")
+    parser.add_argument(
+        '--unavailable-rate', dest='unavailable_rate', type=float, default=0,
+        help="Fraction of requests failing with a 503 error")
+    parser.add_argument(
+        '--retry-after', dest='retry_after_secs', type=int, default=0,
+        help="Retry-After header of the 503 errors, in seconds")
+    parser.add_argument(
+        '--friends', dest='nb_friends', type=int, default=500,
+        help="Number of friends of every user")
+    parser.add_argument(
+        '--years', dest='nb_years', type=int, default=5,
+        help="Number of years of every timeline")
+    parser.add_argument(
+        '--pages-per-chain', dest='pages_per_chain', type=int, default=3,
+        help="Number of timeline pages from the first page, and per year")
+    parser.add_argument(
+        '--likers', dest='likers_per_post', type=int, default=1000,
+        help="Number of likers of every post")
+
+
+def create_server(args, address=("127.0.0.1", 0)):
+    """ Return a server set as passed in the arguments added by
+    add_server_arguments."""
+
+    site = Site(
+        nb_friends=args.nb_friends, nb_years=args.nb_years,
+        pages_per_chain=args.pages_per_chain,
+        likers_per_post=args.likers_per_post)
+    return FakeFacebookServer(
+        site, args.latency_ms / 1000, args.error_rate,
+        args.unavailable_rate, args.retry_after_secs, address=address)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    add_server_arguments(parser)
+    parser.add_argument(
+        '--port', dest='port', type=int, default=8080,
+        help="Port to listen to")
+    args = parser.parse_args()
+
+    server = create_server(args, address=("127.0.0.1", args.port))
+    print("Serving on {0}".format(server.url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(json.dumps(server.get_stats(), indent=4))
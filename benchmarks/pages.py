@@ -0,0 +1,281 @@
+"""Generate pages looking like the mobile version of Facebook."""
+
+from html import escape
+
+HEADER = """<!DOCTYPE html>
+<html><head><title id="pageTitle">{title}</title>
+<meta name="referrer" content="origin-when-crossorigin">
+<style type="text/css">{style}</style></head>
+<body><div class="d"><div id="viewport">
+<div id="header"><form method="get" action="/search/">
+<input class="bl" name="query" type="text" placeholder="Search">
+</form><a href="/home.php?refid=17">Home</a>
+<a href="/profile.php?refid=17">Profile</a>
+<a href="/messages/?refid=17">Messages</a></div>
+<div id="objects_container"><div class="e" id="root" role="main">
+"""
+
+FOOTER = """</div></div>
+<div id="footer"><a href="/help/?refid=17">Help</a>
+<a href="/settings/?refid=17">Settings</a>
+<a href="/logout.php?refid=17">Log out</a></div>
+<script>{script}</script>
+</div></div></body></html>"""
+
+STYLE = "".join(
+    ".c{0} {{margin:{0}px;padding:0;}}".format(i) for i in range(200))
+
+SCRIPT = "var x = 0;" * 200
+
+ARTICLE = """<article class="ca cb" data-ft='{{"top_level_post_id":"{0}"}}'>
+<div class="cc"><header><h3 class="cd"><strong>
+<a href="/username{1}?refid=18&amp;__tn__=C">User {1}</a></strong>
+is with <a href="/profile.php?id={2}&amp;refid=18">Friend {2}</a>
+</h3></header><div class="ce"><span><p>Some text for post {0}, with a
+<a href="/hashtag/tag?refid=18">#tag</a> and a few words to make it
+look like a real post.</p></span></div>
+<div class="cf"><a href="/page/photos/{0}/?type=3&amp;source=48&amp;refid=18">
+<img src="https://scontent.xx.fbcdn.net/{0}.jpg" width="320" height="240">
+</a></div></div>
+<footer class="cg" data-ft='{{"tn":"*W"}}'><div class="ch">
+<abbr>{3}</abbr></div><div class="ci">
+<span class="cj" id="like_{0}">
+<a aria-label="{4} reactions, including Like and Love"
+href="/ufi/reaction/profile/browser/?ft_ent_identifier={0}">{4}</a>
+<a class="ck" href="/a/like.php?ft_ent_identifier={0}">Like</a>
+<a class="ck" href="/reactions/picker/?ft_id={0}">React</a></span>
+<a class="cl" href="/story.php?story_fbid={0}&amp;id=1">{5} Comments</a>
+<a class="cl" href="/story.php?story_fbid={0}&amp;id=1">Share</a>
+<a class="cl" href="https://mbasic.facebook.com/story.php?story_fbid={0}">
+Full Story</a></div></footer></article>
+"""
+
+DATES = [
+    "22 April 2011 at 20:34", "9 July 2011", "Yesterday at 19:34",
+    "3 hrs", "14 May at 10:02", "13 May 2008 at 10:02"]
+
+
+def generate_timeline_page(
+        nb_articles=10, nb_years=10, first_post_id=1,
+        show_more_link="/username?v=timeline&cursor=next&refid=17",
+        year_link="/username?v=timeline&timecutoff={0}&refid=17"):
+    """ Return a timeline page with nb_articles posts, nb_years year links
+    and a "Show more" link, omitted if show_more_link is None.
+
+    >>> page = generate_timeline_page(nb_articles=3, nb_years=2)
+    >>> page.count("<article")
+    3
+    >>> page.count(">Show more<")
+    1
+    >>> generate_timeline_page(show_more_link=None).count(">Show more<")
+    0
+    """
+    articles = "".join(
+        ARTICLE.format(
+            first_post_id + i, i % 50, 1000 + i,
+            DATES[i % len(DATES)], i * 3, i % 7)
+        for i in range(nb_articles))
+
+    years = "".join(
+        '<div class="cm"><a href="{0}">{1}</a></div>'.format(
+            escape(year_link.format(2018 - year)), 2018 - year)
+        for year in range(nb_years))
+
+    show_more = ""
+    if show_more_link:
+        show_more = '<div class="cn"><a href="{0}">Show more</a></div>'.format(
+            escape(show_more_link))
+
+    return (
+        HEADER.format(title="User", style=STYLE) +
+        '<div id="timelineBody"><div id="tlFeed">' + articles +
+        show_more + years +
+        '</div></div>' +
+        FOOTER.format(script=SCRIPT))
+
+
+def generate_friends_page(
+        nb_friends=50, first_friend_id=0,
+        see_more_link="/username/friends?startindex=36&refid=17"):
+    """ Return a friends page with nb_friends friends and a "See more" link,
+    omitted if see_more_link is None.
+
+    >>> generate_friends_page(nb_friends=3).count("fref=fr_tab")
+    3
+    >>> generate_friends_page(see_more_link=None).count("m_more_friends")
+    0
+    """
+    friends = "".join(
+        '<table class="bo"><tr><td class="bp"><img src="https://scontent.'
+        'xx.fbcdn.net/{0}.jpg" alt="Friend {0}"></td><td class="bq">'
+        '<a class="br" href="/username{0}?fref=fr_tab&amp;refid=17">'
+        'Friend {0}</a><div class="bs">{1} mutual friends</div>'
+        '</td></tr></table>'.format(i, i % 100)
+        for i in range(first_friend_id, first_friend_id + nb_friends))
+
+    see_more = ""
+    if see_more_link:
+        see_more = (
+            '<div id="m_more_friends"><a href="{0}"><span>See more friends'
+            '</span></a></div>'.format(escape(see_more_link)))
+
+    return (
+        HEADER.format(title="Friends", style=STYLE) +
+        '<div id="friends_center_main"><h3>Friends ({0})</h3>'.format(
+            nb_friends) + friends + see_more + '</div>' +
+        FOOTER.format(script=SCRIPT))
+
+
+def generate_reaction_page(
+        nb_likers=50, post_id=1, first_liker_id=0,
+        see_more_link="/ufi/reaction/profile/browser/fetch/?limit=10&"
+                      "shown_ids=1&total_count={1}&ft_ent_identifier={0}"):
+    """ Return a reaction page with nb_likers users and a "See more" link,
+    omitted if see_more_link is None.
+
+    >>> generate_reaction_page(nb_likers=3).count("add_friend.php")
+    3
+    >>> generate_reaction_page(see_more_link=None).count("See more")
+    0
+    """
+    likers = "".join(
+        '<li class="bt"><table class="bu"><tr><td class="bv">'
+        '<img src="https://scontent.xx.fbcdn.net/{0}.jpg"></td>'
+        '<td class="bw"><a class="bx" href="/username{0}">User {0}</a>'
+        '</td><td class="by"><a href="/a/mobile/friends/add_friend.php?'
+        'id={0}&amp;hf=profile_browser">Add Friend</a></td></tr></table>'
+        '</li>'.format(i)
+        for i in range(first_liker_id, first_liker_id + nb_likers))
+
+    see_more = ""
+    if see_more_link:
+        see_more = (
+            '<li><div class="ca"><a href="{0}"><span>See more</span></a>'
+            '</div></li>'.format(
+                escape(see_more_link.format(post_id, nb_likers))))
+
+    return (
+        HEADER.format(title="Reactions", style=STYLE) +
+        '<div class="bz"><a role="button" href="/ufi/reaction/profile/'
+        'browser/?ft_ent_identifier={0}">All {1}</a></div><ul>'.format(
+            post_id, nb_likers) + likers + see_more + '</ul>' +
+        FOOTER.format(script=SCRIPT))
+
+
+ABOUT_FIELD = """<div class="_5cds _2lcw _5cdu" title="{0}"><table class="do">
+<tr><td class="dp"><span class="dq">{0}</span></td><td class="dr">
+<div class="ds">{1}</div></td></tr></table></div>
+"""
+
+ABOUT_FIELDS = [
+    ("Mobile", "+44 7700 900000"), ("Address", "1 Some Street"),
+    ("Facebook", "/username"), ("Websites", "https://example.com"),
+    ("Birthday", "14 May 1984"), ("Gender", "Male"),
+    ("Interested in", "Women"), ("Languages", "English and French"),
+    ("Religious views", "None"), ("Political Views", "None"),
+    ("Nickname", "Nick")]
+
+# Fields rarely filled in, all the fields parsed with ABOUT_FIELDS
+OTHER_ABOUT_FIELDS = [
+    ("AIM", "aim_name"), ("BBM", "12AB34CD"), ("Birth Name", "Name"),
+    ("Foursquare", "foursquare_name"), ("Gadu-Gadu", "1234567"),
+    ("ICQ", "123456789"), ("Instagram", "instagram_name"),
+    ("LinkedIn", "linkedin_name"), ("Maiden Name", "Maiden"),
+    ("Skype", "skype_name"), ("Snapchat", "snapchat_name"),
+    ("Twitter", "twitter_name"), ("VK", "vk_name"),
+    ("Windows Live Messenger", "wlm_name"), ("Year of birth", "1984")]
+
+
+def generate_about_page(nb_friends=20, all_fields=False):
+    """ Return an about page with contact info, basic info, work, education,
+    relationship and a list of nb_friends friends, every field parsed being
+    filled in if all_fields is set.
+
+    >>> generate_about_page(nb_friends=3).count("title=")
+    11
+    >>> generate_about_page(all_fields=True).count("title=")
+    26
+    """
+    about_fields = ABOUT_FIELDS
+    if all_fields:
+        about_fields = ABOUT_FIELDS + OTHER_ABOUT_FIELDS
+    fields = "".join(
+        ABOUT_FIELD.format(title, value) for title, value in about_fields)
+
+    institutions = "".join(
+        '<div id="{0}"><div class="cq">{0}</div>'.format(category) + "".join(
+            '<div class="ct"><a class="bm" href="/{0}{1}?refid=17">'
+            '<img src="https://scontent.xx.fbcdn.net/{0}{1}.jpg" '
+            'alt="{0} {1}"></a><div class="cu"><span>{0} {1}</span>'
+            '<div>2010 - 2012</div></div></div>'.format(category, i)
+            for i in range(3)) + '</div>'
+        for category in ["work", "education"])
+
+    friends = "".join(
+        '<div class="cv"><a href="/username{0}?fref=fr_tab">Friend {0}</a>'
+        '</div>'.format(i)
+        for i in range(nb_friends))
+
+    return (
+        HEADER.format(title="Mark Zuckerberg", style=STYLE) +
+        '<div class="timeline aboutme"><div class="cw">'
+        '<a href="/username?v=timeline&amp;lst=1%3A12345%3A1">Timeline</a>'
+        '<a href="/username?v=friends&amp;lst=1%3A12345%3A1">Friends</a>'
+        '</div>' + institutions + fields +
+        '<div id="relationship"><div class="cq">Relationship</div>'
+        '<div class="cu">Married to <a href="/someone">Someone</a> since '
+        '14 March 2010</div></div>'
+        '<div id="family"><div class="cq">Family members</div></div>' +
+        '<div id="friends">' + friends + '</div></div>' +
+        FOOTER.format(script=SCRIPT))
+
+
+def generate_likes_page(nb_categories=4, nb_likes=10):
+    """ Return a likes page with nb_categories categories of nb_likes liked
+    pages, each with a "See more" link.
+
+    >>> generate_likes_page(nb_categories=2, nb_likes=3).count(">Like<")
+    6
+    """
+    categories = "".join(
+        '<div><h4>Category {0} </h4>'.format(category) + "".join(
+            '<div><img src="https://scontent.xx.fbcdn.net/{0}{1}.jpg"><div>'
+            '<a href="/page{0}x{1}/?refid=17"><span>Page {0} {1}</span></a>'
+            '<br><a href="/a/profile.php?fan&amp;id={0}{1}">Like</a>'
+            '</div></div>'.format(category, i)
+            for i in range(nb_likes)) +
+        '<div id="m_more_item"><a href="/username?v=likes&amp;sectionid='
+        '{0}&amp;startindex={1}"><span>See more</span></a></div>'
+        '</div>'.format(category, nb_likes)
+        for category in range(nb_categories))
+
+    return (
+        HEADER.format(title="Likes", style=STYLE) + categories +
+        FOOTER.format(script=SCRIPT))
+
+
+def generate_buddy_feed(nb_buddies=100):
+    """ Return a response of the buddy feed with nb_buddies users.
+
+    >>> generate_buddy_feed(nb_buddies=2).count('"lat"')
+    2
+    """
+    buddy_list = ", ".join(
+        '"{0}": {{"lat": {1}}}'.format(1000 + i, 1500000000 - i * 60)
+        for i in range(nb_buddies))
+
+    return (
+        'for (;;); {"ms": [{"type": "chatproxy-presence", "userIsIdle": '
+        'false, "chatNotif": 0, "gamers": [], "buddyList": {' + buddy_list +
+        '}}], "t": "msg", "u": 123, "seq": 3}')
+
+
+def generate_login_page():
+    """ Return the page shown when the cookie has expired."""
+
+    return (
+        HEADER.format(title="Log in to Facebook", style=STYLE) +
+        '<form method="post" action="/login/device-based/regular/login/">'
+        '<input type="text" name="email"><input type="password" name="pass">'
+        '<input value="Log In" type="submit" name="login"></form>' +
+        FOOTER.format(script=SCRIPT))
@@ -0,0 +1,430 @@
+from core.downloader import AsyncDownloader
+from core.facebook_fetcher import \
+    add_links_to_explore, add_reactions, build_about_page_url, \
+    build_friend_list, \
+    build_friends_page_from_id, build_likes_page_from_id, \
+    build_mutual_friends_page_url_from_id, build_reaction_page_url, \
+    build_relative_url, build_see_more_reactions_url, \
+    build_timeline_page_url, count_liked_pages, create_downloader, \
+    create_parser, get_user_id, is_page_size_failure, merge_generic_result, \
+    normalize_url
+from core.page_size_controller import PageSizeController
+from core.parsing_pool import ProcessPoolParser
+from core import common
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import atexit
+import logging
+import time
+
+
+def create_production_async_fetcher(config, max_in_flight=10,
+                                    parsing_processes=0):
+    """ parsing_processes: if set, pages are parsed in a pool of processes,
+    while the event loop keeps downloading pages.
+
+    The threads and processes of the fetcher are stopped at exit."""
+
+    downloader = AsyncDownloader(
+        create_downloader(config, pool_size=max_in_flight), max_in_flight)
+    fb_parser = create_parser(config)
+
+    parsing_executor = None
+    if parsing_processes:
+        fb_parser = ProcessPoolParser(type(fb_parser), parsing_processes)
+        # Threads waiting for the results of the processes
+        parsing_executor = ThreadPoolExecutor(parsing_processes)
+
+    fb_fetcher = AsyncFacebookFetcher(
+        downloader, fb_parser, config, parsing_executor)
+    atexit.register(fb_fetcher.close)
+    return fb_fetcher
+
+
+class AsyncFacebookFetcher:
+    """ Same crawls as FacebookFetcher, run from coroutines so that
+    independent pages are downloaded concurrently.
+
+    The number of requests in flight is bounded by the AsyncDownloader.
+    Results are merged in the order the sequential FacebookFetcher visits
+    pages, so that both return identical results.
+
+    Pages are parsed in the event loop, unless a parsing_executor is passed.
+    """
+
+    def __init__(self, downloader, fb_parser, config, parsing_executor=None):
+        self.downloader = downloader
+        self.fb_parser = fb_parser
+        self.cookie = common.build_cookie(config)
+        self.c_user = config.cookie_c_user
+        self.parsing_executor = parsing_executor
+        # See FacebookFetcher.fetch_content_recursively
+        self.duplicate_links_skipped = 0
+        # See FacebookFetcher.fetch_reaction_page
+        self.page_size_controller = PageSizeController()
+
+    def close(self):
+        """ Stop the threads downloading and parsing pages, and the parsing
+        processes if any."""
+
+        self.downloader.close()
+        if self.parsing_executor:
+            self.parsing_executor.shutdown()
+        if isinstance(self.fb_parser, ProcessPoolParser):
+            self.fb_parser.shutdown()
+
+    async def parse(self, parsing_function, content):
+        """ Return parsing_function(content), run in the parsing_executor if
+        any, so that the event loop keeps downloading pages meanwhile."""
+
+        if not self.parsing_executor:
+            return parsing_function(content)
+
+        return await asyncio.get_running_loop().run_in_executor(
+            self.parsing_executor, parsing_function, content)
+
+    async def fetch_page(self, url, parsing_function):
+        """ Return the result of parsing_function on the page, or None if
+        the page could not be downloaded or parsed."""
+
+        try:
+            response = await self.downloader.fetch_url(
+                cookie=self.cookie, url=url,
+                timeout_secs=15, retries=5)
+            return await self.parse(parsing_function, response.text)
+
+        except Exception as e:
+            logging.error(
+                "Error while downloading page '%s', "
+                "got exception: '%s'", url, e)
+            return None
+
+    async def fetch_content_recursively(self, initial_url, parsing_function):
+        """ See FacebookFetcher.fetch_content_recursively."""
+
+        results = {}
+        pending = {}
+
+        def explore(url):
+            if normalize_url(url) not in results:
+                results[normalize_url(url)] = None
+                task = asyncio.ensure_future(
+                    self.fetch_page(url, parsing_function))
+                pending[task] = url
+
+        explore(initial_url)
+        while pending:
+            done, _ = await asyncio.wait(
+                pending.keys(), return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                url = pending.pop(task)
+                result = task.result()
+                results[normalize_url(url)] = result
+                logging.info(
+                    "Explored page %s - %s in flight, url: %s",
+                    len(results) - len(pending), len(pending), url)
+                if result:
+                    for link in result.see_more_links:
+                        explore(build_relative_url(link))
+
+        # Replay the exploration order of FacebookFetcher
+        content = OrderedDict()
+        links_to_explore = [initial_url]
+        visited = set([normalize_url(initial_url)])
+        duplicates = 0
+        while links_to_explore:
+            result = results[normalize_url(links_to_explore.pop())]
+            if result:
+                merge_generic_result(content, result)
+                duplicates += add_links_to_explore(
+                    result.see_more_links, links_to_explore, visited)
+
+        if duplicates:
+            logging.info(
+                "Skipped %s link(s) already explored from %s", duplicates,
+                initial_url)
+            self.duplicate_links_skipped += duplicates
+
+        return content
+
+    async def do_fetch_friends(self, user_id):
+
+        content = await self.fetch_content_recursively(
+            build_friends_page_from_id(user_id),
+            lambda content: self.fb_parser.parse_friends_page(content))
+
+        return build_friend_list(content)
+
+    async def fetch_user_friend_list(self):
+        return await self.do_fetch_friends(self.c_user)
+
+    async def do_fetch_liked_pages(self, user_id):
+
+        return await self.fetch_content_recursively(
+            build_likes_page_from_id(user_id),
+            lambda content: self.fb_parser.parse_likes_page(content))
+
+    async def do_fetch_mutual_friends(self, user_id):
+
+        result = await self.fetch_content_recursively(
+            build_mutual_friends_page_url_from_id(
+                self.c_user, user_id),
+            lambda content: self.fb_parser.parse_mutual_friends_page(content))
+
+        return build_friend_list(result, "mutual_friends")
+
+    async def fetch_user_info(self, user_ref,
+                              fetch_friends, fetch_likes,
+                              fetch_mutual_friends):
+        """ Return the infos of a single user, or None if they could not be
+        fetched and user_ref is not an id."""
+
+        user_id = get_user_id(user_ref)
+        url = build_about_page_url(user_ref)
+
+        try:
+            response = await self.downloader.fetch_url(
+                cookie=self.cookie, url=url, timeout_secs=30, retries=5)
+
+            user_infos = await self.parse(
+                self.fb_parser.parse_about_page, response.text)
+            if not user_infos \
+               or "id" not in user_infos or not user_infos["id"]:
+                raise RuntimeError(
+                    "Failed to extract infos for user {0}".format(
+                        user_ref))
+
+            logging.info("Got infos for user '%s'", user_ref)
+
+            friends, liked_pages, mutual_friends = await asyncio.gather(
+                self.do_fetch_friends(user_infos["id"])
+                if fetch_friends else asyncio.sleep(0),
+                self.do_fetch_liked_pages(user_infos["id"])
+                if fetch_likes else asyncio.sleep(0),
+                self.do_fetch_mutual_friends(user_infos["id"])
+                if fetch_mutual_friends else asyncio.sleep(0))
+
+            if fetch_friends:
+                user_infos["friends"] = friends
+                user_infos["friend_count"] = len(friends)
+
+            if fetch_likes:
+                user_infos["liked_pages"] = liked_pages
+                user_infos["liked_page_count"] = \
+                    count_liked_pages(liked_pages)
+
+            if fetch_mutual_friends:
+                user_infos["mutual_friends"] = mutual_friends
+                user_infos["mutual_friend_count"] = len(mutual_friends)
+
+            return user_infos
+
+        except Exception as e:
+            logging.error(
+                "Error while downloading page '%s', "
+                "got exception: '%s'", url, e)
+            if user_id:
+                return OrderedDict([("id", user_id)])
+            return None
+
+    async def fetch_user_infos(self, user_refs,
+                               fetch_friends, fetch_likes,
+                               fetch_mutual_friends):
+        """ See FacebookFetcher.fetch_user_infos."""
+
+        logging.info("Querying '%s' users from Facebook", len(user_refs))
+
+        all_user_infos = await asyncio.gather(*[
+            self.fetch_user_info(
+                user_ref, fetch_friends, fetch_likes, fetch_mutual_friends)
+            for user_ref in user_refs])
+
+        infos = {}
+        for user_ref, user_infos in zip(user_refs, all_user_infos):
+            if user_infos:
+                infos[user_ref] = user_infos
+
+        return infos
+
+    async def fetch_timeline_chain(self, url, first_result=None):
+        """ Follow the "Show more" links from url, return the list of
+        TimelineResult found, in order.
+
+        first_result: the TimelineResult of url if it was already fetched.
+        """
+
+        results = []
+        while url:
+            result = first_result
+            first_result = None
+            if not result:
+                result = await self.fetch_page(
+                    url, lambda content:
+                        self.fb_parser.parse_timeline_page(content))
+            if not result:
+                logging.error("Failed to parse timeline '%s' - no result", url)
+                break
+
+            results.append(result)
+            url = None
+            if result.show_more_link:
+                url = build_relative_url(result.show_more_link)
+                logging.info("Found show more link: %s", url)
+
+        return results
+
+    async def fetch_articles_from_user_timeline(self, user_ref):
+
+        url = build_timeline_page_url(user_ref)
+
+        chains = []
+        year_links = []
+        try:
+            response = await self.downloader.fetch_url(
+                cookie=self.cookie, url=url,
+                timeout_secs=15, retries=5)
+
+            # One task, the page being parsed once by a pool of processes
+            year_links, result = await self.parse(
+                self.fb_parser.parse_timeline_first_page, response.text)
+            logging.info("Found %s year links to explore", len(year_links))
+
+            if result:
+                chains.append(self.fetch_timeline_chain(url, result))
+            else:
+                logging.error("Failed to parse timeline - no result")
+
+        except Exception as e:
+            logging.error(
+                "Error while downloading page '%s', "
+                "got exception: '%s'", url, e)
+
+        chains += [
+            self.fetch_timeline_chain(build_relative_url(link))
+            for link in year_links]
+
+        posts = OrderedDict()
+        for chain_results in await asyncio.gather(*chains):
+            for result in chain_results:
+                for article_id in result.articles:
+                    result.articles[article_id]["page"] = user_ref
+                posts.update(result.articles)
+
+        return posts
+
+    async def fetch_articles_from_timeline(self, user_refs):
+        """ See FacebookFetcher.fetch_articles_from_timeline."""
+
+        all_posts = await asyncio.gather(*[
+            self.fetch_articles_from_user_timeline(user_ref)
+            for user_ref in user_refs])
+
+        articles_found = OrderedDict()
+        for user_ref, posts in zip(user_refs, all_posts):
+            articles_found[user_ref] = OrderedDict()
+            articles_found[user_ref]["posts"] = posts
+
+        return articles_found
+
+    async def fetch_likers_for_article(self, article_id):
+        """ See FacebookFetcher.fetch_likers_for_article."""
+
+        max_attempts = 5
+
+        likers = set()
+
+        url = build_reaction_page_url(
+            article_id=article_id,
+            max_total_likes=1000000)
+        while url:
+
+            response = None
+            for attempt_no in range(1, max_attempts + 1):
+                page_size = self.page_size_controller.get_page_size(
+                    article_id)
+                current_url = url.format(page_size)
+                try:
+                    start_time = time.monotonic()
+                    response = await self.downloader.fetch_url(
+                        cookie=self.cookie, url=current_url,
+                        timeout_secs=15, retries=5)
+                    fetching_secs = time.monotonic() - start_time
+                    break
+
+                except Exception as e:
+                    logging.info(
+                        "Attempt to fetch '%s' did not succeed",
+                        common.truncate_text(current_url, 200))
+                    if is_page_size_failure(e):
+                        self.page_size_controller.on_failure(
+                            article_id, page_size)
+
+            if response is None:
+                logging.error(
+                    "Failed to fetch all reactions for post '%s'", article_id)
+                break
+
+            next_url = None
+            likers_found = 0
+            failed = False
+            try:
+
+                result = await self.parse(
+                    self.fb_parser.parse_reaction_page, response.text)
+                if not result:
+                    # See FacebookFetcher.iter_liker_pages_for_article
+                    self.page_size_controller.on_failure(
+                        article_id, page_size)
+                    raise RuntimeError(
+                        "Failed to fetch reactions - no result")
+
+                likers_found = len(result.likers)
+                likers.update(result.likers)
+
+                if result.see_more_link:
+                    next_url = build_see_more_reactions_url(
+                        result.see_more_link)
+
+            except Exception as e:
+                logging.error(
+                    "Error while processing page '%s', "
+                    "got exception: '%s'", common.truncate_text(url, 200), e)
+                failed = True
+
+            if not failed:
+                self.page_size_controller.on_success(
+                    article_id, page_size, likers_found, fetching_secs)
+
+            url = next_url
+
+        self.page_size_controller.forget(article_id)
+
+        return likers
+
+    async def fetch_reactions_per_user_for_articles(self,
+                                                    articles,
+                                                    exclude_non_users):
+        """ See FacebookFetcher.fetch_reactions_per_user_for_articles."""
+
+        for article in articles:
+            if "post_id" not in article:
+                logging.error(
+                    "Invalid input, every article in the list "
+                    "must contain the key post_id")
+                return OrderedDict()
+
+        all_likers = await asyncio.gather(*[
+            self.fetch_likers_for_article(article["post_id"])
+            for article in articles])
+
+        reactions_per_user = OrderedDict()
+        for article, likers in zip(articles, all_likers):
+            add_reactions(
+                reactions_per_user, article, sorted(likers),
+                exclude_non_users)
+
+        self.page_size_controller.log_stats()
+
+        return reactions_per_user
@@ -0,0 +1,105 @@
+from core import common
+
+from collections import OrderedDict
+import json
+import logging
+import os
+import threading
+import time
+
+
+class CrawlCheckpoint:
+    """ Save the state of crawls to a JSON file regularly, so that they can
+    be resumed after a crash, without fetching again the pages explored.
+
+    The state of every crawl, e.g. the timeline of a user, is a dictionary
+    found by the kind and the key of the crawl, e.g. ("timeline", user_ref).
+    Crawls keep updating their state, which is only serialized when saved:
+    deques and sets are saved as lists. Crawls running concurrently update
+    their state while holding lock, so that it is not saved meanwhile.
+    """
+
+    def __init__(self, filepath, interval_secs=30):
+        self.filepath = filepath
+        self.interval_secs = interval_secs
+        self.crawls = OrderedDict()
+        self.last_save_time = time.monotonic()
+        self.lock = threading.RLock()
+        # Crawls stopped on a page which failed, left to explore
+        self.failures = 0
+
+    def load(self):
+        """ Load the crawls saved, return False if there was no checkpoint.
+        """
+
+        if not os.path.exists(self.filepath):
+            logging.info("No checkpoint found in '%s'", self.filepath)
+            return False
+
+        with open(self.filepath, "r") as f:
+            saved = json.load(f, object_pairs_hook=OrderedDict)
+
+        self.crawls = OrderedDict(
+            (self.build_key(kind, key), crawl)
+            for (kind, key), crawl in saved["crawls"])
+
+        logging.info(
+            "Loaded %s crawl(s) from checkpoint '%s'", len(self.crawls),
+            self.filepath)
+        return True
+
+    def build_key(self, kind, key):
+        # Keeps ids and usernames apart, e.g. 111 and '111'
+        return json.dumps([kind, key])
+
+    def get_crawl(self, kind, key):
+        """ Return the state of a crawl, empty if it was not saved."""
+        with self.lock:
+            return self.crawls.setdefault(
+                self.build_key(kind, key), OrderedDict())
+
+    def save(self, force=False):
+        """ Write the state of all crawls, if interval_secs elapsed since the
+        last save or if force is set."""
+
+        with self.lock:
+            now = time.monotonic()
+            if not force and now - self.last_save_time < self.interval_secs:
+                return
+
+            common.write_file_atomically(
+                self.filepath, json.dumps(OrderedDict([("crawls", [
+                    [json.loads(key), crawl]
+                    for key, crawl in self.crawls.items()])]),
+                    default=list))
+
+            self.last_save_time = now
+        logging.info("Saved checkpoint '%s'", self.filepath)
+
+    def remove(self):
+        if os.path.exists(self.filepath):
+            os.remove(self.filepath)
+
+    def record_failure(self):
+        """ Record a crawl stopped on a page which failed, e.g. after the
+        cookie expired, the page being left to explore: the crawl is saved at
+        once."""
+
+        with self.lock:
+            self.failures += 1
+        self.save(force=True)
+
+    def complete(self):
+        """ Remove the checkpoint once the crawls are over, unless one of
+        them stopped on a page which failed: it is then kept, so that the
+        crawls can be resumed. Return whether it was removed."""
+
+        if self.failures:
+            self.save(force=True)
+            logging.error(
+                "%s crawl(s) stopped on a page which failed, checkpoint '%s' "
+                "kept to resume them", self.failures, self.filepath)
+            return False
+
+        self.remove()
+        return True
@@ -1,7 +1,10 @@
+from core import download_metrics
+from core import page_cache
+from core import rate_limiter
 import json
 import logging
 import os
-import requests_cache
+import sys
 from collections import namedtuple
 from collections import OrderedDict
 
@@ -15,20 +18,102 @@ CONFIG_KEYS = [
     'logging_level'
 ]
 
-Config = namedtuple('Config', CONFIG_KEYS)
+# Keys which can be omitted, with their default value
+OPTIONAL_CONFIG_KEYS = OrderedDict([
+    ('parser', 'soup'),
+    ('rate_limits', {}),
+    ('page_cache', {}),
+    ('metrics', {})
+])
+
+PARSERS = ['soup', 'lxml']
+
+Config = namedtuple(
+    'Config', CONFIG_KEYS + list(OPTIONAL_CONFIG_KEYS),
+    defaults=list(OPTIONAL_CONFIG_KEYS.values()))
 
 
 def prettify(decoded_json, indent=4):
     return json.dumps(decoded_json, indent=indent)
 
 
+class LazyPrettify:
+    """ decoded_json, prettified only when formatted: passed as an argument
+    of a log message, it is not serialized unless the message is emitted.
+
+    >>> "%s" % LazyPrettify({"a": 1})
+    '{\\n    "a": 1\\n}'
+    """
+
+    def __init__(self, decoded_json, indent=4):
+        self.decoded_json = decoded_json
+        self.indent = indent
+
+    def __str__(self):
+        return prettify(self.decoded_json, self.indent)
+
+
 def parse_config(config_json):
     """
     >>> parse_config({ "caching_secs": -1, "cookie_c_user": "uid_val",\
     "cookie_datr": "uid_val", "cookie_xs" : "xs_val",\
     "logging_level": "INFO" })
     Config(caching_secs=-1, cookie_c_user='uid_val', cookie_datr='uid_val', \
-cookie_xs='xs_val', logging_level=20)
+cookie_xs='xs_val', logging_level=20, parser='soup', rate_limits={}, \
+page_cache={}, metrics={})
+
+    >>> parse_config({ "caching_secs": -1, "cookie_c_user": "uid_val",\
+    "cookie_datr": "uid_val", "cookie_xs" : "xs_val",\
+    "logging_level": "INFO", "parser": "lxml" }).parser
+    'lxml'
+
+    >>> parse_config({ "caching_secs": -1, "cookie_c_user": "uid_val",\
+    "cookie_datr": "uid_val", "cookie_xs" : "xs_val",\
+    "logging_level": "INFO", "parser": "regex" })
+    Traceback (most recent call last):
+    ...
+    RuntimeError: Configuration file contains an invalid 'parser' - \
+allowed: soup, lxml
+
+    >>> parse_config({ "caching_secs": -1, "cookie_c_user": "uid_val",\
+    "cookie_datr": "uid_val", "cookie_xs" : "xs_val",\
+    "logging_level": "INFO", "rate_limits": {\
+    "reactions": {"requests_per_sec": 0.5, "burst": 3}} }).rate_limits
+    {'reactions': {'requests_per_sec': 0.5, 'burst': 3}}
+
+    >>> parse_config({ "caching_secs": -1, "cookie_c_user": "uid_val",\
+    "cookie_datr": "uid_val", "cookie_xs" : "xs_val",\
+    "logging_level": "INFO", "rate_limits": {\
+    "photos": {"requests_per_sec": 1}} })
+    Traceback (most recent call last):
+    ...
+    RuntimeError: Configuration file contains an invalid 'rate_limits' - \
+allowed: requests_per_sec > 0 and optionally burst >= 1 for url classes: \
+buddy_feed, reactions, about, timeline, other
+
+    >>> parse_config({ "caching_secs": 0, "cookie_c_user": "uid_val",\
+    "cookie_datr": "uid_val", "cookie_xs" : "xs_val",\
+    "logging_level": "INFO", "page_cache": {\
+    "compression": "lzma", "ttls": {"about": 3600}} }).page_cache
+    {'compression': 'lzma', 'ttls': {'about': 3600}}
+
+    >>> parse_config({ "caching_secs": 0, "cookie_c_user": "uid_val",\
+    "cookie_datr": "uid_val", "cookie_xs" : "xs_val",\
+    "logging_level": "INFO", "page_cache": {"compression": "gzip"} })
+    Traceback (most recent call last):
+    ...
+    RuntimeError: Configuration file contains an invalid 'page_cache' - \
+allowed: path, max_bytes > 0, compression among zlib, lzma and ttls >= -1 \
+for url classes: buddy_feed, reactions, about, timeline, other, \
+timeline_past_years
+
+    >>> parse_config({ "caching_secs": -1, "cookie_c_user": "uid_val",\
+    "cookie_datr": "uid_val", "cookie_xs" : "xs_val",\
+    "logging_level": "INFO", "metrics": {"format": "csv"} })
+    Traceback (most recent call last):
+    ...
+    RuntimeError: Configuration file contains an invalid 'metrics' - \
+allowed: path and format among json, prometheus
 
     >>> parse_config({ "caching_secs": -1, "cookie_c_user": "",\
     "cookie_datr": "datr_val", "cookie_xs" : "xs_val",\
@@ -90,8 +175,135 @@ allowed: -1: disabled - 0: cache forever - >0: cache for x seconds
                 "allowed: " +
                 "-1: disabled - 0: cache forever - >0: cache for x seconds")
 
+    for key in OPTIONAL_CONFIG_KEYS:
+        if key not in config_json:
+            config_json[key] = OPTIONAL_CONFIG_KEYS[key]
+
+    if config_json["parser"] not in PARSERS:
+        raise RuntimeError(
+            "Configuration file contains an invalid 'parser' - " +
+            "allowed: " + ", ".join(PARSERS))
+
+    if not is_valid_rate_limits(config_json["rate_limits"]):
+        raise RuntimeError(
+            "Configuration file contains an invalid 'rate_limits' - " +
+            "allowed: " +
+            "requests_per_sec > 0 and optionally burst >= 1 " +
+            "for url classes: " +
+            ", ".join(list(rate_limiter.URL_CLASSES) +
+                      [rate_limiter.OTHER_URL_CLASS]))
+
+    if not is_valid_page_cache(config_json["page_cache"]):
+        raise RuntimeError(
+            "Configuration file contains an invalid 'page_cache' - " +
+            "allowed: " +
+            "path, max_bytes > 0, compression among " +
+            ", ".join(page_cache.COMPRESSIONS) + " and ttls >= -1 " +
+            "for url classes: " + ", ".join(get_cache_url_classes()))
+
+    if not is_valid_metrics(config_json["metrics"]):
+        raise RuntimeError(
+            "Configuration file contains an invalid 'metrics' - " +
+            "allowed: path and format among " +
+            ", ".join(download_metrics.FORMATS))
+
     return Config(
-        *[config_json[key] for key in CONFIG_KEYS])
+        *[config_json[key] for key in Config._fields])
+
+
+def is_valid_rate_limits(rate_limits):
+    """
+    >>> is_valid_rate_limits({"about": {"requests_per_sec": 2}})
+    True
+    >>> is_valid_rate_limits({"about": {"requests_per_sec": 0}})
+    False
+    >>> is_valid_rate_limits({"about": {"requests_per_sec": 1, "burst": 0}})
+    False
+    >>> is_valid_rate_limits({"about": 1})
+    False
+    """
+    url_classes = \
+        list(rate_limiter.URL_CLASSES) + [rate_limiter.OTHER_URL_CLASS]
+
+    def is_number(value):
+        return type(value) in (int, float)
+
+    if not isinstance(rate_limits, dict):
+        return False
+
+    for url_class, rate_limit in rate_limits.items():
+        if url_class not in url_classes or \
+           not isinstance(rate_limit, dict):
+            return False
+        requests_per_sec = rate_limit.get("requests_per_sec")
+        burst = rate_limit.get("burst", 1)
+        if not is_number(requests_per_sec) or requests_per_sec <= 0 or \
+           not is_number(burst) or burst < 1 or \
+           not set(rate_limit) <= {"requests_per_sec", "burst"}:
+            return False
+
+    return True
+
+
+def get_cache_url_classes():
+    return list(rate_limiter.URL_CLASSES) + \
+        [rate_limiter.OTHER_URL_CLASS, page_cache.PAST_TIMELINE_URL_CLASS]
+
+
+def is_valid_page_cache(page_cache_config):
+    """
+    >>> is_valid_page_cache({"max_bytes": 1000000, "ttls": {"about": -1}})
+    True
+    >>> is_valid_page_cache({"max_bytes": 0})
+    False
+    >>> is_valid_page_cache({"ttls": {"about": -2}})
+    False
+    >>> is_valid_page_cache({"ttls": {"photos": 60}})
+    False
+    >>> is_valid_page_cache({"expire_after": 60})
+    False
+    """
+    if not isinstance(page_cache_config, dict) or \
+       not set(page_cache_config) <= \
+            {"path", "max_bytes", "compression", "ttls"}:
+        return False
+
+    path = page_cache_config.get("path", "")
+    max_bytes = page_cache_config.get("max_bytes", 1)
+    compression = page_cache_config.get("compression", "zlib")
+    ttls = page_cache_config.get("ttls", {})
+    if not isinstance(path, str) or \
+       not isinstance(max_bytes, int) or max_bytes <= 0 or \
+       compression not in page_cache.COMPRESSIONS or \
+       not isinstance(ttls, dict):
+        return False
+
+    url_classes = get_cache_url_classes()
+    for url_class, ttl in ttls.items():
+        if url_class not in url_classes or not isinstance(ttl, int) or \
+           ttl < -1:
+            return False
+
+    return True
+
+
+def is_valid_metrics(metrics_config):
+    """
+    >>> is_valid_metrics({"path": "metrics.prom", "format": "prometheus"})
+    True
+    >>> is_valid_metrics({"format": "json"})
+    True
+    >>> is_valid_metrics({"path": 1})
+    False
+    >>> is_valid_metrics({"interval_secs": 60})
+    False
+    """
+    if not isinstance(metrics_config, dict) or \
+       not set(metrics_config) <= {"path", "format"}:
+        return False
+
+    return isinstance(metrics_config.get("path", ""), str) and \
+        metrics_config.get("format", "json") in download_metrics.FORMATS
 
 
 def get_filepath(filename):
@@ -106,22 +318,63 @@ def load_json_from_fd(fd):
         return json.load(fd, object_pairs_hook=OrderedDict)
 
     except Exception as e:
-        logging.error("Error parsing JSON, got exception: '{0}'".format(e))
+        logging.error("Error parsing JSON, got exception: '%s'", e)
 
     return {}
 
 
+def load_ndjson_from_fd(fd):
+    """ Yield the records of a NDJSON stream, one JSON document per line,
+    as the lines are read. Lines which are not valid JSON are skipped.
+
+    >>> import io
+    >>> list(load_ndjson_from_fd(io.StringIO('{"post_id": 1}\\n\\n[2]\\n')))
+    [OrderedDict([('post_id', 1)]), [2]]
+    """
+    for line in fd:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line, object_pairs_hook=OrderedDict)
+
+        except Exception as e:
+            logging.error("Error parsing JSON, got exception: '%s'", e)
+
+
+def write_ndjson_record(record, fd=None):
+    """ Write record as a single line of JSON, flushed at once so that the
+    next command of a pipeline can process it while the crawl continues.
+
+    >>> write_ndjson_record(OrderedDict([('user', {'name': 'Mark'})]))
+    {"user": {"name": "Mark"}}
+    """
+    fd = fd or sys.stdout
+    fd.write(json.dumps(record) + "\n")
+    fd.flush()
+
+
+def write_file_atomically(filepath, text):
+    """ Write text to filepath through a temporary file replacing it at
+    once, so that the file is never read half written, nor left truncated
+    by a crash."""
+
+    temporary_filepath = filepath + ".tmp"
+    with open(temporary_filepath, "w") as f:
+        f.write(text)
+    os.replace(temporary_filepath, filepath)
+
+
 def load_json_from_file(filepath):
     if not os.path.exists(filepath):
         filepath_org = filepath
         filepath = get_filepath(filepath)
 
         if not os.path.exists(filepath):
-            logging.error("Couldn't find file '{0}' or '{1}'".format(
-                filepath_org, filepath))
+            logging.error(
+                "Couldn't find file '%s' or '%s'", filepath_org, filepath)
             return {}
 
-    logging.info("Loading JSON file '{0}'".format(filepath))
+    logging.info("Loading JSON file '%s'", filepath)
     with open(filepath, "r") as f:
         return load_json_from_fd(f)
 
@@ -132,8 +385,8 @@ def load_config():
         if config_json:
             return parse_config(config_json)
     except Exception as e:
-        logging.error("Failed to load configuration file '{0}': {1}".format(
-            CONFIG_FILENAME, e))
+        logging.error(
+            "Failed to load configuration file '%s': %s", CONFIG_FILENAME, e)
     return None
 
 
@@ -157,13 +410,11 @@ def configure(caching_secs_override=None):
 
     if caching_secs == 0:
         logging.info("Caching enabled: cache does not expîre")
-        requests_cache.install_cache(expire_after=None)
     elif caching_secs > 0:
-        logging.info("Caching enabled: cache expires after {0}s".format(
-            caching_secs))
-        requests_cache.install_cache(expire_after=caching_secs)
+        logging.info("Caching enabled: cache expires after %ss", caching_secs)
 
-    return config
+    # The page cache is created with the downloader, see create_downloader
+    return config._replace(caching_secs=caching_secs)
 
 
 def build_cookie(config):
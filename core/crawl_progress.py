@@ -0,0 +1,209 @@
+from core import common
+
+from collections import OrderedDict
+import itertools
+import json
+import sys
+import threading
+import time
+
+
+def format_duration(secs):
+    """
+    >>> format_duration(3725.2), format_duration(59)
+    ('1:02:05', '0:00:59')
+    >>> format_duration(None)
+    '?'
+    """
+    if secs is None:
+        return "?"
+    secs = int(secs)
+    return "{0}:{1:02d}:{2:02d}".format(
+        secs // 3600, secs // 60 % 60, secs % 60)
+
+
+class CrawlProgress:
+    """ Aggregate the progress of the crawls of a fetcher, which may run
+    concurrently: the pages fetched, the frontier (links left to explore by
+    the crawls running), the items found, e.g. friends, posts or likers, and
+    the units processed, e.g. users or posts, when their total is known.
+
+    Every interval_secs, a status line is written to status_file, if set,
+    and the stats to stats_filepath, if set, as JSON, see get_stats.
+
+    >>> now = [0.0]
+    >>> progress = CrawlProgress(clock=lambda: now[0])
+    >>> progress.start_units("users", 2)
+    >>> crawl_id = progress.start_crawl()
+    >>> now[0] = 2.0
+    >>> progress.record_page(crawl_id, items=30, frontier=3)
+    >>> progress.record_unit()
+    >>> progress.format_status()
+    'Crawl: 1 page(s), 3 left, 30 item(s), 0.5 pages/s, 15.0 items/s, \
+1/2 users, ETA 0:00:02'
+    """
+
+    def __init__(self, status_file=None, stats_filepath=None,
+                 interval_secs=1.0, clock=time.monotonic):
+        self.status_file = status_file
+        self.stats_filepath = stats_filepath
+        self.interval_secs = interval_secs
+        self.clock = clock
+        self.start_time = clock()
+        self.last_report_time = self.start_time
+        self.pages_done = 0
+        self.items_found = 0
+        self.crawls_done = 0
+        # Links left to explore per crawl running
+        self.frontiers = OrderedDict()
+        self.crawl_ids = itertools.count()
+        self.units_name = None
+        self.units_total = None
+        self.units_done = 0
+        self.lock = threading.Lock()
+        # Held while writing, reports being written by any crawl thread
+        self.report_lock = threading.Lock()
+
+    def start_units(self, name, total=None):
+        """ Start processing total units, e.g. users, total being None if
+        unknown."""
+
+        with self.lock:
+            self.units_name = name
+            self.units_total = total
+            self.units_done = 0
+
+    def record_unit(self):
+        with self.lock:
+            self.units_done += 1
+        self.report()
+
+    def start_crawl(self, frontier=1):
+        """ Start a crawl with frontier links to explore, return its id."""
+
+        with self.lock:
+            crawl_id = next(self.crawl_ids)
+            self.frontiers[crawl_id] = frontier
+        return crawl_id
+
+    def record_page(self, crawl_id=None, items=0, frontier=0):
+        """ Record a page fetched by the crawl, where items were found,
+        frontier links being left to explore by the crawl. Pages fetched
+        outside of crawls, e.g. about pages, have no crawl_id."""
+
+        with self.lock:
+            self.pages_done += 1
+            self.items_found += items
+            if crawl_id is not None:
+                self.frontiers[crawl_id] = frontier
+        self.report()
+
+    def finish_crawl(self, crawl_id):
+        """ Stop counting the frontier of the crawl, which may be finished
+        more than once, e.g. when its iteration stopped early."""
+
+        with self.lock:
+            if self.frontiers.pop(crawl_id, None) is not None:
+                self.crawls_done += 1
+
+    def get_stats(self):
+        """ Return the progress, with the rates since the start and the
+        estimated seconds left, None if unknown.
+
+        The estimate is based on the units left if their total is known,
+        otherwise on the frontier, which only grows as pages are found: it is
+        then a lower bound."""
+
+        with self.lock:
+            elapsed_secs = self.clock() - self.start_time
+            frontier = sum(self.frontiers.values())
+            pages_per_sec = self.pages_done / elapsed_secs \
+                if elapsed_secs else 0.0
+
+            eta_secs = None
+            if self.units_total is not None and self.units_done:
+                eta_secs = elapsed_secs / self.units_done * \
+                    (self.units_total - self.units_done)
+            elif pages_per_sec:
+                eta_secs = frontier / pages_per_sec
+
+            stats = OrderedDict([
+                ("elapsed_secs", round(elapsed_secs, 1)),
+                ("pages_done", self.pages_done),
+                ("frontier", frontier),
+                ("items_found", self.items_found),
+                ("crawls_running", len(self.frontiers)),
+                ("crawls_done", self.crawls_done),
+                ("pages_per_sec", round(pages_per_sec, 2)),
+                ("items_per_sec", round(
+                    self.items_found / elapsed_secs, 2)
+                    if elapsed_secs else 0.0),
+                ("eta_secs", round(eta_secs, 1)
+                    if eta_secs is not None else None)
+            ])
+            if self.units_name:
+                stats["units"] = OrderedDict([
+                    ("name", self.units_name),
+                    ("done", self.units_done),
+                    ("total", self.units_total)])
+            return stats
+
+    def format_status(self, stats=None):
+        stats = stats or self.get_stats()
+        status = "Crawl: {0} page(s), {1} left, {2} item(s), " \
+            "{3:.1f} pages/s, {4:.1f} items/s".format(
+                stats["pages_done"], stats["frontier"], stats["items_found"],
+                stats["pages_per_sec"], stats["items_per_sec"])
+        if "units" in stats:
+            units = stats["units"]
+            status += ", {0}/{1} {2}".format(
+                units["done"], "?" if units["total"] is None
+                else units["total"], units["name"])
+        return status + ", ETA " + format_duration(stats["eta_secs"])
+
+    def report(self, force=False):
+        """ Write the status line and the stats, if interval_secs elapsed
+        since the last report or if force is set."""
+
+        with self.lock:
+            now = self.clock()
+            if not force and now - self.last_report_time < self.interval_secs:
+                return
+            self.last_report_time = now
+
+        with self.report_lock:
+            stats = self.get_stats()
+            if self.status_file:
+                status = self.format_status(stats)
+                if self.status_file.isatty():
+                    # Rewrite the line in place, clearing its end
+                    self.status_file.write("\r" + status + "\033[K")
+                else:
+                    self.status_file.write(status + "\n")
+                self.status_file.flush()
+            if self.stats_filepath:
+                common.write_file_atomically(
+                    self.stats_filepath, json.dumps(stats, indent=4))
+
+    def close(self):
+        """ Write the final status line and stats."""
+
+        self.report(force=True)
+        if self.status_file and self.status_file.isatty():
+            self.status_file.write("\n")
+
+
+def create_progress(status_line=False, stats_filepath=None,
+                    interval_secs=1.0):
+    """ Return a CrawlProgress writing its status line to stderr if
+    status_line is set, and its stats to stats_filepath if set, None if
+    neither is.
+
+    >>> create_progress()
+    >>> create_progress(status_line=True).stats_filepath
+    """
+    if not status_line and not stats_filepath:
+        return None
+
+    return CrawlProgress(
+        sys.stderr if status_line else None, stats_filepath, interval_secs)
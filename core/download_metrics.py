@@ -0,0 +1,298 @@
+from core.rate_limiter import classify_url
+from core import common
+
+from collections import OrderedDict
+import json
+import logging
+import signal
+import threading
+
+
+FORMATS = ["json", "prometheus"]
+
+# Upper bounds of the buckets of every histogram, the last bucket (+Inf)
+# counting every value
+SECS_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+HISTOGRAM_BUCKETS = OrderedDict([
+    ("latency_secs", SECS_BUCKETS),
+    ("wait_secs", SECS_BUCKETS),
+    ("download_secs", SECS_BUCKETS),
+    ("response_bytes", [
+        1000, 10000, 50000, 100000, 250000, 500000, 1000000, 5000000]),
+    ("retries", [0, 1, 2, 3, 5, 10]),
+])
+
+HISTOGRAM_DESCRIPTIONS = OrderedDict([
+    ("latency_secs",
+        "Time of the attempts: connection, server wait and body download"),
+    ("wait_secs", "Time until the headers of the responses are received"),
+    ("download_secs",
+        "Time downloading and decompressing the body of the responses"),
+    ("response_bytes", "Size of the responses, decompressed"),
+    ("retries", "Retries per request"),
+])
+
+PROMETHEUS_PREFIX = "facebook_downloader_"
+
+PROMETHEUS_COUNTERS = OrderedDict([
+    ("requests", "Requests, retries not included"),
+    ("attempts", "Attempts sent to the server"),
+    ("cache_hits", "Pages returned by the page cache"),
+    ("timeouts", "Attempts which timed out"),
+    ("connection_errors", "Attempts which failed to connect"),
+    ("request_errors",
+        "Attempts which failed otherwise, e.g. invalid responses"),
+])
+
+# Counters of the attempts which failed without response
+ERROR_COUNTERS = ["timeouts", "connection_errors", "request_errors"]
+
+
+class Histogram:
+    """ Count of values per bucket, see HISTOGRAM_BUCKETS, with their sum.
+
+    >>> histogram = Histogram([1, 10])
+    >>> for value in [0.5, 1, 5, 50]:
+    ...     histogram.observe(value)
+    >>> histogram.to_dict()
+    OrderedDict([('count', 4), ('sum', 56.5), ('buckets', \
+OrderedDict([('1', 2), ('10', 3), ('+Inf', 4)]))])
+    """
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        for bucket_no, bound in enumerate(self.bounds):
+            if value <= bound:
+                break
+        else:
+            bucket_no = len(self.bounds)
+        self.counts[bucket_no] += 1
+        self.count += 1
+        self.sum += value
+
+    def get_cumulative_counts(self):
+        """ Return (upper bound, count of values up to it), as in the
+        Prometheus format."""
+
+        cumulative_count = 0
+        for bound, count in zip(
+                [format_bound(bound) for bound in self.bounds] + ["+Inf"],
+                self.counts):
+            cumulative_count += count
+            yield bound, cumulative_count
+
+    def to_dict(self):
+        return OrderedDict([
+            ("count", self.count),
+            ("sum", round(self.sum, 6)),
+            ("buckets", OrderedDict(self.get_cumulative_counts()))
+        ])
+
+
+def format_bound(bound):
+    """
+    >>> format_bound(0.25), format_bound(1000), format_bound(1)
+    ('0.25', '1000', '1')
+    """
+    return "{0:g}".format(bound) if bound < 1e6 else str(int(bound))
+
+
+class DownloadMetrics:
+    """ Per class of url, see classify_url: the requests, attempts, status
+    codes, failed attempts, see ERROR_COUNTERS, and histograms of the
+    latency, the size of the responses and the retries, see
+    HISTOGRAM_BUCKETS.
+
+    >>> metrics = DownloadMetrics()
+    >>> url = "https://mbasic.facebook.com/mark/about"
+    >>> metrics.record_error(url, 15.0, "timeouts")
+    >>> metrics.record_response(url, 200, 2.0, 0.5, 20000)
+    >>> metrics.record_request(url, attempts=2)
+    >>> stats = metrics.get_stats()["about"]
+    >>> stats["attempts"], stats["timeouts"], stats["status_codes"]
+    (2, 1, OrderedDict([('200', 1)]))
+    >>> stats["histograms"]["latency_secs"]["buckets"]["2.5"]
+    1
+    """
+
+    def __init__(self):
+        self.stats = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_url_stats(self, url):
+        """ Return the stats of the class of url, the lock being held."""
+
+        url_class = classify_url(url)
+        stats = self.stats.get(url_class)
+        if stats is None:
+            stats = self.stats[url_class] = OrderedDict(
+                [(counter, 0) for counter in PROMETHEUS_COUNTERS] +
+                [("status_codes", OrderedDict()),
+                 ("histograms", OrderedDict(
+                     (name, Histogram(bounds))
+                     for name, bounds in HISTOGRAM_BUCKETS.items()))])
+        return stats
+
+    def record_cache_hit(self, url):
+        with self.lock:
+            stats = self.get_url_stats(url)
+            stats["requests"] += 1
+            stats["cache_hits"] += 1
+
+    def record_response(self, url, status_code, latency_secs, wait_secs,
+                        response_bytes):
+        """ Record an attempt answered by the server after latency_secs,
+        its headers being received after wait_secs."""
+
+        with self.lock:
+            stats = self.get_url_stats(url)
+            stats["attempts"] += 1
+            status_code = str(status_code)
+            stats["status_codes"][status_code] = \
+                stats["status_codes"].get(status_code, 0) + 1
+            histograms = stats["histograms"]
+            histograms["latency_secs"].observe(latency_secs)
+            histograms["wait_secs"].observe(wait_secs)
+            histograms["download_secs"].observe(
+                max(0.0, latency_secs - wait_secs))
+            histograms["response_bytes"].observe(response_bytes)
+
+    def record_error(self, url, latency_secs, counter="connection_errors"):
+        """ Record an attempt which failed after latency_secs, without
+        response, counter being one of ERROR_COUNTERS."""
+
+        with self.lock:
+            stats = self.get_url_stats(url)
+            stats["attempts"] += 1
+            stats[counter] += 1
+            stats["histograms"]["latency_secs"].observe(latency_secs)
+
+    def record_request(self, url, attempts):
+        """ Record a request sent to the server, successful or not, once
+        attempts were made."""
+
+        with self.lock:
+            stats = self.get_url_stats(url)
+            stats["requests"] += 1
+            stats["histograms"]["retries"].observe(max(0, attempts - 1))
+
+    def get_stats(self):
+        """ Return the stats per class of url, histograms as dictionaries,
+        see Histogram.to_dict."""
+
+        with self.lock:
+            return OrderedDict(
+                (url_class, OrderedDict(
+                    [(key, value) for key, value in stats.items()
+                     if key not in ["status_codes", "histograms"]] +
+                    [("status_codes", OrderedDict(stats["status_codes"])),
+                     ("histograms", OrderedDict(
+                         (name, histogram.to_dict())
+                         for name, histogram in
+                         stats["histograms"].items()))]))
+                for url_class, stats in self.stats.items())
+
+    def to_json(self):
+        return json.dumps(self.get_stats(), indent=4)
+
+    def to_prometheus(self):
+        """ Return the stats in the Prometheus text format.
+
+        >>> metrics = DownloadMetrics()
+        >>> metrics.record_response(
+        ...     "https://mbasic.facebook.com/mark/about", 200, 0.2, 0.1, 1000)
+        >>> lines = metrics.to_prometheus().splitlines()
+        >>> lines[2]
+        'facebook_downloader_requests_total{url_class="about"} 0'
+        >>> [line for line in lines if "status_code" in line]
+        ['facebook_downloader_responses_total{url_class="about",\
+status_code="200"} 1']
+        >>> lines[lines.index(\
+"# TYPE facebook_downloader_latency_seconds histogram") + 3]
+        'facebook_downloader_latency_seconds_bucket{url_class="about",\
+le="0.25"} 1'
+        """
+        stats = self.get_stats()
+        lines = []
+
+        def add_metric(name, metric_type, help_text, samples):
+            name = PROMETHEUS_PREFIX + name
+            lines.append("# HELP {0} {1}".format(name, help_text))
+            lines.append("# TYPE {0} {1}".format(name, metric_type))
+            for suffix, labels, value in samples:
+                lines.append("{0}{1}{{{2}}} {3}".format(
+                    name, suffix, ",".join(
+                        '{0}="{1}"'.format(label, label_value)
+                        for label, label_value in labels), value))
+
+        for counter, help_text in PROMETHEUS_COUNTERS.items():
+            add_metric(
+                counter + "_total", "counter", help_text,
+                [("", [("url_class", url_class)], url_stats[counter])
+                 for url_class, url_stats in stats.items()])
+
+        add_metric(
+            "responses_total", "counter", "Responses per status code",
+            [("", [("url_class", url_class), ("status_code", status_code)],
+              count)
+             for url_class, url_stats in stats.items()
+             for status_code, count in url_stats["status_codes"].items()])
+
+        for name in HISTOGRAM_BUCKETS:
+            samples = []
+            for url_class, url_stats in stats.items():
+                histogram = url_stats["histograms"][name]
+                labels = [("url_class", url_class)]
+                samples += [
+                    ("_bucket", labels + [("le", bound)], count)
+                    for bound, count in histogram["buckets"].items()]
+                samples += [
+                    ("_sum", labels, histogram["sum"]),
+                    ("_count", labels, histogram["count"])]
+            add_metric(
+                name.replace("_secs", "_seconds"), "histogram",
+                HISTOGRAM_DESCRIPTIONS[name], samples)
+
+        return "\n".join(lines) + "\n"
+
+    def dump(self, filepath, metrics_format="json"):
+        """ Write the stats to filepath, in one of FORMATS, see
+        common.write_file_atomically."""
+
+        common.write_file_atomically(
+            filepath, self.to_prometheus() if metrics_format == "prometheus"
+            else self.to_json())
+        logging.info("Download metrics written to %s", filepath)
+
+    def log_stats(self):
+        for url_class, stats in self.get_stats().items():
+            latency = stats["histograms"]["latency_secs"]
+            logging.info(
+                "Downloads '%s': %s request(s), %s attempt(s), %s from the "
+                "cache, %s timeout(s), %.1fs spent in total, %s bytes "
+                "received", url_class, stats["requests"], stats["attempts"],
+                stats["cache_hits"], stats["timeouts"], latency["sum"],
+                stats["histograms"]["response_bytes"]["sum"])
+
+
+def dump_on_signal(dump, signum=getattr(signal, "SIGUSR1", None)):
+    """ Call dump whenever the process receives signum, SIGUSR1 by
+    default, e.g. kill -USR1 <pid>. Signals can only be handled from the
+    main thread, and SIGUSR1 does not exist on Windows: return whether the
+    handler was set."""
+
+    if signum is None or \
+       threading.current_thread() is not threading.main_thread():
+        return False
+
+    def handle_signal(signum, frame):
+        # The interrupted thread may hold the lock of the metrics
+        threading.Thread(target=dump, daemon=True).start()
+
+    signal.signal(signum, handle_signal)
+    return True
@@ -1,14 +1,51 @@
 #!  #!/usr/bin/env python3
 
 from core import common
+from core.retry_policy import RetryPolicy
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
 import logging
 import requests
+import time
+from requests.adapters import HTTPAdapter
+
+
+def create_session(pool_size):
+    """ Create a requests session keeping up to pool_size connections
+    alive per host, so that consecutive pages reuse the same TCP / TLS
+    connections instead of performing a new handshake every time."""
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class DownloadError(RuntimeError):
+    """ Error response of the server, or page without content, status_code
+    being the status code of the response."""
+
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
 
 
 class Downloader:
-    """Downloading URLs with headers set"""
+    """Downloading URLs with headers set
 
-    def __init__(self):
+    rate_limiter: if set, a RateLimiter that every request waits for.
+    retry_policy: RetryPolicy deciding which requests are retried and the
+    delays before retrying, exponential backoff by default.
+    page_cache: if set, a PageCache where pages are looked up before being
+    requested, and stored once downloaded.
+    metrics: if set, DownloadMetrics where the time, size, status and
+    retries of every request are recorded.
+    """
+
+    def __init__(self, pool_size=10, rate_limiter=None, retry_policy=None,
+                 page_cache=None, metrics=None):
         self.HEADERS = {
             "accept": "*/*",
             # Removed br (Brotli) so that requests can decode content
@@ -17,44 +54,132 @@ class Downloader:
             "user-agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36"
             " (KHTML, like Gecko) Chrome/64.0.3282.167 Safari/537.36",
         }
+        self.session = create_session(pool_size)
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.page_cache = page_cache
+        self.metrics = metrics
 
     def fetch_url(self, cookie, url, timeout_secs=15, retries=1):
-        headers = self.HEADERS
+        """ Return the response to a request to url, retrying on timeouts,
+        connection errors and temporary server errors, up to retries
+        attempts, after the delays of the retry policy."""
+
+        if self.page_cache:
+            cached_page = self.page_cache.get(url)
+            if cached_page:
+                logging.info(
+                    "Fetched %s from the cache",
+                    common.truncate_text(url, 200))
+                if self.metrics:
+                    self.metrics.record_cache_hit(url)
+                return cached_page
+
+        headers = dict(self.HEADERS)
         headers["cookie"] = cookie
 
         for attempt_no in range(1, retries + 1):
-            logging.info("Fetching {0} - Attempt {1}".format(
-                common.truncate_text(url, 200), attempt_no))
+            logging.info(
+                "Fetching %s - Attempt %s", common.truncate_text(url, 200),
+                attempt_no)
 
+            if self.rate_limiter:
+                self.rate_limiter.wait(url)
+
+            response = None
+            start_time = time.perf_counter()
             try:
-                response = requests.get(
+                response = self.session.get(
                     url=url, headers=headers,
                     allow_redirects=True, timeout=timeout_secs)
-
-                # Treat temporary server errors as timeout so that
-                # retries are performed
-                if response.status_code == 503:
-                    logging.warn(
-                        "Request to '{0}' failed, server error: {1} - ".format(
-                            common.truncate_text(url, 200),
-                            response.status_code) +
-                        "Treating as timeout to allow retries.")
-                    raise requests.exceptions.Timeout()
+                if self.metrics:
+                    # elapsed: until the headers of the response are parsed
+                    self.metrics.record_response(
+                        url, response.status_code,
+                        time.perf_counter() - start_time,
+                        response.elapsed.total_seconds(),
+                        len(response.content))
 
                 if response.status_code != 200 or not response.text:
-                    raise RuntimeError(
+                    error = DownloadError(
                         "Error while downloading page '{0}', "
                         "status code: '{1}' - headers: '{2}'".format(
                             common.truncate_text(url, 200),
-                            response.status_code, response.headers))
+                            response.status_code, response.headers),
+                        response.status_code)
+                    if attempt_no == retries or \
+                            not self.retry_policy.is_retryable_status(
+                                response.status_code):
+                        self.record_request(url, attempt_no)
+                        raise error
+
+                    logging.warn(
+                        "Request to '%s' failed, server error: %s",
+                        common.truncate_text(url, 200), response.status_code)
 
-                return response
+                else:
+                    if self.page_cache:
+                        self.page_cache.put(
+                            url, response.content, response.encoding)
+                    self.record_request(url, attempt_no)
+                    return response
 
-            except requests.exceptions.Timeout:
-                logging.warn("Request to '{0}' timed out".format(
-                    common.truncate_text(url, 200)))
+            except (requests.exceptions.Timeout,
+                    requests.exceptions.ConnectionError) as e:
+                logging.warn(
+                    "Request to '%s' failed: %s",
+                    common.truncate_text(url, 200), repr(e))
+                if self.metrics:
+                    self.metrics.record_error(
+                        url, time.perf_counter() - start_time,
+                        "timeouts" if isinstance(
+                            e, requests.exceptions.Timeout)
+                        else "connection_errors")
                 if attempt_no == retries:
+                    self.record_request(url, attempt_no)
                     raise
 
+            except requests.exceptions.RequestException as e:
+                # Not retried, e.g. invalid urls, too many redirects or
+                # bodies which could not be decoded
+                if self.metrics:
+                    self.metrics.record_error(
+                        url, time.perf_counter() - start_time,
+                        "request_errors")
+                self.record_request(url, attempt_no)
+                raise
+
+            delay = self.retry_policy.wait(attempt_no, response)
+            logging.info(
+                "Retried %s after %.1fs", common.truncate_text(url, 200),
+                delay)
+
         assert False, "Downloader.fetch_url - Should never reach this point"
         return None
+
+    def record_request(self, url, attempts):
+        if self.metrics:
+            self.metrics.record_request(url, attempts)
+
+
+class AsyncDownloader:
+    """Downloading URLs from coroutines.
+
+    Requests are performed by a Downloader running in a pool of
+    max_in_flight threads, which bounds the number of requests in flight.
+    """
+
+    def __init__(self, downloader, max_in_flight=10):
+        self.downloader = downloader
+        self.executor = ThreadPoolExecutor(max_workers=max_in_flight)
+
+    async def fetch_url(self, cookie, url, timeout_secs=15, retries=1):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(
+                self.downloader.fetch_url, cookie=cookie, url=url,
+                timeout_secs=timeout_secs, retries=retries))
+
+    def close(self):
+        """ Stop the threads once the requests in flight are done."""
+        self.executor.shutdown()
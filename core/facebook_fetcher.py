@@ -1,20 +1,97 @@
-from core.downloader import Downloader
-from core.facebook_soup_parser import FacebookSoupParser
+from core.download_metrics import DownloadMetrics, dump_on_signal
+from core.downloader import DownloadError, Downloader
+from core.facebook_lxml_parser import FacebookLxmlParser
+from core.facebook_soup_parser import FacebookSoupParser, GenericResult
+from core.page_cache import PageCache
+from core.page_size_controller import PageSizeController
+from core.rate_limiter import RateLimiter
 from core import common
 from core import model
 
 from collections import OrderedDict
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime
+import atexit
+import functools
 import logging
 import re
+import threading
+import time
 
 
-def create_production_fetcher(config):
+# Parameters removed by strip_link_refs, with their value
+REF_PARAMETERS_REGEX = re.compile(r"(?<=[?&])(?:refid|fref)=[^&#]*&?")
 
-    downloader = Downloader()
-    fb_parser = FacebookSoupParser()
 
-    return FacebookFetcher(downloader, fb_parser, config)
+def create_parser(config):
+    """ Return the parser selected in the configuration.
+
+    >>> type(create_parser(common.Config(*[None] * 5, parser="lxml")))
+    <class 'core.facebook_lxml_parser.FacebookLxmlParser'>
+    """
+    if config.parser == "lxml":
+        return FacebookLxmlParser()
+    return FacebookSoupParser()
+
+
+def create_page_cache(config):
+    """ Return the PageCache set in the configuration, None if caching is
+    disabled.
+
+    >>> create_page_cache(common.Config(*[-1] + [None] * 4))
+    >>> cache = create_page_cache(common.Config(*[3600] + [None] * 4, \
+page_cache={"path": ":memory:", "ttls": {"timeline": 0}}))
+    >>> cache.default_ttl, cache.ttls["timeline"], cache.ttls["about"]
+    (3600, 0, 3600)
+    >>> create_page_cache(common.Config(*[0] + [None] * 4, \
+page_cache={"path": ":memory:"})).ttls["about"]
+    259200
+    """
+    if config.caching_secs == -1:
+        return None
+
+    return PageCache(default_ttl=config.caching_secs, **config.page_cache)
+
+
+def create_downloader(config, pool_size):
+    """ Return a Downloader rate limited and caching pages as set in the
+    configuration, the time spent waiting, the cache usage and the download
+    metrics being logged at exit.
+
+    The download metrics are also written to the file set in the
+    configuration, if any, at exit and whenever SIGUSR1 is received."""
+
+    rate_limiter = RateLimiter(config.rate_limits)
+    atexit.register(rate_limiter.log_stats)
+    page_cache = create_page_cache(config)
+    if page_cache:
+        atexit.register(page_cache.log_stats)
+    metrics = DownloadMetrics()
+    atexit.register(metrics.log_stats)
+    if config.metrics.get("path"):
+        dump_metrics = functools.partial(
+            metrics.dump, config.metrics["path"],
+            config.metrics.get("format", "json"))
+        atexit.register(dump_metrics)
+        dump_on_signal(dump_metrics)
+    return Downloader(
+        pool_size, rate_limiter, page_cache=page_cache, metrics=metrics)
+
+
+def create_production_fetcher(config, workers=1, progress=None):
+    """ progress: if set, a CrawlProgress where the progress of the crawls is
+    reported, and reported a last time at exit."""
+
+    # Users and their sub-crawls each run in a pool of workers threads
+    downloader = create_downloader(config, pool_size=max(10, 2 * workers))
+    fb_parser = create_parser(config)
+
+    if progress:
+        atexit.register(progress.close)
+
+    return FacebookFetcher(downloader, fb_parser, config, workers, progress)
 
 
 def build_buddy_feed_url(user_id):
@@ -156,6 +233,43 @@ def strip_link_refs(link):
     return link
 
 
+def normalize_url(url):
+    """ Return the url without its refid / fref parameters, like
+    strip_link_refs, other parameters being kept.
+
+    >>> normalize_url("/profile.php?id=1234&fref=none&refid=17")
+    '/profile.php?id=1234'
+    >>> normalize_url("/profile.php?v=likes&refid=17&startindex=24")
+    '/profile.php?v=likes&startindex=24'
+    >>> normalize_url("/SomeGroup/?refid=17")
+    '/SomeGroup/'
+    """
+    return REF_PARAMETERS_REGEX.sub("", url).rstrip("?&")
+
+
+def add_links_to_explore(see_more_links, links_to_explore, visited):
+    """ Append the urls of the links not visited yet to links_to_explore,
+    mark them as visited and return the number of duplicates skipped.
+
+    >>> links_to_explore = []
+    >>> visited = set(["https://mbasic.facebook.com/likes"])
+    >>> add_links_to_explore(["/likes?refid=17", "/more?s=24&refid=17", \
+"/more?s=24"], links_to_explore, visited)
+    2
+    >>> links_to_explore
+    ['https://mbasic.facebook.com/more?s=24&refid=17']
+    """
+    duplicates = 0
+    for link in see_more_links:
+        url = build_relative_url(link)
+        if normalize_url(url) in visited:
+            duplicates += 1
+            continue
+        visited.add(normalize_url(url))
+        links_to_explore.append(url)
+    return duplicates
+
+
 def is_user(username):
     """
     >>> is_user("SomeName/")
@@ -177,14 +291,237 @@ def is_user(username):
         return True
 
 
+def build_about_page_url(user_ref):
+    user_id = get_user_id(user_ref)
+    if user_id:
+        return build_about_page_url_from_id(user_id)
+    else:
+        return build_about_page_url_from_username(user_ref)
+
+
+def build_timeline_page_url(user_ref):
+    user_id = get_user_id(user_ref)
+    if user_id:
+        return build_timeline_page_url_from_id(user_id)
+    else:
+        return build_timeline_page_url_from_username(user_ref)
+
+
+def merge_generic_result(content, generic_result):
+    """ Merge the content of a GenericResult into content, stripping refs
+    from links.
+
+    >>> content = OrderedDict([('c1', OrderedDict([('link1', 'Item 1')]))])
+    >>> merge_generic_result(content, GenericResult(
+    ...     content=OrderedDict([
+    ...         ('c1', OrderedDict([('link2?fref=none', 'Item 2')])),
+    ...         ('c2', OrderedDict([('link3/?refid=17', 'Item 3')]))]),
+    ...     see_more_links=[]))
+    >>> content
+    OrderedDict([('c1', OrderedDict([('link1', 'Item 1'), \
+('link2', 'Item 2')])), ('c2', OrderedDict([('link3/', 'Item 3')]))])
+    """
+    for category in generic_result.content:
+        if category not in content:
+            content[category] = OrderedDict()
+        processed_content = OrderedDict()
+        for link in generic_result.content[category]:
+            processed_content[strip_link_refs(link)] = \
+                generic_result.content[category][link]
+
+        content[category].update(processed_content)
+
+
+def build_friend_list(content, category="friends"):
+    """ Map usernames to names from the content of a friends page crawl.
+
+    >>> build_friend_list(OrderedDict([('friends', OrderedDict([\
+('username1', 'Mark')]))]))
+    OrderedDict([('username1', {'name': 'Mark'})])
+    >>> build_friend_list(OrderedDict())
+    OrderedDict()
+    """
+    friend_list = OrderedDict()
+
+    if not content or category not in content:
+        logging.error("Error while fetching %s", category.replace("_", " "))
+        return friend_list
+
+    for username in content[category]:
+        friend_list[username] = {"name": content[category][username]}
+
+    return friend_list
+
+
+def count_liked_pages(liked_pages):
+    """
+    >>> count_liked_pages(OrderedDict([('c1', OrderedDict([('l1', 'P1')])), \
+('c2', OrderedDict([('l2', 'P2'), ('l3', 'P3')]))]))
+    3
+    """
+    liked_page_count = 0
+    for category in liked_pages:
+        liked_page_count += len(liked_pages[category])
+    return liked_page_count
+
+
+def build_see_more_reactions_url(see_more_link):
+    """ Return the url of the next reaction page, with a placeholder for
+    the number of likes per page, or None if the link is unexpected.
+
+    >>> build_see_more_reactions_url(
+    ...     "/ufi/reaction/profile/browser/fetch/?limit=10&total_count=4")
+    'https://mbasic.facebook.com/ufi/reaction/profile/browser/fetch/?\
+limit={0}&total_count=4'
+    >>> build_see_more_reactions_url("/ufi/reaction/badLink")
+    """
+    see_more_link = build_relative_url(see_more_link)
+
+    logging.info(
+        "Found see more link: %s", common.truncate_text(see_more_link, 200))
+    if "limit=10" not in see_more_link:
+        logging.error(
+            "See more link found does not match "
+            "the expected pattern.")
+        return None
+
+    return see_more_link.replace("limit=10", "limit={0}")
+
+
+def is_valid_article(article):
+    """ Return True if article is a dictionary containing the key post_id,
+    log an error otherwise.
+
+    >>> is_valid_article({"post_id": 1}), is_valid_article({"id": 1})
+    (True, False)
+    >>> is_valid_article("1")
+    False
+    """
+    if isinstance(article, dict) and "post_id" in article:
+        return True
+
+    logging.error(
+        "Invalid input, every article must be a dictionary containing the "
+        "key post_id, got: %s", common.truncate_text(repr(article), 200))
+    return False
+
+
+def is_page_size_failure(exception):
+    """ Return True if a reaction page failed in a way its size may explain:
+    a server error or a page without content, unlike a timeout or a
+    connection error.
+
+    >>> is_page_size_failure(DownloadError("Gateway timeout", 504))
+    True
+    >>> is_page_size_failure(DownloadError("Not found", 404))
+    False
+    >>> is_page_size_failure(RuntimeError("Connection reset"))
+    False
+    """
+    status_code = getattr(exception, "status_code", None)
+    return status_code is not None and \
+        (status_code >= 500 or status_code == 200)
+
+
+def add_reactions(reactions_per_user, article, likers, exclude_non_users):
+    """ Add article to the likes of every user in likers.
+
+    >>> reactions = OrderedDict()
+    >>> add_reactions(reactions, {"post_id": 1}, ["user1", "page1/"], True)
+    >>> reactions
+    OrderedDict([('user1', {'likes': [{'post_id': 1}]})])
+    """
+    for username in likers:
+        if not exclude_non_users or \
+                (exclude_non_users and is_user(username)):
+            if username not in reactions_per_user:
+                reactions_per_user[username] = {}
+                reactions_per_user[username]["likes"] = []
+            reactions_per_user[username]["likes"].append(
+                article
+            )
+
+
+def count_items(generic_result):
+    """ Return the number of items of every category of a GenericResult.
+
+    >>> count_items(GenericResult(content=OrderedDict([
+    ...     ('c1', OrderedDict([('link1', 'Item 1'), ('link2', 'Item 2')])),
+    ...     ('c2', OrderedDict([('link3', 'Item 3')]))]), see_more_links=[]))
+    3
+    """
+    return sum(len(items) for items in generic_result.content.values())
+
+
+def get_known_posts(known_articles, user_ref):
+    """ Return the posts of user_ref in known_articles, a previous result of
+    fetch_articles_from_timeline, possibly loaded from JSON where user refs
+    and post ids are strings.
+
+    >>> get_known_posts({"1": {"posts": {"10": {"post_id": 10}}}}, 1)
+    {'10': {'post_id': 10}}
+    >>> get_known_posts({}, "username")
+    {}
+    """
+    if not known_articles:
+        return {}
+    user_articles = known_articles.get(user_ref) or \
+        known_articles.get(str(user_ref)) or {}
+    return user_articles.get("posts", {})
+
+
+def is_refresh_complete(articles, known_post_ids, refresh_since=None):
+    """ Return True if a timeline page only contains known posts, none of
+    them posted after refresh_since, so that older pages need not be
+    fetched again. A page without posts, e.g. a page which failed to parse,
+    does not complete the refresh.
+
+    >>> posts = {1: {"post_id": 1, "date": "2008-05-13 10:02:00"}}
+    >>> is_refresh_complete(posts, {1})
+    True
+    >>> is_refresh_complete(posts, {2})
+    False
+    >>> is_refresh_complete(posts, {1}, datetime(2008, 5, 1))
+    False
+    >>> is_refresh_complete(posts, {1}, datetime(2008, 6, 1))
+    True
+    >>> is_refresh_complete({}, {1})
+    False
+    """
+    if not articles:
+        return False
+
+    for article_id, article in articles.items():
+        if article.get("post_id", article_id) not in known_post_ids:
+            return False
+        if refresh_since is None:
+            continue
+        try:
+            date = datetime.fromisoformat(article.get("date"))
+        except (TypeError, ValueError):
+            continue
+        if date >= refresh_since:
+            return False
+    return True
+
+
 class FacebookFetcher:
 
-    def __init__(self, downloader, fb_parser, config):
+    def __init__(self, downloader, fb_parser, config, workers=1,
+                 progress=None):
         self.downloader = downloader
         self.fb_parser = fb_parser
         self.cookie = common.build_cookie(config)
         self.buddy_feed_url = build_buddy_feed_url(config.cookie_c_user)
         self.c_user = config.cookie_c_user
+        self.workers = workers
+        # Links already explored by fetch_content_recursively, not fetched
+        self.duplicate_links_skipped = 0
+        self.duplicate_links_lock = threading.Lock()
+        # Number of likers requested per reaction page
+        self.page_size_controller = PageSizeController()
+        # CrawlProgress where pages, items and users / posts are reported
+        self.progress = progress
 
     def fetch_last_active_times(self):
         """ Returns an OrderedDict, mapping user_id to list of epoch times.
@@ -201,57 +538,79 @@ class FacebookFetcher:
 
         except Exception as e:
             logging.error(
-                "Error while downloading page '{0}', "
-                "got exception: '{1}'".format(self.buddy_feed_url, e))
+                "Error while downloading page '%s', "
+                "got exception: '%s'", self.buddy_feed_url, e)
             return OrderedDict()
 
-    def fetch_content_recursively(self, initial_url, parsing_function):
-
-        content = OrderedDict()
+    def iter_content_recursively(self, initial_url, parsing_function):
+        """ Explore the pages linked by the see_more_links returned by
+        parsing_function, every page being fetched once, whatever its refid /
+        fref parameters. Yield the result of every page as it is parsed."""
 
         links_to_explore = [initial_url]
+        visited = set([normalize_url(initial_url)])
         links_explored = 0
-        while links_to_explore:
+        duplicates = 0
+        crawl_id = self.progress.start_crawl() if self.progress else None
+        try:
+            while links_to_explore:
 
-            url = links_to_explore.pop()
+                url = links_to_explore.pop()
 
-            logging.info(
-                "Exploring page {0} - {1} left after, ".format(
-                    links_explored + 1, len(links_to_explore)) +
-                "url: {0}".format(url))
+                logging.info(
+                    "Exploring page %s - %s left after, url: %s",
+                    links_explored + 1, len(links_to_explore), url)
+
+                likes_results = None
+                try:
+                    response = self.downloader.fetch_url(
+                        cookie=self.cookie, url=url,
+                        timeout_secs=15, retries=5)
+                    likes_results = parsing_function(response.text)
+                    if likes_results:
+                        logging.info("Found items: %s", likes_results.content)
+
+                        if likes_results.see_more_links:
+                            logging.info(
+                                "Found more links to explore: %s",
+                                likes_results.see_more_links)
+                            duplicates += add_links_to_explore(
+                                likes_results.see_more_links, links_to_explore,
+                                visited)
+
+                except Exception as e:
+                    logging.error(
+                        "Error while downloading page '%s', "
+                        "got exception: '%s'", url, e)
+
+                links_explored += 1
+                if self.progress:
+                    self.progress.record_page(
+                        crawl_id, count_items(likes_results)
+                        if likes_results else 0, len(links_to_explore))
 
-            try:
-                response = self.downloader.fetch_url(
-                    cookie=self.cookie, url=url,
-                    timeout_secs=15, retries=5)
-                likes_results = parsing_function(response.text)
                 if likes_results:
-                    logging.info("Found items: {0}".format(
-                        likes_results.content))
-                    for category in likes_results.content:
-                        if category not in content:
-                            content[category] = OrderedDict()
-                        processed_content = OrderedDict()
-                        for link in likes_results.content[category]:
-                            processed_content[strip_link_refs(link)] = \
-                                likes_results.content[category][link]
-
-                        content[category].update(processed_content)
-
-                    if likes_results.see_more_links:
-                        logging.info("Found more links to explore: {0}".format(
-                            likes_results.see_more_links))
-                        links_to_explore.extend(
-                            [build_relative_url(link)
-                                for link in likes_results.see_more_links])
+                    yield likes_results
 
-            except Exception as e:
-                logging.error(
-                    "Error while downloading page '{0}', "
-                    "got exception: '{1}'".format(url, e))
+        finally:
+            if self.progress:
+                self.progress.finish_crawl(crawl_id)
+
+        if duplicates:
+            logging.info(
+                "Skipped %s link(s) already explored from %s", duplicates,
+                initial_url)
+            with self.duplicate_links_lock:
+                self.duplicate_links_skipped += duplicates
 
-            links_explored += 1
+    def fetch_content_recursively(self, initial_url, parsing_function):
+        """ Return the content of all the pages explored, see
+        iter_content_recursively."""
 
+        content = OrderedDict()
+        for result in self.iter_content_recursively(
+                initial_url, parsing_function):
+            merge_generic_result(content, result)
         return content
 
     def do_fetch_friends(self, user_id):
@@ -260,32 +619,42 @@ class FacebookFetcher:
             build_friends_page_from_id(user_id),
             lambda content: self.fb_parser.parse_friends_page(content))
 
-        friend_list = OrderedDict()
-
-        if not content or "friends" not in content:
-            logging.error("Error while fetching friend list")
-            return friend_list
-
-        for username in content["friends"]:
-            friend_name = content["friends"][username]
-            friend_list[username] = {"name": friend_name}
+        friend_list = build_friend_list(content)
 
-        logging.info("Friends of user '{0}': {1}".format(
-            user_id, common.prettify(friend_list)))
+        logging.info(
+            "Friends of user '%s': %s", user_id,
+            common.LazyPrettify(friend_list))
 
         return friend_list
 
     def fetch_user_friend_list(self):
         return self.do_fetch_friends(self.c_user)
 
+    def iter_user_friend_list(self):
+        """ Yield (username, friend) for every friend, as the friends pages
+        are parsed, see fetch_user_friend_list."""
+
+        usernames_found = set()
+        for result in self.iter_content_recursively(
+                build_friends_page_from_id(self.c_user),
+                lambda content: self.fb_parser.parse_friends_page(content)):
+
+            content = OrderedDict()
+            merge_generic_result(content, result)
+            for username, name in content.get("friends", {}).items():
+                if username not in usernames_found:
+                    usernames_found.add(username)
+                    yield username, {"name": name}
+
     def do_fetch_liked_pages(self, user_id):
 
         result = self.fetch_content_recursively(
             build_likes_page_from_id(user_id),
             lambda content: self.fb_parser.parse_likes_page(content))
 
-        logging.info("Liked pages of user '{0}': {1}".format(
-            user_id, common.prettify(result)))
+        logging.info(
+            "Liked pages of user '%s': %s", user_id,
+            common.LazyPrettify(result))
 
         return result
 
@@ -296,21 +665,88 @@ class FacebookFetcher:
                 self.c_user, user_id),
             lambda content: self.fb_parser.parse_mutual_friends_page(content))
 
-        mutual_friends = OrderedDict()
+        mutual_friends = build_friend_list(result, "mutual_friends")
+
+        logging.info(
+            "Mutual friends for user '%s': %s", user_id,
+            common.LazyPrettify(mutual_friends))
 
-        if not result or "mutual_friends" not in result:
-            logging.error("Error while fetching mutual friends")
-            return mutual_friends
+        return mutual_friends
 
-        for mutual_friend_link in result["mutual_friends"]:
-            friend_name = result["mutual_friends"][mutual_friend_link]
-            username = mutual_friend_link
-            mutual_friends[username] = {"name": friend_name}
+    def fetch_user_info(self, user_ref,
+                        fetch_friends, fetch_likes, fetch_mutual_friends,
+                        executor=None):
+        """ Fetch details about a single user, see fetch_user_infos.
 
-        logging.info("Mutual friends for user '{0}': {1}".format(
-            user_id, common.prettify(mutual_friends)))
+        Returns None if the about page could not be fetched and user_ref is
+        not an id.
 
-        return mutual_friends
+        executor: if set, friends, likes and mutual friends are fetched
+        concurrently using it.
+        """
+
+        user_id = get_user_id(user_ref)
+        url = build_about_page_url(user_ref)
+
+        try:
+            response = self.downloader.fetch_url(
+                cookie=self.cookie, url=url, timeout_secs=30, retries=5)
+
+            user_infos = self.fb_parser.parse_about_page(
+                response.text)
+            if self.progress:
+                self.progress.record_page()
+            if not user_infos \
+               or "id" not in user_infos or not user_infos["id"]:
+                raise RuntimeError(
+                    "Failed to extract infos for user {0}".format(
+                        user_ref))
+
+            logging.info(
+                "Got infos for user '%s' - %s", user_ref,
+                common.LazyPrettify(user_infos))
+
+            crawls = OrderedDict()
+            if fetch_friends:
+                crawls["friends"] = self.do_fetch_friends
+            if fetch_likes:
+                crawls["liked_pages"] = self.do_fetch_liked_pages
+            if fetch_mutual_friends:
+                crawls["mutual_friends"] = self.do_fetch_mutual_friends
+
+            if executor:
+                futures = [
+                    (key, executor.submit(crawl, user_infos["id"]))
+                    for key, crawl in crawls.items()]
+                crawled = {key: future.result() for key, future in futures}
+            else:
+                crawled = {
+                    key: crawl(user_infos["id"])
+                    for key, crawl in crawls.items()}
+
+            if fetch_friends:
+                user_infos["friends"] = crawled["friends"]
+                user_infos["friend_count"] = len(user_infos["friends"])
+
+            if fetch_likes:
+                user_infos["liked_pages"] = crawled["liked_pages"]
+                user_infos["liked_page_count"] = \
+                    count_liked_pages(user_infos["liked_pages"])
+
+            if fetch_mutual_friends:
+                user_infos["mutual_friends"] = crawled["mutual_friends"]
+                user_infos["mutual_friend_count"] = \
+                    len(user_infos["mutual_friends"])
+
+            return user_infos
+
+        except Exception as e:
+            logging.error(
+                "Error while downloading page '%s', "
+                "got exception: '%s'", url, e)
+            if user_id:
+                return OrderedDict([("id", user_id)])
+            return None
 
     def fetch_user_infos(self, user_refs,
                          fetch_friends, fetch_likes, fetch_mutual_friends):
@@ -322,151 +758,435 @@ class FacebookFetcher:
         Only the first page of mutual friends is fetched / parsed.
         Adding "&startindex=36" to the url would return the next 35 friends
         and so on...
-        """
 
-        logging.info(
-            "Querying '{0}' users from Facebook".
-            format(len(user_refs)))
-
-        infos = {}
-        for user_no, user_ref in enumerate(user_refs, 1):
+        When the fetcher has more than one worker, users and their
+        sub-crawls are processed concurrently, results are returned in the
+        same order.
+        """
 
-            logging.info("Processing user '{0}' - {1}/{2}".format(
-                user_ref, user_no, len(user_refs)))
+        return dict(self.iter_user_infos(
+            user_refs, fetch_friends, fetch_likes, fetch_mutual_friends))
 
-            user_id = get_user_id(user_ref)
-            if user_id:
-                url = build_about_page_url_from_id(user_id)
-            else:
-                url = build_about_page_url_from_username(user_ref)
+    def iter_user_infos(self, user_refs,
+                        fetch_friends, fetch_likes, fetch_mutual_friends):
+        """ Yield (user_ref, user_infos) for every user found, in the order of
+        user_refs, as soon as the details of the user are fetched, see
+        fetch_user_infos.
 
-            try:
-                response = self.downloader.fetch_url(
-                    cookie=self.cookie, url=url, timeout_secs=30, retries=5)
+        Users are only fetched when the next user is requested, up to workers
+        users ahead: stopping the iteration stops the crawl.
+        """
 
-                user_infos = self.fb_parser.parse_about_page(
-                    response.text)
-                if not user_infos \
-                   or "id" not in user_infos or not user_infos["id"]:
-                    raise RuntimeError(
-                        "Failed to extract infos for user {0}".format(
-                            user_ref))
-
-                logging.info("Got infos for user '{0}' - {1}".format(
-                    user_ref, common.prettify(user_infos)))
-
-                if fetch_friends:
-                    user_infos["friends"] = self.do_fetch_friends(
-                        user_infos["id"])
-                    user_infos["friend_count"] = len(user_infos["friends"])
-
-                if fetch_likes:
-                    liked_pages = self.do_fetch_liked_pages(
-                        user_infos["id"])
-                    liked_page_count = 0
-                    for category in liked_pages:
-                        liked_page_count += len(liked_pages[category])
-                    user_infos["liked_pages"] = liked_pages
-                    user_infos["liked_page_count"] = liked_page_count
-
-                if fetch_mutual_friends:
-                    user_infos["mutual_friends"] = \
-                        self.do_fetch_mutual_friends(user_infos["id"])
-                    user_infos["mutual_friend_count"] = \
-                        len(user_infos["mutual_friends"])
-
-                infos[user_ref] = user_infos
+        user_refs = list(user_refs)
+        logging.info("Querying '%s' users from Facebook", len(user_refs))
+        if self.progress:
+            self.progress.start_units("users", len(user_refs))
+
+        if self.workers > 1:
+            # Sub-crawls get their own pool: users waiting for them must
+            # not prevent them from running
+            with ThreadPoolExecutor(self.workers) as users_executor, \
+                    ThreadPoolExecutor(self.workers) as crawls_executor:
+
+                def submit(user_ref):
+                    return users_executor.submit(
+                        self.fetch_user_info, user_ref, fetch_friends,
+                        fetch_likes, fetch_mutual_friends, crawls_executor)
+
+                futures = deque(
+                    submit(user_ref) for user_ref in user_refs[:self.workers])
+
+                for user_no, user_ref in enumerate(user_refs, 1):
+                    future = futures.popleft()
+                    if user_no + self.workers <= len(user_refs):
+                        futures.append(
+                            submit(user_refs[user_no + self.workers - 1]))
+                    user_infos = future.result()
+                    logging.info(
+                        "Processed user '%s' - %s/%s", user_ref, user_no,
+                        len(user_refs))
+                    if self.progress:
+                        self.progress.record_unit()
+                    if user_infos:
+                        yield user_ref, user_infos
 
-            except Exception as e:
-                if user_id:
-                    infos[user_ref] = OrderedDict([("id", user_id)])
-                logging.error(
-                    "Error while downloading page '{0}', "
-                    "got exception: '{1}'".format(url, e))
+            return
 
-        return infos
+        for user_no, user_ref in enumerate(user_refs, 1):
 
-    def fetch_articles_from_timeline(self, user_refs):
+            logging.info(
+                "Processing user '%s' - %s/%s", user_ref, user_no,
+                len(user_refs))
+
+            user_infos = self.fetch_user_info(
+                user_ref, fetch_friends, fetch_likes, fetch_mutual_friends)
+            if self.progress:
+                self.progress.record_unit()
+            if user_infos:
+                yield user_ref, user_infos
+
+    def fetch_articles_from_timeline(self, user_refs, checkpoint=None,
+                                     known_articles=None, refresh_since=None):
         """ For every user_ref provided, return a dictionary mapping article id
-        to time of the post."""
+        to time of the post.
 
-        articles_found = OrderedDict()
+        checkpoint: if set, a CrawlCheckpoint where the links left to explore
+        and the posts found are saved, timelines saved in it are resumed.
 
-        for users_processed, user_ref in enumerate(user_refs, 1):
+        known_articles: if set, a previous result of this function, the
+        timelines are refreshed incrementally: the crawl of a timeline stops
+        at the first page containing only known posts, none of them posted
+        after refresh_since (a datetime), the counts of likes and comments
+        of the posts fetched are updated. Known posts not fetched again are
+        returned as they were.
 
-            logging.info("Processing user '{0}' - {1}/{2}".format(
-                user_ref, users_processed, len(user_refs)))
+        When the fetcher has more than one worker, the years of every
+        timeline are crawled concurrently, unless checkpoint is set, results
+        are the same.
+        """
 
+        articles_found = OrderedDict()
+        for user_ref in user_refs:
             articles_found[user_ref] = OrderedDict()
             articles_found[user_ref]["posts"] = OrderedDict()
 
+        for user_ref, article_id, post in self.iter_timeline_posts(
+                user_refs, checkpoint, known_articles, refresh_since):
+            articles_found[user_ref]["posts"][article_id] = post
+
+        if known_articles:
+            for user_ref in user_refs:
+                posts = articles_found[user_ref]["posts"]
+                for post in get_known_posts(
+                        known_articles, user_ref).values():
+                    posts.setdefault(post["post_id"], post)
+
+        return articles_found
+
+    def iter_timeline_posts(self, user_refs, checkpoint=None,
+                            known_articles=None, refresh_since=None):
+        """ Yield (user_ref, article_id, post) for every post found on the
+        timeline of every user_ref provided, as the timeline pages are parsed.
+        A post found again on a later page, e.g. an album updated, is yielded
+        again with its latest content.
+
+        checkpoint: see fetch_articles_from_timeline, the posts of a timeline
+        resumed are yielded first.
+
+        known_articles, refresh_since: see fetch_articles_from_timeline, only
+        the posts fetched are yielded.
+        """
+
+        for user_ref, articles in self.iter_timeline_pages(
+                user_refs, checkpoint, known_articles, refresh_since):
+            for article_id, post in articles.items():
+                yield user_ref, article_id, post
+
+    def iter_timeline_pages(self, user_refs, checkpoint=None,
+                            known_articles=None, refresh_since=None):
+        """ Yield (user_ref, articles) for every timeline page where posts are
+        found, articles mapping article id to post like
+        TimelineResult.articles.
+
+        Pages are only fetched when the next page is requested: stopping the
+        iteration, e.g. after the first 1000 posts, stops the crawl.
+
+        checkpoint: see fetch_articles_from_timeline, the posts of a timeline
+        resumed are yielded first, as a single page.
+
+        When the fetcher has more than one worker and there is no checkpoint,
+        the years of every timeline are crawled concurrently, see
+        iter_timeline_chains.
+
+        known_articles, refresh_since: see fetch_articles_from_timeline, the
+        years of a timeline with known posts are not explored, their posts
+        being reached from the first page.
+        """
+
+        if self.progress:
+            self.progress.start_units("users", len(user_refs))
+
+        for users_processed, user_ref in enumerate(user_refs, 1):
+
             logging.info(
-                "Fetching timeline for user '{0}' from Facebook".
-                format(user_ref))
+                "Processing user '%s' - %s/%s", user_ref, users_processed,
+                len(user_refs))
 
-            user_id = get_user_id(user_ref)
-            if user_id:
-                url = build_timeline_page_url_from_id(user_id)
-            else:
-                url = build_timeline_page_url_from_username(user_ref)
+            logging.info(
+                "Fetching timeline for user '%s' from Facebook", user_ref)
+
+            url = build_timeline_page_url(user_ref)
+
+            known_post_ids = set(
+                post["post_id"] for post in
+                get_known_posts(known_articles, user_ref).values())
+
+            if self.workers > 1 and not checkpoint and not known_post_ids:
+                yield from self.iter_timeline_chains(user_ref, url)
+                if self.progress:
+                    self.progress.record_unit()
+                continue
 
             links_to_explore = deque([url])
             links_explored = 0
+            # Posts are only kept to be saved in the checkpoint
+            posts = OrderedDict()
+
+            crawl = OrderedDict()
+            if checkpoint:
+                crawl = checkpoint.get_crawl("timeline", user_ref)
+            if "links_to_explore" in crawl:
+                links_to_explore = deque(crawl["links_to_explore"])
+                links_explored = crawl["links_explored"]
+                for post in crawl["posts"].values():
+                    posts[post["post_id"]] = post
+                logging.info(
+                    "Resuming timeline of user '%s' - %s link(s) "
+                    "explored, %s left", user_ref, links_explored,
+                    len(links_to_explore))
+            crawl["links_to_explore"] = links_to_explore
+            crawl["links_explored"] = links_explored
+            crawl["posts"] = posts
 
-            while links_to_explore:
+            if posts:
+                yield user_ref, OrderedDict(posts)
 
-                url = links_to_explore.popleft()
+            crawl_id = None
+            if self.progress:
+                crawl_id = self.progress.start_crawl(len(links_to_explore))
 
-                logging.info(
-                    "Exploring link {0} - {1} left after, url: {2}".format(
-                        links_explored + 1, len(links_to_explore), url))
+            try:
+                while links_to_explore:
 
-                try:
+                    url = links_to_explore.popleft()
 
-                    response = self.downloader.fetch_url(
-                        cookie=self.cookie, url=url,
-                        timeout_secs=15, retries=5)
+                    logging.info(
+                        "Exploring link %s - %s left after, url: %s",
+                        links_explored + 1, len(links_to_explore), url)
 
-                    if links_explored == 0:
-                        links = \
-                            self.fb_parser.parse_timeline_years_links(
-                                response.text)
-                        logging.info("Found {0} year links to explore".format(
-                            len(links)))
-                        full_links = \
-                            [build_relative_url(link) for link in links]
-                        links_to_explore.extend(full_links)
-
-                    result = self.fb_parser.parse_timeline_page(response.text)
-                    if not result:
-                        raise RuntimeError(
-                            "Failed to parse timeline - no result")
+                    new_posts, show_more_url, year_urls, failed = \
+                        self.fetch_timeline_page(
+                            user_ref, url, fetch_year_links=(
+                                links_explored == 0 and not known_post_ids))
 
-                    for article_id in result.articles:
-                        result.articles[article_id]["page"] = user_ref
-                    articles_found[user_ref]["posts"].update(result.articles)
+                    if failed and checkpoint:
+                        # Explored again when the crawl is resumed
+                        links_to_explore.appendleft(url)
+                        logging.error(
+                            "Stopped crawling the timeline of user '%s' on a "
+                            "page which failed, it can be resumed", user_ref)
+                        checkpoint.record_failure()
+                        break
+
+                    if known_post_ids and is_refresh_complete(
+                            new_posts, known_post_ids, refresh_since):
+                        logging.info(
+                            "Only known posts found, timeline of user '%s' "
+                            "refreshed", user_ref)
+                        show_more_url = None
+
+                    links_to_explore.extend(year_urls)
+                    if show_more_url:
+                        links_to_explore.appendleft(show_more_url)
+                    if checkpoint:
+                        posts.update(new_posts)
+
+                    links_explored += 1
+
+                    crawl["links_explored"] = links_explored
+                    if checkpoint:
+                        checkpoint.save()
+                    if self.progress:
+                        self.progress.record_page(
+                            crawl_id, len(new_posts), len(links_to_explore))
+
+                    if new_posts:
+                        yield user_ref, new_posts
+
+            finally:
+                if self.progress:
+                    self.progress.finish_crawl(crawl_id)
+
+            if self.progress:
+                self.progress.record_unit()
+
+    def fetch_timeline_page(self, user_ref, url, fetch_year_links=False):
+        """ Fetch a timeline page, return (articles, show_more_url,
+        year_urls, failed), year_urls being the urls of the years of the
+        timeline, only parsed if fetch_year_links is set.
+
+        Does not throw, returns the links found before the error if any,
+        failed being set.
+        """
 
-                    show_more_link = result.show_more_link
-                    if show_more_link:
-                        logging.info("Found show more link: {0}".format(
-                            build_relative_url(show_more_link)))
-                        links_to_explore.appendleft(
-                            build_relative_url(show_more_link))
+        articles = OrderedDict()
+        show_more_url = None
+        year_urls = []
+        failed = False
+        try:
 
-                except Exception as e:
-                    logging.error(
-                        "Error while downloading page '{0}', "
-                        "got exception: '{1}'".format(url, e))
+            response = self.downloader.fetch_url(
+                cookie=self.cookie, url=url,
+                timeout_secs=15, retries=5)
 
-                links_explored += 1
+            if fetch_year_links:
+                links = self.fb_parser.parse_timeline_years_links(
+                    response.text)
+                logging.info("Found %s year links to explore", len(links))
+                year_urls = [build_relative_url(link) for link in links]
 
-        return articles_found
+            result = self.fb_parser.parse_timeline_page(response.text)
+            if not result:
+                raise RuntimeError(
+                    "Failed to parse timeline - no result")
+
+            for article_id, article in result.articles.items():
+                article["page"] = user_ref
+                articles[article_id] = article
+
+            if result.show_more_link:
+                show_more_url = build_relative_url(result.show_more_link)
+                logging.info("Found show more link: %s", show_more_url)
+
+        except Exception as e:
+            logging.error(
+                "Error while downloading page '%s', "
+                "got exception: '%s'", url, e)
+            failed = True
+
+        return articles, show_more_url, year_urls, failed
+
+    def fetch_timeline_chain(self, user_ref, url, crawl_id=None,
+                             stop_event=None):
+        """ Return the articles of every page of the chain of show more links
+        starting at url, see fetch_timeline_page.
+
+        crawl_id: if set, the id of the chain in the progress.
+        stop_event: if set, a threading.Event stopping the chain before its
+        next page once set, the pages fetched until then being returned."""
 
-    def fetch_likers_for_article(self, article_id):
-        """ Return a set of users / pages who liked the article."""
+        pages = []
+        while url:
+            if stop_event and stop_event.is_set():
+                logging.info("Chain stopped before link %s", url)
+                break
+            logging.info("Exploring link %s", url)
+            articles, url, _, _ = self.fetch_timeline_page(user_ref, url)
+            if self.progress:
+                self.progress.record_page(
+                    crawl_id, len(articles), 1 if url else 0)
+            if articles:
+                pages.append(articles)
+        if self.progress:
+            self.progress.finish_crawl(crawl_id)
+        return pages
+
+    def iter_timeline_chains(self, user_ref, url):
+        """ Yield the same pages as iter_timeline_pages without checkpoint,
+        the chains of show more links of the first page and of every year
+        being crawled concurrently, by up to workers threads.
+
+        Pages are yielded in the order of the sequential crawl, which
+        explores every chain in turn: a chain is yielded once it is complete
+        and the chains before it were yielded.
+        """
+
+        articles, show_more_url, year_urls, _ = self.fetch_timeline_page(
+            user_ref, url, fetch_year_links=True)
+        chain_urls = ([show_more_url] if show_more_url else []) + year_urls
+
+        # Every chain is a crawl of the progress, its first link being left
+        # to explore until it starts
+        crawl_ids = [None] * len(chain_urls)
+        if self.progress:
+            self.progress.record_page(items=len(articles))
+            crawl_ids = [self.progress.start_crawl() for _ in chain_urls]
+
+        if articles:
+            yield user_ref, articles
 
-        max_likes_per_page = 500
-        max_attempts = 5
+        logging.info(
+            "Exploring %s chain(s) of links of user '%s' "
+            "concurrently", len(chain_urls), user_ref)
+
+        executor = ThreadPoolExecutor(self.workers)
+        stop_event = threading.Event()
+        try:
+            futures = [
+                executor.submit(
+                    self.fetch_timeline_chain, user_ref, url, crawl_id,
+                    stop_event)
+                for url, crawl_id in zip(chain_urls, crawl_ids)]
+            for future in futures:
+                for articles in future.result():
+                    yield user_ref, articles
+
+        finally:
+            # If iterating stopped early, chains not started yet are dropped
+            # and chains running stop before their next page
+            stop_event.set()
+            executor.shutdown(cancel_futures=True)
+            if self.progress:
+                for crawl_id in crawl_ids:
+                    self.progress.finish_crawl(crawl_id)
+
+    def fetch_likers_for_article(self, article_id, checkpoint=None):
+        """ Return a set of users / pages who liked the article.
+
+        checkpoint: if set, a CrawlCheckpoint where the links left to explore
+        and the likers found are saved, a crawl saved in it is resumed.
+        """
+
+        return set(self.iter_likers_for_article(article_id, checkpoint))
+
+    def iter_likers_for_article(self, article_id, checkpoint=None):
+        """ Yield every user / page who liked the article once, as the
+        reaction pages are parsed, see fetch_likers_for_article. The likers
+        of a crawl resumed are yielded first.
+        """
+
+        for likers in self.iter_liker_pages_for_article(
+                article_id, checkpoint):
+            yield from likers
+
+    def fetch_reaction_page(self, article_id, url, max_attempts=5):
+        """ Fetch a reaction page, url having a placeholder for the number of
+        likers per page, which is chosen by the page_size_controller and
+        decreased after every failed attempt.
+
+        Returns (response, page_size, fetching_secs), None if all the attempts
+        failed. The page size is only decreased after failures it may explain,
+        see is_page_size_failure.
+        """
+
+        for attempt_no in range(1, max_attempts + 1):
+            page_size = self.page_size_controller.get_page_size(article_id)
+            current_url = url.format(page_size)
+            try:
+                start_time = time.monotonic()
+                response = self.downloader.fetch_url(
+                    cookie=self.cookie, url=current_url,
+                    timeout_secs=15, retries=5)
+                return response, page_size, time.monotonic() - start_time
+
+            except Exception as e:
+                logging.info(
+                    "Attempt to fetch '%s' did not succeed",
+                    common.truncate_text(current_url, 200))
+                if is_page_size_failure(e):
+                    self.page_size_controller.on_failure(
+                        article_id, page_size)
+
+        return None
+
+    def iter_liker_pages_for_article(self, article_id, checkpoint=None):
+        """ Yield the list of the likers found on every reaction page of the
+        article, likers found on a previous page being left out. Pages are
+        only fetched when the next page is requested.
+
+        checkpoint: see fetch_likers_for_article, the likers of a crawl
+        resumed are yielded first, as a single page.
+        """
 
         likers = set()
 
@@ -476,127 +1196,250 @@ class FacebookFetcher:
         links_explored = 1
         nb_like_found = 0
 
-        while links_to_explore:
+        # Held while updating the state of the crawl, which can be saved by
+        # crawls of other articles running concurrently
+        state_lock = checkpoint.lock if checkpoint else nullcontext()
+
+        crawl = OrderedDict()
+        if checkpoint:
+            crawl = checkpoint.get_crawl("reactions", article_id)
+        with state_lock:
+            if "links_to_explore" in crawl:
+                links_to_explore = crawl["links_to_explore"]
+                links_explored = crawl["links_explored"]
+                likers = set(crawl["likers"])
+                nb_like_found = len(likers)
+                logging.info(
+                    "Resuming reactions of post '%s' - %s page(s) "
+                    "explored, %s left", article_id, links_explored - 1,
+                    len(links_to_explore))
+            crawl["links_to_explore"] = links_to_explore
+            crawl["links_explored"] = links_explored
+            crawl["likers"] = likers
 
-            url = links_to_explore.pop()
-            logging.info(
-                "Fetching reactions page {0}, url: {1}".format(
-                    links_explored, common.truncate_text(url, 200)))
+        if likers:
+            yield list(likers)
 
-            succeeded = False
-            for attempt_no in range(1, max_attempts + 1):
-                current_url = ""
-                try:
-                    current_url = url.format(
-                        max_likes_per_page // attempt_no)
-                    response = self.downloader.fetch_url(
-                        cookie=self.cookie, url=current_url,
-                        timeout_secs=15, retries=5)
-                    succeeded = True
+        crawl_id = None
+        if self.progress:
+            crawl_id = self.progress.start_crawl(len(links_to_explore))
+
+        try:
+            while links_to_explore:
+
+                # The url is only replaced by the next one once its page is
+                # processed: a checkpoint saved meanwhile keeps it to explore
+                with state_lock:
+                    url = links_to_explore[-1]
+                logging.info(
+                    "Fetching reactions page %s, url: %s", links_explored,
+                    common.truncate_text(url, 200))
+
+                fetched = self.fetch_reaction_page(article_id, url)
+                if not fetched:
+                    logging.error(
+                        "Failed to fetch all reactions for post '%s'",
+                        article_id)
+                    self.stop_reactions_crawl(article_id, checkpoint)
                     break
+                response, page_size, fetching_secs = fetched
 
-                except Exception as e:
+                new_likers = []
+                likers_found = 0
+                failed = False
+                try:
+
+                    result = self.fb_parser.parse_reaction_page(
+                            response.text)
+                    if not result:
+                        # Pages too large may be truncated
+                        self.page_size_controller.on_failure(
+                            article_id, page_size)
+                        raise RuntimeError(
+                            "Failed to fetch reactions - no result")
+
+                    likers_found = len(result.likers)
+                    nb_like_found += likers_found
+                    logging.info("New likers found: %s", result.likers)
                     logging.info(
-                        "Attempt to fetch '{0}' did not succeed".format(
-                            common.truncate_text(current_url, 200)))
+                        "Found %s like(s) - Total found: %s",
+                        len(result.likers), nb_like_found)
+
+                    see_more_url = None
+                    if result.see_more_link:
+                        see_more_url = build_see_more_reactions_url(
+                            result.see_more_link)
+
+                    new_likers = [
+                        liker for liker in dict.fromkeys(result.likers)
+                        if liker not in likers]
+                    with state_lock:
+                        likers.update(new_likers)
+                        links_to_explore.pop()
+                        if see_more_url:
+                            links_to_explore.append(see_more_url)
 
-            if not succeeded:
-                logging.error(
-                    "Failed to fetch all reactions for post '{0}'".format(
-                            article_id))
-                break
+                except Exception as e:
+                    logging.error(
+                        "Error while processing page '%s', "
+                        "got exception: '%s'",
+                        common.truncate_text(url, 200), e)
+                    failed = True
 
-            try:
+                if failed:
+                    self.stop_reactions_crawl(article_id, checkpoint)
+                    break
 
-                result = self.fb_parser.parse_reaction_page(
-                        response.text)
-                if not result:
-                    raise RuntimeError(
-                        "Failed to fetch reactions - no result")
+                self.page_size_controller.on_success(
+                    article_id, page_size, likers_found, fetching_secs)
 
-                nb_like_found += len(result.likers)
-                logging.info("New likers found: {0}".format(
-                    result.likers))
-                logging.info(
-                    "Found {0} like(s) - Total found: {1}".format(
-                        len(result.likers), nb_like_found))
+                links_explored += 1
 
-                likers.update(result.likers)
+                crawl["links_explored"] = links_explored
+                if checkpoint:
+                    checkpoint.save()
+                if self.progress:
+                    self.progress.record_page(
+                        crawl_id, len(new_likers), len(links_to_explore))
 
-                see_more_link = result.see_more_link
-                if see_more_link:
-                    see_more_link = build_relative_url(
-                        see_more_link)
+                if new_likers:
+                    yield new_likers
 
-                    logging.info("Found see more link: {0}".format(
-                        common.truncate_text(see_more_link, 200)))
-                    if "limit=10" not in see_more_link:
-                        logging.error(
-                            "See more link found does not match "
-                            "the expected pattern.")
-                    else:
-                        see_more_link = see_more_link.replace(
-                            "limit=10", "limit={0}")
-                        links_to_explore.append(
-                            see_more_link)
+        finally:
+            if self.progress:
+                self.progress.finish_crawl(crawl_id)
 
-            except Exception as e:
-                logging.error(
-                    "Error while processing page '{0}', "
-                    "got exception: '{1}'".format(
-                        common.truncate_text(url, 200), e))
+        self.page_size_controller.forget(article_id)
+
+    def stop_reactions_crawl(self, article_id, checkpoint):
+        """ Record the crawl of the reactions of the article as stopped on
+        a page which failed, left to explore when the crawl is resumed from
+        checkpoint, if any."""
 
-            links_explored += 1
+        if not checkpoint:
+            return
 
-        return likers
+        logging.error(
+            "Stopped crawling the reactions of post '%s' on a page which "
+            "failed, it can be resumed", article_id)
+        checkpoint.record_failure()
 
     def fetch_reactions_per_user_for_articles(self,
-                                              articles, exclude_non_users):
+                                              articles, exclude_non_users,
+                                              checkpoint=None):
         """ Return a dictionary mapping users who liked articles
         to the list of articles they liked.
 
         articles is a list of dictionaries containing the key post_id
         for every article.
+
+        checkpoint: if set, a CrawlCheckpoint used to save and resume the
+        reactions of every article, see fetch_likers_for_article.
+
+        When the fetcher has more than one worker, the reactions of up to
+        workers articles are fetched concurrently, results are the same.
         """
 
         reactions_per_user = OrderedDict()
 
-        logging.info(
-                "Fetching reactions for {0} articles".format(
-                    len(articles)))
+        logging.info("Fetching reactions for %s articles", len(articles))
 
-        for articles_processed, article in enumerate(articles):
+        if not all(is_valid_article(article) for article in articles):
+            return OrderedDict()
 
-            if "post_id" not in article:
-                logging.error(
-                    "Invalid input, every article in the list "
-                    "must contain the key post_id")
-                return OrderedDict()
-            article_id = article["post_id"]
+        if self.progress:
+            self.progress.start_units("posts", len(articles))
+
+        def fetch_likers(article_no, article):
 
-            like_count = ""
-            if "like_count" in article:
-                like_count = article["like_count"]
+            like_count = article.get("like_count", "")
 
             logging.info(
-                "Fetching {0} reaction(s) for post {1}/{2}, id: '{3}'".format(
-                    like_count, articles_processed + 1,
-                    len(articles), article_id))
+                "Fetching %s reaction(s) for post %s/%s, id: '%s'", like_count,
+                article_no, len(articles), article["post_id"])
 
-            likers = sorted(self.fetch_likers_for_article(article_id))
+            likers = sorted(self.fetch_likers_for_article(
+                article["post_id"], checkpoint))
 
             logging.info(
-                "Found {0} like(s) / {1} expected".format(
-                    len(likers), like_count))
+                "Found %s like(s) / %s expected", len(likers), like_count)
+            if self.progress:
+                self.progress.record_unit()
 
-            for username in likers:
-                if not exclude_non_users or \
-                        (exclude_non_users and is_user(username)):
-                    if username not in reactions_per_user:
-                        reactions_per_user[username] = {}
-                        reactions_per_user[username]["likes"] = []
-                    reactions_per_user[username]["likes"].append(
-                        article
-                    )
+            return likers
+
+        article_nos = range(1, len(articles) + 1)
+
+        if self.workers > 1:
+            # Articles are crawled concurrently, their likers being merged
+            # in the order of articles, like when crawled one by one
+            with ThreadPoolExecutor(self.workers) as executor:
+                for article, likers in zip(articles, executor.map(
+                        fetch_likers, article_nos, articles)):
+                    add_reactions(
+                        reactions_per_user, article, likers,
+                        exclude_non_users)
+
+        else:
+            for article, likers in zip(articles, map(
+                    fetch_likers, article_nos, articles)):
+                add_reactions(
+                    reactions_per_user, article, likers, exclude_non_users)
+
+        self.page_size_controller.log_stats()
 
         return reactions_per_user
+
+    def iter_reactions_for_articles(self,
+                                    articles, exclude_non_users,
+                                    checkpoint=None):
+        """ Yield (username, article) every time a user is found to have
+        liked an article, as the reaction pages are parsed, see
+        fetch_reactions_per_user_for_articles.
+
+        articles can be any iterable, e.g. posts read from a pipe while they
+        are still being fetched.
+        """
+
+        for article, likers in self.iter_reaction_pages(
+                articles, exclude_non_users, checkpoint):
+            for username in likers:
+                yield username, article
+
+    def iter_reaction_pages(self, articles, exclude_non_users,
+                            checkpoint=None):
+        """ Yield (article, likers) for every reaction page of every article,
+        likers being the users found on the page, see
+        iter_liker_pages_for_article. Articles are only read, and pages
+        fetched, when the next page is requested: invalid articles, see
+        is_valid_article, cannot be rejected up front and are skipped.
+        """
+
+        article_count = len(articles) if hasattr(articles, "__len__") \
+            else None
+        if self.progress:
+            self.progress.start_units("posts", article_count)
+
+        for articles_processed, article in enumerate(articles):
+
+            if not is_valid_article(article):
+                continue
+            article_id = article["post_id"]
+
+            logging.info(
+                "Fetching reaction(s) for post %s/%s, id: '%s'",
+                articles_processed + 1,
+                "?" if article_count is None else article_count, article_id)
+
+            for likers in self.iter_liker_pages_for_article(
+                    article_id, checkpoint):
+                if exclude_non_users:
+                    likers = [
+                        username for username in likers if is_user(username)]
+                if likers:
+                    yield article, likers
+
+            if self.progress:
+                self.progress.record_unit()
+
+        self.page_size_controller.log_stats()
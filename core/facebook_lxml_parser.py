@@ -0,0 +1,545 @@
+from core import model
+from core.facebook_soup_parser import FacebookSoupParser, GenericResult, \
+    ReactionResult, TimelineResult
+
+from collections import OrderedDict
+from lxml import etree
+import lxml.html
+import logging
+import re
+
+
+# Pages are encoded first: lxml rejects text with an encoding declaration
+HTML_PARSER = lxml.html.HTMLParser(encoding="utf-8")
+
+# Same text as BeautifulSoup: script and style contents are not text
+TEXT_XPATH = etree.XPath(
+    ".//text()[not(ancestor::script or ancestor::style)]",
+    smart_strings=False)
+
+ASCII_SPACES = "\x20\x0a\x09\x0c\x0d"
+
+
+def create_document(content):
+    """ Parse content with lxml, unless it is already a parsed document.
+
+    Returns None if content is empty.
+
+    >>> create_document("<p>Some text</p>").tag
+    'html'
+    >>> create_document("")
+    """
+    if isinstance(content, etree._Element):
+        return content
+    try:
+        return lxml.html.document_fromstring(
+            content.encode("utf-8"), parser=HTML_PARSER)
+    except etree.ParserError:
+        return None
+
+
+def normalize_string(string):
+    """ BeautifulSoup replaces strings made of whitespaces only by a single
+    newline or space."""
+    if string.strip(ASCII_SPACES):
+        return string
+    elif "\n" in string:
+        return "\n"
+    return " "
+
+
+def get_text(element):
+    """ Same as Tag.text in BeautifulSoup.
+
+    >>> get_text(create_document(
+    ...     "<div>a<!-- c -->b<span>c</span>d<script>e</script></div>"))
+    'abcd'
+    >>> get_text(create_document("<div>  <p>a</p>\\n  <p>b</p></div>"))
+    ' a\\nb'
+    """
+    return "".join(
+        normalize_string(string) for string in TEXT_XPATH(element))
+
+
+def get_string(element):
+    """ Same as Tag.string in BeautifulSoup: the text of element if it
+    contains a single string, possibly nested in a single element.
+
+    >>> get_string(create_document("<a><span>See more</span></a>")[0][0])
+    'See more'
+    >>> get_string(create_document("<a>See <span>more</span></a>")[0][0])
+    """
+    children = list(element)
+    if not children:
+        return element.text
+    if element.text or len(children) != 1 or children[0].tail:
+        return None
+    if not isinstance(children[0].tag, str):
+        return children[0].text
+    return get_string(children[0])
+
+
+def find(element, xpath):
+    """ Return the first element matching xpath, or None."""
+    found = element.xpath(xpath)
+    if found:
+        return found[0]
+    return None
+
+
+def find_by_attribute(element, xpath, attribute, regex):
+    """ Return the elements matching xpath whose attribute matches regex,
+    as BeautifulSoup does when searching by attribute."""
+    return [
+        found for found in element.xpath(xpath)
+        if regex.search(found.get(attribute, ""))]
+
+
+def find_by_string(element, xpath, strings):
+    """ Return the first element matching xpath whose string is one of
+    strings, or None."""
+    for found in element.xpath(xpath):
+        if get_string(found) in strings:
+            return found
+    return None
+
+
+def find_main_element(document, ids):
+    return find(document, "//*[{0}]".format(
+        " or ".join('@id="{0}"'.format(id) for id in ids)))
+
+
+def detect_error_type(content):
+    """ Same as facebook_soup_parser.detect_error_type.
+
+    >>> detect_error_type('<input name="login">Login requested')
+    'Cookie expired or is invalid, login requested'
+    >>> detect_error_type('<div id="objects_container"><span class="bb">' + \
+        'It may be temporarily unavailable</span></div>')
+    'Page temporarily unavailable / broken / expired link'
+    >>> detect_error_type('<html></html>')
+    'Failed to parse page'
+    """
+    return detect_document_error_type(create_document(content))
+
+
+def detect_document_error_type(document):
+    """ Same as detect_error_type, on a document already parsed, None if the
+    page could not be parsed, so that pages are not parsed twice.
+
+    >>> detect_document_error_type(create_document('<input name="login">'))
+    'Cookie expired or is invalid, login requested'
+    >>> detect_document_error_type(None)
+    'Failed to parse page'
+    """
+    if document is not None and document.xpath('//input[@name="login"]'):
+        return "Cookie expired or is invalid, login requested"
+    elif document is not None and any(
+            "It may be temporarily unavailable" in string
+            for string in [get_string(span) for span in document.iter("span")]
+            if string):
+        return "Page temporarily unavailable / broken / expired link"
+    else:
+        return "Failed to parse page"
+
+
+class FacebookLxmlParser:
+    """ Same interface and results as FacebookSoupParser, using lxml trees
+    and XPath directly instead of BeautifulSoup, which is faster.
+
+    Pages can be passed either as text or as a document returned by
+    parse_document.
+    """
+
+    def __init__(self):
+        # Single tuple so that threads always see a consistent pair
+        self.last_document = (None, None)
+
+    def parse_document(self, content):
+        """ Return the document for content, reusing the document built for
+        the previous page if content did not change."""
+
+        if isinstance(content, etree._Element):
+            return content
+
+        last_content, last_document = self.last_document
+        if content == last_content:
+            return last_document
+
+        document = create_document(content)
+        self.last_document = (content, document)
+        return document
+
+    def parse_buddy_list(self, raw_json):
+        """ See FacebookSoupParser.parse_buddy_list."""
+        return FacebookSoupParser.parse_buddy_list(self, raw_json)
+
+    def parse_about_page(self, content):
+        """ See FacebookSoupParser.parse_about_page."""
+
+        document = self.parse_document(content)
+        if document is None:
+            logging.error(detect_document_error_type(document))
+            return None
+
+        user_info = OrderedDict()
+
+        name_tag = find(document, "//title")
+        if name_tag is not None:
+            user_info["name"] = get_text(name_tag)
+
+        timeline_tags = find_by_attribute(
+            document, "//*[@href]", "href",
+            re.compile(r"^/.*\?v=timeline.lst=\d+%3A\d+%3A"))
+        if not timeline_tags:
+
+            logging.error(detect_document_error_type(document))
+            return None
+
+        user_id = int(timeline_tags[0].get("href").split("%3A")[1])
+        user_info["id"] = user_id
+
+        tags = [
+            'AIM', 'Address', 'BBM', 'Birth Name', 'Birthday',
+            'Facebook', 'Foursquare', 'Gadu-Gadu', 'Gender', 'ICQ',
+            'Instagram', 'Interested in', 'Languages', 'LinkedIn',
+            'Maiden Name', 'Mobile', 'Nickname', 'Political Views',
+            'Religious views', 'Skype', 'Snapchat', 'Twitter', 'VK',
+            'Websites', 'Windows Live Messenger', 'Year of birth']
+
+        titled_divs = {}
+        for div in document.xpath("//div[@title]"):
+            titled_divs.setdefault(div.get("title"), div)
+
+        for tag in tags:
+            if tag in titled_divs:
+                user_info[tag.replace(" ", "_").lower()] = \
+                    get_text(titled_divs[tag]).replace(tag, ""). \
+                    replace("\n", "").replace(" · Edit", "")
+
+        if "birthday" in user_info:
+            parsed_birthday = user_info["birthday"]
+            if parsed_birthday.count(" ") != 2:
+                user_info["day_and_month_of_birth"] = parsed_birthday
+                del user_info["birthday"]
+            else:
+                user_info["day_and_month_of_birth"] = " ".join(
+                    parsed_birthday.split(" ")[0:2])
+                user_info["year_of_birth"] = parsed_birthday.split(" ")[-1]
+
+        if "year_of_birth" in user_info:
+            user_info["year_of_birth"] = int(user_info["year_of_birth"])
+
+        institution_tags = ["work", "education"]
+        for institution_tag in institution_tags:
+            found_tag = find(
+                document, '//div[@id="{0}"]'.format(institution_tag))
+            if found_tag is not None:
+                found_img_tag = find(found_tag, ".//img")
+                if found_img_tag is not None and "alt" in found_img_tag.attrib:
+                    user_info[institution_tag] = found_img_tag.get("alt")
+
+        relationship_tag = find(document, '//div[@id="relationship"]')
+        if relationship_tag is not None:
+
+            relationship_text = get_text(relationship_tag)
+            relationship_choices = [
+                'In a relationship', 'Engaged', 'Married',
+                'In a civil partnership', 'In a domestic partnership',
+                'In an open relationship', 'It\'s complicated', 'Separated',
+                'Divorced', 'Widowed', 'Single'
+            ]
+            for relationship_choice in relationship_choices:
+                if relationship_choice in relationship_text:
+                    user_info["relationship"] = relationship_choice
+                    break
+
+        return user_info
+
+    def parse_friends_list_page(self, content, category, more_div_id,
+                                link_regex):
+        """ Parse friends and mutual friends pages, which only differ by the
+        links kept and the id of the "See more" div."""
+
+        document = self.parse_document(content)
+
+        main_element = None
+        if document is not None:
+            main_element = find_main_element(document, ["objects_container"])
+        if main_element is None:
+
+            logging.error(detect_document_error_type(document))
+            return None
+
+        friends_found = OrderedDict()
+        for link in find_by_attribute(main_element, ".//a", "href",
+                                      link_regex):
+            friends_found[link.get("href")[1:]] = get_text(link)
+
+        result = OrderedDict()
+        result[category] = friends_found
+
+        see_more_links = []
+        div_more = find(
+            main_element, './/div[@id="{0}"]'.format(more_div_id))
+        if div_more is not None:
+            more_link = find(div_more, ".//a")
+            if more_link is not None:
+                see_more_links.append(more_link.attrib["href"])
+
+        return GenericResult(
+            content=result, see_more_links=see_more_links)
+
+    def parse_friends_page(self, content):
+        """ See FacebookSoupParser.parse_friends_page."""
+
+        return self.parse_friends_list_page(
+            content, "friends", "m_more_friends",
+            re.compile(r"^/.*fref=fr_tab"))
+
+    def parse_mutual_friends_page(self, content):
+        """ See FacebookSoupParser.parse_mutual_friends_page."""
+
+        return self.parse_friends_list_page(
+            content, "mutual_friends", "m_more_mutual_friends",
+            re.compile(r"^/.*\?fref=fr_tab"))
+
+    def parse_likes_page(self, content):
+        """ See FacebookSoupParser.parse_likes_page."""
+
+        document = self.parse_document(content)
+
+        main_element = None
+        if document is not None:
+            main_element = find_main_element(document, ["objects_container"])
+        if main_element is None:
+
+            logging.error(detect_document_error_type(document))
+            return None
+
+        see_more_links = []
+        result = OrderedDict()
+
+        main_category = None
+        main_category_element = find(main_element, ".//h2")
+        if main_category_element is not None:
+            main_category = get_text(main_category_element)
+
+        for category in main_element.xpath(".//*[self::h3 or self::h4]"):
+            category_name = get_text(category).strip()
+            if main_category:  # e.g. for Films, category_name is Likes
+                category_name = main_category
+
+            result[category_name] = OrderedDict()
+
+            if category.tag == "h4":
+                parent_element = category.getparent()
+            else:
+                parent_element = category.getparent().getparent()
+
+            for link in find_by_attribute(parent_element, ".//a", "href",
+                                          re.compile(r"^/.*")):
+                link_text = get_text(link)
+                if link_text.strip() == "See more":
+                    see_more_links.append(link.get("href"))
+                elif link_text != "Like":
+                    result[category_name][link.get("href")[1:]] = \
+                        link_text.strip()
+
+        return GenericResult(
+            content=result, see_more_links=see_more_links)
+
+    def parse_timeline_years_links(self, content):
+        """ See FacebookSoupParser.parse_timeline_years_links."""
+
+        document = self.parse_document(content)
+
+        links_found = []
+
+        main_element = None
+        if document is not None:
+            main_element = find_main_element(
+                document,
+                ["tlFeed", "timelineBody", "m_group_stories_container"])
+        if main_element is None:
+
+            logging.error(detect_document_error_type(document))
+            return links_found
+
+        for link in main_element.iter("a"):
+            if "href" in link.attrib:
+                year_found = re.match(r'^\d{4}$', get_text(link))
+                if year_found:
+                    links_found.append(link.get("href"))
+
+        return links_found
+
+    def parse_post(self, article):
+        """ See FacebookSoupParser.parse_post."""
+
+        participants_found = []
+        content = []
+        if article is None:
+            return None
+        for child in article:
+            if not isinstance(child.tag, str):
+                continue
+            if "data-ft" in child.attrib:
+                break
+            for link in find_by_attribute(child, ".//*[@href]", "href",
+                                          re.compile("^/.*")):
+                link_found = link.get("href")[1:]
+                if "browse/users/?ids=" in link_found:
+                    link_found = link_found.split("browse/users/?ids=")[1]
+                    link_found = link_found.split("&")[0]
+                    ids = link_found.split("%2C")
+                    participants_found += ids
+                else:
+                    id_found = link_found.split("&refid=18")[0]
+                    id_found = id_found.split("?refid=18")[0]
+                    id_found = id_found.split("?lst")[0]
+                    id_found = id_found.split("&fref")[0]
+                    id_found = id_found.split("&lst")[0]
+                    if id_found != link_found and \
+                       id_found not in participants_found and \
+                       '/photos/' not in id_found and \
+                       'story.php?' not in id_found:
+                        participants_found.append(id_found)
+
+            sub_content = []
+            for s in TEXT_XPATH(child):
+                stripped_s = s.strip()
+                if stripped_s:
+                    sub_content.append(stripped_s)
+            content.append(" ".join(sub_content))
+        content_string = " - ".join(content)
+        content_string = content_string.replace(" .", ".")
+
+        date_tag = find(article, ".//abbr")
+        if date_tag is None:
+            logging.info("Skipping original article shared.")
+            return None
+        date_org = get_text(date_tag)
+        date = str(model.parse_date(date_org))
+
+        span_tags = find_by_attribute(
+            article, ".//*[@id]", "id", re.compile(r"like_\d+"))
+        if not span_tags:
+            logging.info("Skipping article - no link for likes found.")
+            return None
+        span_tag = span_tags[0]
+        article_id = int(re.findall(r'\d+', span_tag.get("id"))[0])
+
+        like_count = 0
+        reaction_links = find_by_attribute(
+            span_tag, ".//a", "aria-label", re.compile(r"reaction"))
+        if reaction_links:
+            like_count = int(get_text(reaction_links[0]).replace(",", ""))
+
+        comment_count = 0
+        comment_regex = re.compile(r"\d+ Comment")
+        for link in article.iter("a"):
+            link_string = get_string(link)
+            if link_string and comment_regex.search(link_string):
+                comment_count = int(
+                    get_text(link).split(" Comment")[0].replace(",", ""))
+                break
+
+        full_story_link = ""
+        full_story_element = find_by_string(
+            article, ".//a", ["Full Story"])
+        if full_story_element is not None and \
+                "href" in full_story_element.attrib:
+            full_story_link = full_story_element.get("href")
+
+        return OrderedDict([
+            ("post_id", article_id), ("content", content_string),
+            ("participants", participants_found),
+            ("date", date), ("date_org", date_org),
+            ("like_count", like_count), ("comment_count", comment_count),
+            ("story_link", full_story_link)])
+
+    def parse_timeline_page(self, content):
+        """ See FacebookSoupParser.parse_timeline_page."""
+
+        document = self.parse_document(content)
+
+        main_element = None
+        if document is not None:
+            main_element = find_main_element(
+                document, [
+                    "tlFeed", "timelineBody", "m_group_stories_container",
+                    "structured_composer_async_container"])
+        if main_element is None:
+
+            logging.error(detect_document_error_type(document))
+            return None
+
+        articles_found = OrderedDict()
+        for article in main_element.iter("article"):
+            if article is main_element:
+                continue
+            post = self.parse_post(article)
+            if post:
+                logging.info("Found post: %s", post)
+                # The same post_id might be returned several times,
+                # e.g. when adding photos to albums. Overwrite, since
+                # only the date will change.
+                articles_found[post["post_id"]] = post
+
+        show_more_link_tag = find_by_string(
+            document, "//a", ["Show more", "See more posts"])
+        link_found = ""
+        if show_more_link_tag is not None and \
+                "href" in show_more_link_tag.attrib:
+            link_found = show_more_link_tag.get("href")
+
+        return TimelineResult(
+            articles=articles_found, show_more_link=link_found)
+
+    def parse_timeline_first_page(self, content):
+        """ See FacebookSoupParser.parse_timeline_first_page."""
+
+        return (
+            self.parse_timeline_years_links(content),
+            self.parse_timeline_page(content))
+
+    def parse_reaction_page(self, content):
+        """ See FacebookSoupParser.parse_reaction_page."""
+
+        document = self.parse_document(content)
+
+        usernames_found = []
+
+        main_element = None
+        if document is not None:
+            main_element = find_main_element(document, ["objects_container"])
+        if main_element is None:
+
+            logging.error(detect_document_error_type(document))
+            return None
+
+        invalid_links = ["add_friend.php", "ufi/reaction", "home.php?"]
+        for link in find_by_attribute(main_element, ".//*[@href]", "href",
+                                      re.compile("^/.*")):
+            if "role" not in link.attrib:
+
+                username = link.get("href")[1:]
+
+                is_invalid = False
+                for invalid_link in invalid_links:
+                    if invalid_link in username:
+                        is_invalid = True
+                        break
+
+                if username and not is_invalid:
+                    usernames_found.append(username)
+
+        see_more_link_tag = find_by_string(main_element, ".//a", ["See more"])
+        link_found = None
+        if see_more_link_tag is not None and \
+                "href" in see_more_link_tag.attrib:
+            link_found = see_more_link_tag.get("href")
+
+        return ReactionResult(
+            likers=usernames_found, see_more_link=link_found)
@@ -1,7 +1,7 @@
 from core import common
 from core import model
 
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer, Tag
 from collections import namedtuple
 from collections import OrderedDict
 from datetime import datetime
@@ -14,9 +14,25 @@ GenericResult = namedtuple('GenericResult', ['content', 'see_more_links'])
 TimelineResult = namedtuple('TimelineResult', ['articles', 'show_more_link'])
 ReactionResult = namedtuple('ReactionResult', ['likers', 'see_more_link'])
 
+# Reaction and friends pages only need this subtree
+OBJECTS_CONTAINER = SoupStrainer(id="objects_container")
 
-def detect_error_type(content):
+
+def create_soup(content):
+    """ Parse content, unless it is already a parsed document.
+
+    >>> soup = create_soup("<html></html>")
+    >>> create_soup(soup) is soup
+    True
     """
+    if isinstance(content, BeautifulSoup):
+        return content
+    return BeautifulSoup(content, "lxml")
+
+
+def detect_error_type(content):
+    """ content can be a page or a parsed document.
+
     >>> detect_error_type('<input name="login">Login requested')
     'Cookie expired or is invalid, login requested'
     >>> detect_error_type('<div id="objects_container"><span class="bb">' + \
@@ -28,7 +44,7 @@ def detect_error_type(content):
     >>> detect_error_type('<html></html>')
     'Failed to parse page'
     """
-    soup = BeautifulSoup(content, "lxml")
+    soup = create_soup(content)
 
     if soup.find("input", attrs={"name": "login"}):
         return "Cookie expired or is invalid, login requested"
@@ -40,6 +56,60 @@ def detect_error_type(content):
 
 
 class FacebookSoupParser:
+    """ Extract information from Facebook pages.
+
+    Pages can be passed either as text or as a document returned by
+    parse_document. The document built for the last page is kept, so that
+    calling several parse_* methods on the same page only parses it once.
+    """
+
+    def __init__(self):
+        # Single tuple so that threads always see a consistent pair
+        self.last_document = (None, None)
+
+    def parse_document(self, content):
+        """ Return the document for content, reusing the document built for
+        the previous page if content did not change.
+
+        >>> fb_parser = FacebookSoupParser()
+        >>> fb_parser.parse_document("<p>1</p>") is \
+fb_parser.parse_document("<p>1</p>")
+        True
+        >>> fb_parser.parse_document("<p>1</p>") is \
+fb_parser.parse_document("<p>2</p>")
+        False
+        """
+        if isinstance(content, BeautifulSoup):
+            return content
+
+        last_content, last_soup = self.last_document
+        if content == last_content:
+            return last_soup
+
+        soup = BeautifulSoup(content, "lxml")
+        self.last_document = (content, soup)
+        return soup
+
+    def find_objects_container(self, content):
+        """ Return the objects_container element of the page, building only
+        this subtree unless the whole page was already parsed.
+
+        >>> FacebookSoupParser().find_objects_container(
+        ...     '<div id="header"><a href="/home.php">Home</a></div>'
+        ...     '<div id="objects_container"><p>Some text</p></div>')
+        <div id="objects_container"><p>Some text</p></div>
+        >>> FacebookSoupParser().find_objects_container('<p>Some text</p>')
+        """
+        if isinstance(content, BeautifulSoup):
+            return content.find(id="objects_container")
+
+        last_content, last_soup = self.last_document
+        if content == last_content:
+            return last_soup.find(id="objects_container")
+
+        return BeautifulSoup(
+            content, "lxml", parse_only=OBJECTS_CONTAINER).find(
+                id="objects_container")
 
     def parse_buddy_list(self, raw_json):
         """
@@ -70,15 +140,16 @@ class FacebookSoupParser:
             decoded_json = json.loads(valid_raw_json)
         except Exception as e:
             logging.error(
-                "Failed to decode JSON: '{0}', got exception:"
-                " '{1}'".format(valid_raw_json, e))
+                "Failed to decode JSON: '%s', got exception:"
+                " '%s'", valid_raw_json, e)
             return OrderedDict()
 
-        logging.debug("Got json: '{0}'".format(common.prettify(decoded_json)))
+        logging.debug(
+            "Got json: '%s'", common.LazyPrettify(decoded_json))
         if "ms" not in decoded_json:
             logging.error("Invalid json returned - not found 'ms'")
-            logging.debug("Got instead: {0}".format(
-                common.prettify(decoded_json)))
+            logging.debug(
+                "Got instead: %s", common.LazyPrettify(decoded_json))
             return OrderedDict()
 
         flattened_json = {}
@@ -86,8 +157,8 @@ class FacebookSoupParser:
             flattened_json.update(item)
         if "buddyList" not in flattened_json:
             logging.error("Invalid json returned - not found 'buddyList'")
-            logging.debug("Got instead: {0}".format(
-                common.prettify(flattened_json)))
+            logging.debug(
+                "Got instead: %s", common.LazyPrettify(flattened_json))
             return OrderedDict()
 
         buddy_list = flattened_json["buddyList"]
@@ -207,19 +278,36 @@ class FacebookSoupParser:
         >>> FacebookSoupParser().parse_about_page('''
         ...     <input name="login" type="submit" value="Log In">''')
         """
-        soup = BeautifulSoup(content, "lxml")
+        soup = self.parse_document(content)
 
         user_info = OrderedDict()
 
-        name_tag = soup.find("title")
+        # Index the tags needed in a single traversal of the document
+        name_tag = None
+        timeline_tag = None
+        divs_by_title = {}
+        divs_by_id = {}
+        timeline_regex = re.compile(r"^/.*\?v=timeline.lst=\d+%3A\d+%3A")
+        for tag in soup.descendants:
+            if not isinstance(tag, Tag):
+                continue
+            if tag.name == "div":
+                if "title" in tag.attrs:
+                    divs_by_title.setdefault(tag.attrs["title"], tag)
+                if "id" in tag.attrs:
+                    divs_by_id.setdefault(tag.attrs["id"], tag)
+            elif tag.name == "title" and name_tag is None:
+                name_tag = tag
+            if timeline_tag is None and "href" in tag.attrs and \
+               timeline_regex.search(tag.attrs["href"]):
+                timeline_tag = tag
+
         if name_tag:
             user_info["name"] = name_tag.text
 
-        timeline_tag = soup.find(href=re.compile(
-            r"^/.*\?v=timeline.lst=\d+%3A\d+%3A"))
         if not timeline_tag:
 
-            logging.error(detect_error_type(content))
+            logging.error(detect_error_type(soup))
             return None
 
         user_id = int(timeline_tag.attrs["href"].split(
@@ -235,7 +323,7 @@ class FacebookSoupParser:
             'Websites', 'Windows Live Messenger', 'Year of birth']
 
         for tag in tags:
-            found_tag = soup.find("div", attrs={"title": tag})
+            found_tag = divs_by_title.get(tag)
             if found_tag:
                 user_info[tag.replace(" ", "_").lower()] = found_tag.text. \
                     replace(tag, "").replace("\n", "").replace(" · Edit", "")
@@ -255,14 +343,14 @@ class FacebookSoupParser:
 
         institution_tags = ["work", "education"]
         for institution_tag in institution_tags:
-            found_tag = soup.find("div", attrs={"id": institution_tag})
+            found_tag = divs_by_id.get(institution_tag)
             if found_tag:
                 found_img_tag = found_tag.find("img")
                 if found_img_tag and "alt" in found_img_tag.attrs:
                     user_info[institution_tag] = \
                         found_img_tag.attrs["alt"]
 
-        relationship_tag = soup.find("div", attrs={"id": "relationship"})
+        relationship_tag = divs_by_id.get("relationship")
         if relationship_tag:
 
             relationship_choices = [
@@ -330,12 +418,10 @@ see_more_links=[])
         ...     <input name="login" type="submit" value="Log In">''')
         """
 
-        soup = BeautifulSoup(content, "lxml")
-
-        main_soup = soup.find(id="objects_container")
+        main_soup = self.find_objects_container(content)
         if not main_soup:
 
-            logging.error(detect_error_type(content))
+            logging.error(detect_error_type(self.parse_document(content)))
             return None
 
         friends_found = OrderedDict()
@@ -462,12 +548,12 @@ see_more_links=[])
         ...     <input name="login" type="submit" value="Log In">''')
         """
 
-        soup = BeautifulSoup(content, "lxml")
+        soup = self.parse_document(content)
 
         main_soup = soup.find(id="objects_container")
         if not main_soup:
 
-            logging.error(detect_error_type(content))
+            logging.error(detect_error_type(soup))
             return None
 
         see_more_links = []
@@ -547,12 +633,10 @@ OrderedDict())]), see_more_links=[])
         ...     <input name="login" type="submit" value="Log In">''')
         """
 
-        soup = BeautifulSoup(content, "lxml")
-
-        main_soup = soup.find(id="objects_container")
+        main_soup = self.find_objects_container(content)
         if not main_soup:
 
-            logging.error(detect_error_type(content))
+            logging.error(detect_error_type(self.parse_document(content)))
             return None
 
         mutual_friends_found = OrderedDict()
@@ -610,7 +694,7 @@ OrderedDict())]), see_more_links=[])
         []
         """
 
-        soup = BeautifulSoup(content, "lxml")
+        soup = self.parse_document(content)
 
         links_found = []
 
@@ -618,7 +702,7 @@ OrderedDict())]), see_more_links=[])
             id=["tlFeed", "timelineBody", "m_group_stories_container"])
         if not main_soup:
 
-            logging.error(detect_error_type(content))
+            logging.error(detect_error_type(soup))
             return links_found
 
         links_soup = main_soup.find_all('a')
@@ -888,7 +972,7 @@ show_more_link='/show_more_link')
         >>> FacebookSoupParser().parse_timeline_page('''
         ...     <input name="login" type="submit" value="Log In">''')
         """
-        soup = BeautifulSoup(content, "lxml")
+        soup = self.parse_document(content)
 
         main_soup = soup.find(
             id=[
@@ -896,7 +980,7 @@ show_more_link='/show_more_link')
                 "structured_composer_async_container"])
         if not main_soup:
 
-            logging.error(detect_error_type(content))
+            logging.error(detect_error_type(soup))
             return None
 
         articles_found = OrderedDict()
@@ -904,8 +988,7 @@ show_more_link='/show_more_link')
         for article in articles_soup:
             post = self.parse_post(article)
             if post:
-                logging.info(
-                    "Found post: {0}".format(post))
+                logging.info("Found post: %s", post)
                 # The same post_id might be returned several times,
                 # e.g. when adding photos to albums. Overwrite, since
                 # only the date will change.
@@ -920,6 +1003,23 @@ show_more_link='/show_more_link')
         return TimelineResult(
             articles=articles_found, show_more_link=link_found)
 
+    def parse_timeline_first_page(self, content):
+        """ Return (years links, TimelineResult) of the first page of a
+        timeline, see parse_timeline_years_links and parse_timeline_page,
+        the document being built once.
+
+        >>> FacebookSoupParser().parse_timeline_first_page('''
+        ...     <div id="tlFeed">
+        ...         <a href="link1">2010</a>
+        ...         <div><a href="/show_more_link">Show more</a></div>
+        ...     </div>''')
+        (['link1'], TimelineResult(articles=OrderedDict(), \
+show_more_link='/show_more_link'))
+        """
+        return (
+            self.parse_timeline_years_links(content),
+            self.parse_timeline_page(content))
+
     def parse_reaction_page(self, content):
         """
         >>> FacebookSoupParser().parse_reaction_page('''
@@ -947,14 +1047,12 @@ see_more_link='/ufi/reaction/link')
         ...     <input name="login" type="submit" value="Log In">''')
         """
 
-        soup = BeautifulSoup(content, "lxml")
-
         usernames_found = []
 
-        main_soup = soup.find(id="objects_container")
+        main_soup = self.find_objects_container(content)
         if not main_soup:
 
-            logging.error(detect_error_type(content))
+            logging.error(detect_error_type(self.parse_document(content)))
             return None
 
         links_soup = main_soup.find_all(href=re.compile("^/.*"))
@@ -1,10 +1,34 @@
 from collections import OrderedDict
 from datetime import datetime, timedelta
 from dateutil import parser
+import functools
 import logging
 import re
 
 
+MONTH_NUMBERS = {
+    month: number for number, month in enumerate([
+        "January", "February", "March", "April", "May", "June", "July",
+        "August", "September", "October", "November", "December"], 1)}
+
+# Dates of posts, year and time being optional, e.g. "22 April 2011 at 20:34",
+# "9 July 2011", "14 May at 10:02"
+DAY_MONTH_REGEX = re.compile(
+    r"^(\d{1,2}) ([A-Za-z]+)(?: (\d{4}))?(?: at (\d{1,2}):(\d{2}))?$")
+
+# e.g. "September 2003"
+MONTH_YEAR_REGEX = re.compile(r"^([A-Za-z]+) (\d{4})$")
+
+# e.g. "3 hrs", "1 min", "Just now"
+RELATIVE_TIME_REGEX = re.compile(r"^(?:(\d+) (hr|min)s?|Just now)$")
+
+# e.g. "Yesterday at 19:34", "Today at 08:15"
+RELATIVE_DAY_REGEX = re.compile(r"^(Yesterday|Today) at (\d{1,2}):(\d{2})$")
+
+# Absolute dates parsed, e.g. all the dates of the posts of a timeline
+DATE_CACHE_SIZE = 4096
+
+
 def append_times(new_times, times):
     """ Add times from new_times that are not in times.
 
@@ -25,7 +49,7 @@ def append_times(new_times, times):
 
         new_lats = new_times[user]
         if "times" not in new_lats:
-            logging.warn("No times found for user '{0}'".format(user))
+            logging.warn("No times found for user '%s'", user)
             continue
         new_lats = new_times[user]["times"]
 
@@ -34,12 +58,13 @@ def append_times(new_times, times):
 
         for new_lat in new_lats:
             if not times[user]["times"]:
-                logging.info("User {0}: {1}".format(user, new_lat))
+                logging.info("User %s: %s", user, new_lat)
                 times[user]["times"].append(new_lat)
                 changes = True
             elif new_lat != times[user]["times"][-1]:
-                logging.info("User {0}: {1} > {2}".format(
-                    user, new_lat, times[user]["times"][-1]))
+                logging.info(
+                    "User %s: %s > %s", user, new_lat,
+                    times[user]["times"][-1])
                 times[user]["times"].append(new_lat)
                 changes = True
 
@@ -104,6 +129,94 @@ def parse_fuzzy_time(date_str):
         return None
 
 
+def parse_relative_date(date_str, now):
+    """ Fast path for the most common dates relative to now, which cannot be
+    cached. Returns None for other dates.
+
+    >>> now = datetime(2018, 5, 14, 10, 2, 30)
+    >>> parse_relative_date("3 hrs", now)
+    datetime.datetime(2018, 5, 14, 7, 2, 30)
+    >>> parse_relative_date("1 min", now)
+    datetime.datetime(2018, 5, 14, 10, 1, 30)
+    >>> parse_relative_date("Just now", now)
+    datetime.datetime(2018, 5, 14, 10, 2, 30)
+    >>> parse_relative_date("Yesterday at 19:34", now)
+    datetime.datetime(2018, 5, 13, 19, 34)
+    >>> parse_relative_date("Today at 08:15", now)
+    datetime.datetime(2018, 5, 14, 8, 15)
+    >>> parse_relative_date("9 July 2011", now)
+    """
+
+    found = RELATIVE_TIME_REGEX.match(date_str)
+    if found:
+        number, unit = found.groups()
+        if not number:
+            return now
+        elif unit == "hr":
+            return now - timedelta(hours=int(number))
+        return now - timedelta(minutes=int(number))
+
+    found = RELATIVE_DAY_REGEX.match(date_str)
+    if found:
+        day, hour, minute = found.groups()
+        try:
+            date = now.replace(hour=int(hour), minute=int(minute), second=0)
+        except ValueError:
+            return None
+        if day == "Yesterday":
+            date -= timedelta(hours=24)
+        return date
+
+    return None
+
+
+@functools.lru_cache(maxsize=DATE_CACHE_SIZE)
+def parse_absolute_date(date_str, current_year):
+    """ Return the date, if it only depends on the current year, or None.
+
+    Results are cached, the current year being part of the key.
+
+    >>> parse_absolute_date("22 April 2011 at 20:34", 2018)
+    datetime.datetime(2011, 4, 22, 20, 34)
+    >>> parse_absolute_date("14 May at 10:02", 2018)
+    datetime.datetime(2018, 5, 14, 10, 2)
+    >>> parse_absolute_date("9 July", 2018)
+    datetime.datetime(2018, 7, 9, 0, 0)
+    >>> parse_absolute_date("September 2003", 2018)
+    datetime.datetime(2003, 9, 1, 0, 0)
+    >>> parse_absolute_date("4 Sept 2011", 2018)
+    datetime.datetime(2011, 9, 4, 0, 0)
+    >>> parse_absolute_date("Not a date", 2018)
+    """
+
+    found = DAY_MONTH_REGEX.match(date_str)
+    if found:
+        day, month, year, hour, minute = found.groups()
+        month_number = MONTH_NUMBERS.get(month.capitalize())
+        if month_number:
+            try:
+                return datetime(
+                    int(year) if year else current_year, month_number,
+                    int(day), int(hour or 0), int(minute or 0))
+            except ValueError:
+                pass
+
+    found = MONTH_YEAR_REGEX.match(date_str)
+    if found:
+        month, year = found.groups()
+        month_number = MONTH_NUMBERS.get(month.capitalize())
+        if month_number:
+            return datetime(int(year), month_number, 1)
+
+    logging.info("Parsing date: %s - date incomplete", date_str)
+    try:
+        return parser.parse(
+            date_str, default=datetime(year=current_year, month=1, day=1))
+
+    except Exception:
+        return None
+
+
 def parse_date(date_str):
     """
     >>> parse_date("22 April 2011 at 20:34")
@@ -112,36 +225,37 @@ def parse_date(date_str):
     datetime.datetime(2011, 7, 9, 0, 0)
     >>> parse_date("September 2003")
     datetime.datetime(2003, 9, 1, 0, 0)
+    >>> parse_date("14 May at 10:02") == \
+datetime(datetime.now().year, 5, 14, 10, 2)
+    True
+    >>> parse_date("3 hrs") <= datetime.now() - timedelta(hours=3)
+    True
     """
 
-    try:
-        return datetime.strptime(date_str, "%d %B %Y at %H:%M")
+    now = datetime.now()
 
-    except Exception:
+    # Relative dates first, they must not be cached
+    date = parse_relative_date(date_str, now)
+    if date:
+        return date
 
-        logging.info("Parsing date: {0} - date incomplete".format(date_str))
-        try:
-            # We could directly parse all dates with parser,
-            # but this allows to have logging only for incomplete dates
-            return parser.parse(
-                date_str, default=datetime(
-                    year=datetime.now().year, month=1, day=1))
-
-        except Exception:
-
-            relative_time = parse_relative_time(date_str)
-            if relative_time:
-                return datetime.now() - relative_time
-
-            fuzzy_t = parse_fuzzy_time(date_str)
-            if fuzzy_t:
-                fuzzy_time = fuzzy_t[0]
-                delta = fuzzy_t[1]
-                return datetime.now().replace(
-                    hour=fuzzy_time.hour,
-                    minute=fuzzy_time.minute,
-                    second=fuzzy_time.second) - delta
-
-            else:
-                logging.error("Failed to parse date: {0}".format(date_str))
-                return datetime.now()
+    date = parse_absolute_date(date_str, now.year)
+    if date:
+        return date
+
+    relative_time = parse_relative_time(date_str)
+    if relative_time:
+        return datetime.now() - relative_time
+
+    fuzzy_t = parse_fuzzy_time(date_str)
+    if fuzzy_t:
+        fuzzy_time = fuzzy_t[0]
+        delta = fuzzy_t[1]
+        return datetime.now().replace(
+            hour=fuzzy_time.hour,
+            minute=fuzzy_time.minute,
+            second=fuzzy_time.second) - delta
+
+    else:
+        logging.error("Failed to parse date: %s", date_str)
+        return datetime.now()
@@ -0,0 +1,291 @@
+from core.rate_limiter import classify_url
+
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+import hashlib
+import logging
+import lzma
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+
+COMPRESSIONS = OrderedDict([
+    ("zlib", (zlib.compress, zlib.decompress)),
+    ("lzma", (lzma.compress, lzma.decompress)),
+])
+
+# Timeline pages of years over for more than a year, whose posts hardly
+# change any more
+PAST_TIMELINE_URL_CLASS = "timeline_past_years"
+
+# Seconds pages are kept per class of url, see get_url_class: -1 for pages
+# never cached, 0 for pages kept until evicted
+DEFAULT_TTLS = OrderedDict([
+    ("buddy_feed", -1),
+    ("about", 3 * 24 * 3600),
+    (PAST_TIMELINE_URL_CLASS, 0),
+])
+
+# Parameters which do not change the page returned
+IGNORED_PARAMETERS = frozenset(["refid", "fref", "ref", "__tn__"])
+
+# Parameters ignored per class of url: the number of likers per page of
+# reaction pages changes on every run, see PageSizeController, pages of any
+# size linking to the next likers
+IGNORED_CLASS_PARAMETERS = {"reactions": frozenset(["limit"])}
+
+TIMEEND_REGEX = re.compile(r"[?&]timeend=(\d+)")
+
+SECS_PER_YEAR = 365 * 24 * 3600
+
+
+def normalize_cache_key(url):
+    """ Return the url with its parameters sorted, without the parameters
+    which do not change the page returned, see IGNORED_PARAMETERS and
+    IGNORED_CLASS_PARAMETERS.
+
+    >>> normalize_cache_key("https://mbasic.facebook.com/profile.php?\
+v=likes&id=1234&refid=17#top")
+    'https://mbasic.facebook.com/profile.php?id=1234&v=likes'
+    >>> normalize_cache_key("HTTPS://MBASIC.facebook.com/mark/?fref=none")
+    'https://mbasic.facebook.com/mark/'
+    >>> normalize_cache_key("https://mbasic.facebook.com/ufi/reaction/\
+profile/browser/fetch/?limit=250&ft_ent_identifier=1")
+    'https://mbasic.facebook.com/ufi/reaction/profile/browser/fetch/?\
+ft_ent_identifier=1'
+    """
+    parts = urlsplit(url)
+    ignored_parameters = IGNORED_PARAMETERS | \
+        IGNORED_CLASS_PARAMETERS.get(classify_url(url), frozenset())
+    parameters = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key not in ignored_parameters)
+    return urlunsplit((
+        parts.scheme.lower(), parts.netloc.lower(), parts.path,
+        urlencode(parameters), ""))
+
+
+def get_url_class(url, now):
+    """ Return the class of the url, see classify_url, timeline pages of
+    years over for more than a year belonging to PAST_TIMELINE_URL_CLASS.
+
+    >>> now = 1546300800  # 2019-01-01
+    >>> get_url_class("https://mbasic.facebook.com/mark?v=timeline\
+&timeend=1483228799&timestart=1451606400", now)
+    'timeline_past_years'
+    >>> get_url_class("https://mbasic.facebook.com/mark?v=timeline\
+&timeend=1546300799&timestart=1514764800", now)
+    'timeline'
+    >>> get_url_class("https://mbasic.facebook.com/mark/about", now)
+    'about'
+    """
+    url_class = classify_url(url)
+    if url_class == "timeline":
+        match = TIMEEND_REGEX.search(url)
+        if match and int(match.group(1)) < now - SECS_PER_YEAR:
+            return PAST_TIMELINE_URL_CLASS
+    return url_class
+
+
+class CachedPage:
+    """ A page served from the cache, with the attributes of a response
+    used by the fetchers."""
+
+    status_code = 200
+    from_cache = True
+
+    def __init__(self, url, content, encoding):
+        self.url = url
+        self.content = content
+        self.encoding = encoding or "utf-8"
+        self.headers = {}
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding, errors="replace")
+
+
+class PageCache:
+    """ Cache of the pages downloaded, stored compressed in a SQLite
+    database.
+
+    Pages are keyed by their normalized url, see normalize_cache_key, and
+    their bodies by their digest, so that identical pages are stored once.
+    Once the bodies stored exceed max_bytes, the pages least recently used
+    are evicted.
+
+    default_ttl: seconds pages are kept, -1 for pages never cached, 0 for
+    pages kept until evicted.
+    ttls: the same per class of url, see get_url_class, overriding
+    DEFAULT_TTLS, whose expiries are shortened to default_ttl if it is
+    shorter.
+
+    >>> now = [0.0]
+    >>> cache = PageCache(":memory:", default_ttl=60, clock=lambda: now[0])
+    >>> url = "https://mbasic.facebook.com/mark?v=timeline"
+    >>> cache.put(url, b"<html>Posts</html>", "utf-8")
+    True
+    >>> cache.get(url + "&refid=17").text
+    '<html>Posts</html>'
+    >>> now[0] = 61.0
+    >>> cache.get(url)
+    >>> cache.put("https://5-edge-chat.facebook.com/pull?channel=1", b"{}")
+    False
+    """
+
+    def __init__(self, path="page_cache.sqlite",
+                 max_bytes=100 * 1024 * 1024, default_ttl=0, ttls=None,
+                 compression="zlib", clock=time.time):
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.ttls = OrderedDict(
+            (url_class, min(ttl, default_ttl)
+                if ttl > 0 and default_ttl > 0 else ttl)
+            for url_class, ttl in DEFAULT_TTLS.items())
+        self.ttls.update(ttls or {})
+        self.compression = compression
+        self.compress = COMPRESSIONS[compression][0]
+        self.clock = clock
+        self.lock = threading.Lock()
+
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY, digest TEXT NOT NULL,
+                encoding TEXT, stored_at REAL NOT NULL,
+                used_at REAL NOT NULL);
+            CREATE INDEX IF NOT EXISTS pages_used_at ON pages (used_at);
+            CREATE TABLE IF NOT EXISTS bodies (
+                digest TEXT PRIMARY KEY, compression TEXT NOT NULL,
+                data BLOB NOT NULL, size INTEGER NOT NULL);
+        """)
+        self.stored_bytes = self.connection.execute(
+            "SELECT COALESCE(SUM(LENGTH(data)), 0) FROM bodies").fetchone()[0]
+
+        self.stats = OrderedDict([
+            ("hits", 0), ("misses", 0), ("stores", 0), ("evictions", 0),
+            ("bytes_saved", 0), ("bytes_stored", self.stored_bytes)])
+
+    def get_ttl(self, url):
+        return self.ttls.get(
+            get_url_class(url, self.clock()), self.default_ttl)
+
+    def get(self, url):
+        """ Return the page cached for url, None if it is not cached or
+        expired."""
+
+        ttl = self.get_ttl(url)
+        if ttl == -1:
+            return None
+
+        key = normalize_cache_key(url)
+        now = self.clock()
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT pages.encoding, pages.stored_at, bodies.compression, "
+                "bodies.data FROM pages JOIN bodies USING (digest) "
+                "WHERE pages.url = ?", (key,)).fetchone()
+
+            if row and ttl and row[1] + ttl < now:
+                self.delete_page(key)
+                self.connection.commit()
+                row = None
+
+            if not row:
+                self.stats["misses"] += 1
+                return None
+
+            encoding, _, compression, data = row
+            content = COMPRESSIONS[compression][1](data)
+            self.connection.execute(
+                "UPDATE pages SET used_at = ? WHERE url = ?", (now, key))
+            self.connection.commit()
+            self.stats["hits"] += 1
+            self.stats["bytes_saved"] += len(content)
+
+        return CachedPage(url, content, encoding)
+
+    def put(self, url, content, encoding=None):
+        """ Cache content, the body of the page at url, return False if
+        pages like url are not cached."""
+
+        if self.get_ttl(url) == -1:
+            return False
+
+        key = normalize_cache_key(url)
+        digest = hashlib.sha256(content).hexdigest()
+        now = self.clock()
+        with self.lock:
+            if not self.connection.execute(
+                    "SELECT 1 FROM bodies WHERE digest = ?",
+                    (digest,)).fetchone():
+                data = self.compress(content)
+                self.connection.execute(
+                    "INSERT INTO bodies VALUES (?, ?, ?, ?)",
+                    (digest, self.compression, data, len(content)))
+                self.stored_bytes += len(data)
+
+            self.delete_page(key)
+            self.connection.execute(
+                "INSERT INTO pages VALUES (?, ?, ?, ?, ?)",
+                (key, digest, encoding, now, now))
+            self.stats["stores"] += 1
+
+            self.evict()
+            self.connection.commit()
+            self.stats["bytes_stored"] = self.stored_bytes
+
+        return True
+
+    def delete_page(self, key):
+        """ Delete the page cached for key, and its body unless other pages
+        share it. The lock must be held."""
+
+        row = self.connection.execute(
+            "SELECT digest FROM pages WHERE url = ?", (key,)).fetchone()
+        if not row:
+            return
+        self.connection.execute("DELETE FROM pages WHERE url = ?", (key,))
+        if not self.connection.execute(
+                "SELECT 1 FROM pages WHERE digest = ?", row).fetchone():
+            size = self.connection.execute(
+                "SELECT LENGTH(data) FROM bodies WHERE digest = ?",
+                row).fetchone()[0]
+            self.connection.execute(
+                "DELETE FROM bodies WHERE digest = ?", row)
+            self.stored_bytes -= size
+
+    def evict(self):
+        """ Evict the pages least recently used until the bodies stored fit
+        in max_bytes. The lock must be held."""
+
+        while self.stored_bytes > self.max_bytes:
+            row = self.connection.execute(
+                "SELECT url FROM pages ORDER BY used_at LIMIT 1").fetchone()
+            if not row:
+                break
+            self.delete_page(row[0])
+            self.stats["evictions"] += 1
+
+    def get_stats(self):
+        """ Return the number of hits, misses, pages stored and evicted, the
+        bytes not downloaded thanks to the cache and the bytes stored."""
+
+        with self.lock:
+            return OrderedDict(self.stats)
+
+    def log_stats(self):
+        stats = self.get_stats()
+        if stats["hits"] or stats["misses"]:
+            logging.info(
+                "Page cache: %s hit(s), %s miss(es), %s page(s) stored, "
+                "%s evicted, %s bytes saved, %s bytes stored",
+                *stats.values())
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
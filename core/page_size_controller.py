@@ -0,0 +1,103 @@
+from collections import OrderedDict
+import logging
+import threading
+
+
+class PageSizeController:
+    """ Choose how many likers to request per reaction page.
+
+    Large pages need fewer requests, but Facebook fails to return pages too
+    large for some posts. The page size of every post starts from the size
+    which recently succeeded for other posts, is halved when a request
+    fails because of the size, e.g. a server error or a truncated page, and
+    grows back gradually, by growth_factor, after every success.
+
+    >>> controller = PageSizeController(max_page_size=500)
+    >>> controller.get_page_size(1)
+    500
+    >>> controller.on_failure(1, 500)
+    >>> controller.get_page_size(1), controller.get_page_size(2)
+    (250, 250)
+    >>> controller.on_success(1, 250, likers_found=250, secs=0.5)
+    >>> controller.get_page_size(1)
+    312
+    >>> controller.forget(1)
+    >>> controller.get_page_size(1)
+    312
+    """
+
+    def __init__(self, max_page_size=500, min_page_size=10,
+                 growth_factor=1.25):
+        self.max_page_size = max_page_size
+        self.min_page_size = min_page_size
+        self.growth_factor = growth_factor
+        # Size for the posts without a size of their own
+        self.global_page_size = max_page_size
+        self.page_sizes = {}
+        self.likers_found = 0
+        self.fetching_secs = 0.0
+        self.pages_fetched = 0
+        self.failures = 0
+        self.lock = threading.Lock()
+
+    def get_page_size(self, post_id):
+        with self.lock:
+            return self.page_sizes.get(post_id, self.global_page_size)
+
+    def on_failure(self, post_id, page_size):
+        """ Halve the page size after a request for page_size likers
+        failed."""
+
+        with self.lock:
+            self.failures += 1
+            page_size = max(self.min_page_size, page_size // 2)
+            self.page_sizes[post_id] = page_size
+            self.global_page_size = min(self.global_page_size, page_size)
+
+    def on_success(self, post_id, page_size, likers_found, secs):
+        """ Grow the page size after a request for page_size likers returned
+        likers_found likers in secs seconds."""
+
+        with self.lock:
+            self.pages_fetched += 1
+            self.likers_found += likers_found
+            self.fetching_secs += secs
+
+            page_size = min(
+                self.max_page_size,
+                max(page_size + 1, int(page_size * self.growth_factor)))
+            self.page_sizes[post_id] = page_size
+            self.global_page_size = max(self.global_page_size, page_size)
+
+    def forget(self, post_id):
+        """ Drop the page size of a post whose reactions were all fetched."""
+
+        with self.lock:
+            self.page_sizes.pop(post_id, None)
+
+    def get_stats(self):
+        """
+        >>> controller = PageSizeController()
+        >>> controller.on_success(1, 500, likers_found=500, secs=2.0)
+        >>> controller.get_stats()
+        OrderedDict([('pages_fetched', 1), ('failures', 0), \
+('likers_found', 500), ('likers_per_sec', 250.0), ('page_size', 500)])
+        """
+
+        with self.lock:
+            return OrderedDict([
+                ("pages_fetched", self.pages_fetched),
+                ("failures", self.failures),
+                ("likers_found", self.likers_found),
+                ("likers_per_sec", round(
+                    self.likers_found / self.fetching_secs, 1)
+                    if self.fetching_secs else 0.0),
+                ("page_size", self.global_page_size)])
+
+    def log_stats(self):
+        stats = self.get_stats()
+        if stats["pages_fetched"] or stats["failures"]:
+            logging.info(
+                "Reaction pages: %s fetched, %s failure(s), "
+                "%s liker(s) at %s likers/s, page size: %s",
+                *stats.values())
@@ -0,0 +1,70 @@
+from core.facebook_soup_parser import FacebookSoupParser
+
+from concurrent.futures import ProcessPoolExecutor
+
+
+# Parser of the current worker process, created once by the initializer
+process_parser = None
+
+
+def init_process_parser(parser_class):
+    global process_parser
+    process_parser = parser_class()
+
+
+def call_process_parser(method_name, content):
+    return getattr(process_parser, method_name)(content)
+
+
+class ProcessPoolParser:
+    """ Same interface as FacebookSoupParser, parsing pages in a pool of
+    processes, so that parsing uses several cores and does not hold the GIL
+    of the threads downloading pages.
+
+    Results (GenericResult, TimelineResult, ReactionResult, ...) are sent
+    back to the calling thread. Every call blocks the calling thread only,
+    use submit to get a Future instead.
+    """
+
+    def __init__(self, parser_class=FacebookSoupParser, processes=None):
+        self.executor = ProcessPoolExecutor(
+            max_workers=processes,
+            initializer=init_process_parser, initargs=(parser_class,))
+
+    def submit(self, method_name, content):
+        """ Return a Future for the result of method_name on content."""
+        return self.executor.submit(
+            call_process_parser, method_name, content)
+
+    def parse(self, method_name, content):
+        return self.submit(method_name, content).result()
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+    def parse_buddy_list(self, raw_json):
+        return self.parse("parse_buddy_list", raw_json)
+
+    def parse_about_page(self, content):
+        return self.parse("parse_about_page", content)
+
+    def parse_friends_page(self, content):
+        return self.parse("parse_friends_page", content)
+
+    def parse_likes_page(self, content):
+        return self.parse("parse_likes_page", content)
+
+    def parse_mutual_friends_page(self, content):
+        return self.parse("parse_mutual_friends_page", content)
+
+    def parse_timeline_years_links(self, content):
+        return self.parse("parse_timeline_years_links", content)
+
+    def parse_timeline_page(self, content):
+        return self.parse("parse_timeline_page", content)
+
+    def parse_timeline_first_page(self, content):
+        return self.parse("parse_timeline_first_page", content)
+
+    def parse_reaction_page(self, content):
+        return self.parse("parse_reaction_page", content)
@@ -0,0 +1,159 @@
+from collections import OrderedDict
+import logging
+import threading
+import time
+
+
+# Classes of urls which can be given their own rate limit, in the order
+# they are matched
+URL_CLASSES = OrderedDict([
+    ("buddy_feed", ["edge-chat.facebook.com/pull"]),
+    ("reactions", ["/ufi/reaction/"]),
+    ("about", ["v=info", "/about"]),
+    ("timeline", ["v=timeline", "/timeline/", "timestart=",
+                  "sectionLoadingID="]),
+])
+
+# Urls which do not match any class, e.g. friends and likes pages
+OTHER_URL_CLASS = "other"
+
+
+def classify_url(url):
+    """ Return the class of the url, see URL_CLASSES.
+
+    >>> classify_url("https://5-edge-chat.facebook.com/pull?channel=p_123")
+    'buddy_feed'
+    >>> classify_url("https://mbasic.facebook.com/username/about")
+    'about'
+    >>> classify_url("https://mbasic.facebook.com/profile.php?id=1&v=timeline")
+    'timeline'
+    >>> classify_url("https://mbasic.facebook.com/ufi/reaction/profile/\
+browser/fetch/?limit=500&ft_ent_identifier=1")
+    'reactions'
+    >>> classify_url("https://mbasic.facebook.com/profile.php?v=friends&id=1")
+    'other'
+    """
+    for url_class, patterns in URL_CLASSES.items():
+        for pattern in patterns:
+            if pattern in url:
+                return url_class
+    return OTHER_URL_CLASS
+
+
+class TokenBucket:
+    """ Allow requests_per_sec requests per second on average, with bursts
+    of up to burst requests.
+
+    Every request takes a token, tokens being refilled continuously. When no
+    token is left, the request waits until its token is available: tokens
+    taken in advance make concurrent requests wait in turn.
+
+    >>> now = [0.0]
+    >>> bucket = TokenBucket(2, burst=2, clock=lambda: now[0])
+    >>> [bucket.reserve() for _ in range(4)]
+    [0.0, 0.0, 0.5, 1.0]
+    >>> now[0] = 10.0
+    >>> bucket.reserve()
+    0.0
+    """
+
+    def __init__(self, requests_per_sec, burst=1,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.requests_per_sec = requests_per_sec
+        self.burst = burst
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = burst
+        self.last_refill_time = clock()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """ Take a token, return the seconds to wait before using it."""
+
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(
+                self.burst,
+                self.tokens +
+                (now - self.last_refill_time) * self.requests_per_sec)
+            self.last_refill_time = now
+
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.requests_per_sec)
+
+    def acquire(self):
+        """ Wait for a token, return the seconds waited."""
+
+        wait_secs = self.reserve()
+        if wait_secs:
+            self.sleep(wait_secs)
+        return wait_secs
+
+
+class RateLimiter:
+    """ Rate limit requests per class of url, see classify_url.
+
+    rate_limits maps url classes to dictionaries with the keys
+    requests_per_sec and optionally burst (1 by default), requests to other
+    classes of urls are not limited.
+
+    >>> now = [0.0]
+    >>> rate_limiter = RateLimiter(
+    ...     {"about": {"requests_per_sec": 1}},
+    ...     clock=lambda: now[0], sleep=lambda secs: None)
+    >>> rate_limiter.wait("https://mbasic.facebook.com/mark/about")
+    0.0
+    >>> rate_limiter.wait("https://mbasic.facebook.com/mark/about")
+    1.0
+    >>> rate_limiter.wait("https://mbasic.facebook.com/mark?v=timeline")
+    0.0
+    >>> rate_limiter.get_stats()["about"]
+    OrderedDict([('requests', 2), ('waits', 1), ('wait_secs', 1.0), \
+('max_wait_secs', 1.0)])
+    """
+
+    def __init__(self, rate_limits, clock=time.monotonic, sleep=time.sleep):
+        self.buckets = OrderedDict(
+            (url_class, TokenBucket(
+                rate_limit["requests_per_sec"], rate_limit.get("burst", 1),
+                clock, sleep))
+            for url_class, rate_limit in rate_limits.items())
+        self.stats = OrderedDict()
+        self.stats_lock = threading.Lock()
+
+    def wait(self, url):
+        """ Wait until a request to url is allowed, return the seconds
+        waited."""
+
+        url_class = classify_url(url)
+        bucket = self.buckets.get(url_class)
+        wait_secs = bucket.acquire() if bucket else 0.0
+
+        with self.stats_lock:
+            stats = self.stats.setdefault(url_class, OrderedDict([
+                ("requests", 0), ("waits", 0),
+                ("wait_secs", 0.0), ("max_wait_secs", 0.0)]))
+            stats["requests"] += 1
+            if wait_secs:
+                stats["waits"] += 1
+                stats["wait_secs"] += wait_secs
+                stats["max_wait_secs"] = max(
+                    stats["max_wait_secs"], wait_secs)
+
+        return wait_secs
+
+    def get_stats(self):
+        """ Return, per class of url, the number of requests, how many of
+        them waited and the time spent waiting."""
+
+        with self.stats_lock:
+            return OrderedDict(
+                (url_class, OrderedDict(stats))
+                for url_class, stats in self.stats.items())
+
+    def log_stats(self):
+        for url_class, stats in self.get_stats().items():
+            logging.info(
+                "Rate limiting '%s': %s request(s), %s waited "
+                "%.1fs in total, %.1fs at most", url_class, stats["requests"],
+                stats["waits"], stats["wait_secs"], stats["max_wait_secs"])
@@ -0,0 +1,102 @@
+from email.utils import parsedate_to_datetime
+import random
+import time
+
+
+# Temporary errors: too many requests, internal server error, bad gateway,
+# service unavailable, gateway timeout
+RETRYABLE_STATUS_CODES = frozenset([429, 500, 502, 503, 504])
+
+
+def parse_retry_after(value, now=None):
+    """ Return the seconds to wait from the value of a Retry-After header,
+    either seconds or a HTTP date, None if it is invalid.
+
+    >>> parse_retry_after("120")
+    120.0
+    >>> parse_retry_after("Wed, 21 Oct 2015 07:28:30 GMT", now=1445412500)
+    10.0
+    >>> parse_retry_after("Wed, 21 Oct 2015 07:28:30 GMT", now=1445412600)
+    0.0
+    >>> parse_retry_after("soon")
+    """
+    if value is None:
+        return None
+
+    value = str(value).strip()
+    if value.isdigit():
+        return float(value)
+
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date is None:
+        return None
+
+    now = time.time() if now is None else now
+    return max(0.0, date.timestamp() - now)
+
+
+class RetryPolicy:
+    """ When and how long to wait before retrying a request.
+
+    Delays grow exponentially from base_secs, up to cap_secs, with a random
+    jitter (a fraction of the delay, 1 drawing it between 0 and the delay)
+    so that concurrent requests do not retry all at once. A Retry-After
+    header sent by the server is honored instead, up to max_retry_after_secs
+    (cap_secs by default).
+
+    >>> policy = RetryPolicy(base_secs=1, cap_secs=5, jitter=0)
+    >>> [policy.get_delay(attempt_no) for attempt_no in range(1, 6)]
+    [1.0, 2.0, 4.0, 5.0, 5.0]
+    >>> policy = RetryPolicy(base_secs=1, cap_secs=5, jitter=0.5, \
+random=lambda: 1.0)
+    >>> [policy.get_delay(attempt_no) for attempt_no in range(1, 4)]
+    [0.5, 1.0, 2.0]
+    >>> policy.is_retryable_status(429), policy.is_retryable_status(404)
+    (True, False)
+    >>> class Response:
+    ...     headers = {"Retry-After": "86400"}
+    >>> policy.get_delay(1, Response())
+    5.0
+    >>> RetryPolicy(max_retry_after_secs=600).get_delay(1, Response())
+    600.0
+    """
+
+    def __init__(self, base_secs=1, cap_secs=60, jitter=1,
+                 retryable_status_codes=RETRYABLE_STATUS_CODES,
+                 random=random.random, sleep=time.sleep,
+                 max_retry_after_secs=None):
+        self.base_secs = base_secs
+        self.cap_secs = cap_secs
+        self.max_retry_after_secs = cap_secs \
+            if max_retry_after_secs is None else max_retry_after_secs
+        self.jitter = jitter
+        self.retryable_status_codes = frozenset(retryable_status_codes)
+        self.random = random
+        self.sleep = sleep
+
+    def is_retryable_status(self, status_code):
+        return status_code in self.retryable_status_codes
+
+    def get_delay(self, attempt_no, response=None):
+        """ Return the seconds to wait after the attempt attempt_no (starting
+        at 1) failed, response being the response received if any."""
+
+        headers = getattr(response, "headers", None)
+        if hasattr(headers, "get"):
+            retry_after = parse_retry_after(headers.get("Retry-After"))
+            if retry_after is not None:
+                return float(min(retry_after, self.max_retry_after_secs))
+
+        delay = min(self.cap_secs, self.base_secs * 2 ** (attempt_no - 1))
+        return float(delay * (1 - self.jitter * self.random()))
+
+    def wait(self, attempt_no, response=None):
+        """ Wait before the next attempt, return the seconds waited."""
+
+        delay = self.get_delay(attempt_no, response)
+        if delay:
+            self.sleep(delay)
+        return delay
@@ -1,5 +1,7 @@
 from core import common
+from core.retry_policy import RetryPolicy
 from collections import namedtuple
+import copy
 
 Fake_Return_Value = namedtuple(
     'FakeReturnValue', ['status_code', 'text', 'headers'])
@@ -45,6 +47,36 @@ def create_service_unavailable_return_value():
     )
 
 
+def create_too_many_requests_return_value(retry_after=None):
+    headers = {}
+    if retry_after is not None:
+        headers["Retry-After"] = retry_after
+    return Fake_Return_Value(
+        status_code=429,
+        text="Too many requests",
+        headers=headers
+    )
+
+
+def create_bad_gateway_return_value():
+    return Fake_Return_Value(
+        status_code=502,
+        text="Bad Gateway",
+        headers="Some headers"
+    )
+
+
+def create_fake_retry_policy(**kwargs):
+    """ RetryPolicy recording its delays in delays instead of sleeping,
+    without jitter unless set."""
+
+    delays = []
+    kwargs.setdefault("jitter", 0)
+    retry_policy = RetryPolicy(sleep=delays.append, **kwargs)
+    retry_policy.delays = delays
+    return retry_policy
+
+
 def create_fake_config():
     return common.Config(
         caching_secs=-1,
@@ -52,3 +84,28 @@ def create_fake_config():
         cookie_datr="456",
         cookie_xs="abc",
         logging_level="INFO")
+
+
+def create_fake_fetch_url(pages):
+    """ Serve pages[url], raising it instead if it is an exception."""
+
+    def fetch_url(cookie, url, timeout_secs, retries):
+        page = pages[url]
+        if isinstance(page, BaseException):
+            raise page
+        return create_ok_return_value(page)
+
+    return fetch_url
+
+
+def create_fake_parse(results):
+    """ Return a copy of results[content], raising it instead if it is an
+    exception."""
+
+    def parse(content):
+        result = results[content]
+        if isinstance(result, BaseException):
+            raise result
+        return copy.deepcopy(result)
+
+    return parse
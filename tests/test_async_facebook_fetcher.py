@@ -0,0 +1,329 @@
+from core.async_facebook_fetcher import AsyncFacebookFetcher
+from core.downloader import AsyncDownloader, DownloadError
+from core.facebook_fetcher import FacebookFetcher
+from core.facebook_soup_parser import ReactionResult, TimelineResult, \
+    GenericResult
+from tests.mocks import create_mock_downloader, create_mock_facebook_parser
+from tests.fakes import create_fake_config, create_fake_fetch_url, \
+    create_fake_parse
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from nose.tools import assert_equal, assert_raises
+import asyncio
+
+
+@contextmanager
+def create_fetchers(pages, parsing_executor=None):
+
+    with create_mock_downloader() as mock_downloader:
+
+        with create_mock_facebook_parser() as mock_fb_parser:
+
+            mock_downloader.fetch_url.side_effect = \
+                create_fake_fetch_url(pages)
+
+            yield (
+                FacebookFetcher(
+                    mock_downloader, mock_fb_parser, create_fake_config()),
+                AsyncFacebookFetcher(
+                    AsyncDownloader(mock_downloader, max_in_flight=4),
+                    mock_fb_parser, create_fake_config(), parsing_executor),
+                mock_fb_parser)
+
+
+def test_fetch_content_recursively_returns_same_results():
+
+    pages = {
+        "initialUrl": "content1",
+        "https://mbasic.facebook.com/showMoreLink1": "content2",
+        "https://mbasic.facebook.com/showMoreLink2": "content3",
+        "https://mbasic.facebook.com/showMoreLink3": RuntimeError("Boom")
+    }
+    parse = create_fake_parse({
+        "content1": GenericResult(
+            content=OrderedDict([
+                ('Category 1',
+                    OrderedDict([('cat1Link1/', 'Category 1 - 1')])),
+                ('Category 2',
+                    OrderedDict([('cat2Link1/', 'Category 2 - 1')]))
+            ]),
+            see_more_links=['/showMoreLink1', '/showMoreLink2']),
+        "content2": GenericResult(
+            content=OrderedDict([
+                ('Category 2',
+                    OrderedDict([
+                        ('cat2Link1/?fref=none&refid=17', 'Category 2 - 1'),
+                        ('cat2Link2/', 'Category 2 - 2')
+                    ]))
+            ]),
+            see_more_links=['/showMoreLink3']),
+        "content3": GenericResult(
+            content=OrderedDict([
+                ('Category 3',
+                    OrderedDict([('cat3Link1/', 'Category 3 - 1')]))
+            ]),
+            see_more_links=[])
+    })
+
+    with create_fetchers(pages) as (fb_fetcher, async_fb_fetcher, _):
+
+        expected_content = fb_fetcher.fetch_content_recursively(
+            "initialUrl", parse)
+
+        res = asyncio.run(async_fb_fetcher.fetch_content_recursively(
+            "initialUrl", parse))
+
+        assert_equal(list(res.items()), list(expected_content.items()))
+        assert_equal(
+            list(res["Category 2"].items()),
+            [('cat2Link1/', 'Category 2 - 1'),
+             ('cat2Link2/', 'Category 2 - 2')])
+
+
+def test_fetch_content_recursively_skips_same_duplicates():
+
+    pages = {
+        "initialUrl": "content1",
+        "https://mbasic.facebook.com/showMoreLink1?refid=17": "content2",
+        "https://mbasic.facebook.com/showMoreLink2": "content3"
+    }
+    parse = create_fake_parse({
+        "content1": GenericResult(
+            content=OrderedDict([('Category 1', OrderedDict([('l1/', '1')]))]),
+            see_more_links=['/showMoreLink1?refid=17', '/showMoreLink2']),
+        "content2": GenericResult(
+            content=OrderedDict([('Category 2', OrderedDict([('l2/', '2')]))]),
+            see_more_links=['/showMoreLink2?refid=18']),
+        "content3": GenericResult(
+            content=OrderedDict([('Category 3', OrderedDict([('l3/', '3')]))]),
+            see_more_links=['/showMoreLink1?fref=none'])
+    })
+
+    with create_fetchers(pages) as (fb_fetcher, async_fb_fetcher, _):
+
+        expected_content = fb_fetcher.fetch_content_recursively(
+            "initialUrl", parse)
+
+        res = asyncio.run(async_fb_fetcher.fetch_content_recursively(
+            "initialUrl", parse))
+
+        assert_equal(list(res.items()), list(expected_content.items()))
+        assert_equal(
+            async_fb_fetcher.duplicate_links_skipped,
+            fb_fetcher.duplicate_links_skipped)
+
+
+def test_fetch_user_infos_returns_same_results():
+
+    user_refs = [110, 'paul', 'unknown', 111]
+
+    pages = {
+        "https://mbasic.facebook.com/profile.php?v=info&id=110": "about110",
+        "https://mbasic.facebook.com/paul/about": "aboutPaul",
+        "https://mbasic.facebook.com/unknown/about": RuntimeError("Boom"),
+        "https://mbasic.facebook.com/profile.php?v=info&id=111": "about111",
+        "https://mbasic.facebook.com/profile.php?v=friends&id=110":
+            "friends110",
+        "https://mbasic.facebook.com/profile.php?v=friends&id=234":
+            "friends234",
+        "https://mbasic.facebook.com/friends2": "friends234-2",
+        "https://mbasic.facebook.com/profile.php?v=likes&id=110": "likes110",
+        "https://mbasic.facebook.com/profile.php?v=likes&id=234": "likes234",
+        "https://mbasic.facebook.com/profile.php?v=friends&mutual=1&" +
+        "lst=123:110:1&id=110": "mutual110",
+        "https://mbasic.facebook.com/profile.php?v=friends&mutual=1&" +
+        "lst=123:234:1&id=234": "mutual234"
+    }
+
+    with create_fetchers(pages) as \
+            (fb_fetcher, async_fb_fetcher, mock_fb_parser):
+
+        mock_fb_parser.parse_about_page.side_effect = create_fake_parse({
+            "about110": OrderedDict([('id', 110), ('name', 'Mark')]),
+            "aboutPaul": OrderedDict([('id', 234), ('name', 'Paul')]),
+            "about111": None
+        })
+        mock_fb_parser.parse_friends_page.side_effect = create_fake_parse({
+            "friends110": GenericResult(
+                content=OrderedDict([('friends', OrderedDict([
+                    ('username1?fref=fr_tab', 'Friend 1')]))]),
+                see_more_links=[]),
+            "friends234": GenericResult(
+                content=OrderedDict([('friends', OrderedDict([
+                    ('username2?fref=fr_tab', 'Friend 2')]))]),
+                see_more_links=['/friends2']),
+            "friends234-2": GenericResult(
+                content=OrderedDict([('friends', OrderedDict([
+                    ('username3?fref=fr_tab', 'Friend 3')]))]),
+                see_more_links=[])
+        })
+        mock_fb_parser.parse_likes_page.side_effect = create_fake_parse({
+            "likes110": GenericResult(
+                content=OrderedDict([('Music', OrderedDict([
+                    ('band1/', 'Band 1')]))]),
+                see_more_links=[]),
+            "likes234": RuntimeError("Boom")
+        })
+        mutual_friends_pages = {
+            "mutual110": GenericResult(
+                content=OrderedDict([('mutual_friends', OrderedDict([
+                    ('username1?fref=fr_tab', 'Friend 1')]))]),
+                see_more_links=[]),
+            "mutual234": GenericResult(
+                content=OrderedDict([('mutual_friends', OrderedDict())]),
+                see_more_links=[])
+        }
+        mock_fb_parser.parse_mutual_friends_page.side_effect = \
+            create_fake_parse(mutual_friends_pages)
+
+        expected_infos = fb_fetcher.fetch_user_infos(
+            user_refs, True, True, True)
+
+        res = asyncio.run(async_fb_fetcher.fetch_user_infos(
+            user_refs, True, True, True))
+
+        assert_equal(res, expected_infos)
+        assert_equal(list(res.keys()), [110, 'paul', 111])
+        assert_equal(res[111], OrderedDict([('id', 111)]))
+        assert_equal(res['paul']['friend_count'], 2)
+
+
+def test_fetch_articles_from_timeline_returns_same_results():
+
+    pages = {
+        "https://mbasic.facebook.com/mark?v=timeline": "mainPage",
+        "https://mbasic.facebook.com/ShowMoreFromMainPage-Link1": "page1",
+        "https://mbasic.facebook.com/Link1FromMainPage": "page2",
+        "https://mbasic.facebook.com/ShowMoreFromLink1-1": "page3",
+        "https://mbasic.facebook.com/Link2FromMainPage": "page4",
+        "https://mbasic.facebook.com/ShowMoreFromLink2-1": "page5",
+        "https://mbasic.facebook.com/profile.php?id=111&v=timeline":
+            RuntimeError("Boom")
+    }
+
+    with create_fetchers(pages) as \
+            (fb_fetcher, async_fb_fetcher, mock_fb_parser):
+
+        mock_fb_parser.parse_timeline_years_links.return_value = \
+            ["/Link1FromMainPage", "/Link2FromMainPage"]
+        mock_fb_parser.parse_timeline_page.side_effect = create_fake_parse({
+            "mainPage": TimelineResult(
+                articles=OrderedDict([
+                    (100, OrderedDict([("someData", "1")])),
+                    (200, OrderedDict([("someData", "2")]))
+                ]),
+                show_more_link="/ShowMoreFromMainPage-Link1"),
+            "page1": TimelineResult(
+                articles=OrderedDict([
+                    (300, OrderedDict([("someData", "3")])),
+                    # Same post returned twice, e.g. album updated
+                    (100, OrderedDict([("someData", "1-bis")]))
+                ]),
+                show_more_link=""),
+            "page2": TimelineResult(
+                articles=OrderedDict([
+                    (400, OrderedDict([("someData", "4")]))
+                ]),
+                show_more_link="/ShowMoreFromLink1-1"),
+            "page3": TimelineResult(
+                articles=OrderedDict([
+                    (500, OrderedDict([("someData", "5")]))
+                ]),
+                show_more_link=""),
+            "page4": None,
+            "page5": TimelineResult(
+                articles=OrderedDict([
+                    (600, OrderedDict([("someData", "6")]))
+                ]),
+                show_more_link="")
+        })
+        mock_fb_parser.parse_timeline_first_page.side_effect = \
+            lambda content: (
+                mock_fb_parser.parse_timeline_years_links(content),
+                mock_fb_parser.parse_timeline_page(content))
+
+        expected_articles = fb_fetcher.fetch_articles_from_timeline(
+            ["mark", "111"])
+
+        res = asyncio.run(async_fb_fetcher.fetch_articles_from_timeline(
+            ["mark", "111"]))
+
+        assert_equal(res, expected_articles)
+        assert_equal(
+            list(res["mark"]["posts"].keys()), [100, 200, 300, 400, 500])
+        assert_equal(res["111"]["posts"], OrderedDict())
+
+
+def check_fetch_reactions_per_user_for_articles_returns_same_results(
+        parsing_executor):
+
+    articles = [
+        {"post_id": 100, "like_count": 3},
+        {"post_id": 200, "like_count": 2},
+        {"post_id": 300, "like_count": 1}
+    ]
+
+    first_page_url = \
+        "https://mbasic.facebook.com/ufi/reaction/profile/browser/fetch/?" + \
+        "limit={0}&total_count=1000000&ft_ent_identifier={1}"
+    pages = {
+        first_page_url.format(500, 100): "reactions100",
+        "https://mbasic.facebook.com/ufi/reaction/profile/browser/fetch/?" +
+        "limit=500&shown_ids=1111&ft_ent_identifier=100": "reactions100-2",
+        first_page_url.format(500, 200): DownloadError("Boom", 500),
+        first_page_url.format(250, 200): "reactions200",
+        first_page_url.format(500, 300): "reactions300"
+    }
+
+    with create_fetchers(pages, parsing_executor) as \
+            (fb_fetcher, async_fb_fetcher, mock_fb_parser):
+
+        mock_fb_parser.parse_reaction_page.side_effect = create_fake_parse({
+            "reactions100": ReactionResult(
+                likers=["1111"],
+                see_more_link="/ufi/reaction/profile/browser/fetch/?" +
+                              "limit=10&shown_ids=1111&" +
+                              "ft_ent_identifier=100"),
+            "reactions100-2": ReactionResult(
+                likers=["2222", "somePage/"], see_more_link=None),
+            "reactions200": ReactionResult(
+                likers=["2222", "3333"], see_more_link=None),
+            "reactions300": RuntimeError("Boom")
+        })
+
+        expected_reactions = \
+            fb_fetcher.fetch_reactions_per_user_for_articles(
+                articles, False)
+
+        res = asyncio.run(
+            async_fb_fetcher.fetch_reactions_per_user_for_articles(
+                articles, False))
+
+        assert_equal(list(res.items()), list(expected_reactions.items()))
+        assert_equal(
+            list(res.keys()), ["1111", "2222", "somePage/", "3333"])
+
+
+def test_fetch_reactions_per_user_for_articles_returns_same_results():
+    check_fetch_reactions_per_user_for_articles_returns_same_results(None)
+
+
+def test_fetch_reactions_per_user_for_articles_parsed_in_executor():
+    with ThreadPoolExecutor(2) as parsing_executor:
+        check_fetch_reactions_per_user_for_articles_returns_same_results(
+            parsing_executor)
+
+
+def test_close_stops_the_threads_of_the_fetcher():
+
+    with create_fetchers({}, ThreadPoolExecutor(2)) as \
+            (_, async_fb_fetcher, _):
+
+        async_fb_fetcher.close()
+
+        assert_raises(
+            RuntimeError, async_fb_fetcher.downloader.executor.submit, print)
+        assert_raises(
+            RuntimeError, async_fb_fetcher.parsing_executor.submit, print)
@@ -0,0 +1,371 @@
+from core.checkpoint import CrawlCheckpoint
+from core.facebook_fetcher import FacebookFetcher
+from core.facebook_soup_parser import ReactionResult, TimelineResult
+from tests.mocks import create_mock_downloader, create_mock_facebook_parser
+from tests.fakes import create_fake_config, create_fake_fetch_url, \
+    create_fake_parse, create_ok_return_value
+
+from collections import OrderedDict, deque
+from nose.tools import assert_equal, assert_raises
+import os
+import tempfile
+import threading
+
+
+class Crash(BaseException):
+    """ Not caught by the fetcher, like a KeyboardInterrupt."""
+
+
+def create_post(post_id):
+    return OrderedDict([("post_id", post_id), ("date", str(post_id))])
+
+
+TIMELINE_PAGES = {
+    "https://mbasic.facebook.com/mark?v=timeline": "mainPage",
+    "https://mbasic.facebook.com/ShowMore1": "page1",
+    "https://mbasic.facebook.com/Link1FromMainPage": "page2",
+    "https://mbasic.facebook.com/ShowMore2": "page3"
+}
+
+TIMELINE_RESULTS = {
+    "mainPage": TimelineResult(
+        articles=OrderedDict([(100, create_post(100))]),
+        show_more_link="/ShowMore1"),
+    "page1": TimelineResult(
+        articles=OrderedDict([(200, create_post(200))]),
+        show_more_link=""),
+    "page2": TimelineResult(
+        articles=OrderedDict([(300, create_post(300))]),
+        show_more_link="/ShowMore2"),
+    "page3": TimelineResult(
+        articles=OrderedDict([(400, create_post(400))]),
+        show_more_link="")
+}
+
+
+def fetch_timeline(pages, checkpoint):
+
+    with create_mock_downloader() as mock_downloader:
+
+        with create_mock_facebook_parser() as mock_fb_parser:
+
+            mock_downloader.fetch_url.side_effect = \
+                create_fake_fetch_url(pages)
+            mock_fb_parser.parse_timeline_years_links.return_value = \
+                ["/Link1FromMainPage"]
+            mock_fb_parser.parse_timeline_page.side_effect = \
+                create_fake_parse(TIMELINE_RESULTS)
+
+            fb_fetcher = FacebookFetcher(
+                mock_downloader, mock_fb_parser, create_fake_config())
+
+            try:
+                return fb_fetcher.fetch_articles_from_timeline(
+                    ["mark", 111], checkpoint)
+            finally:
+                fetch_timeline.urls_fetched = [
+                    call[1]["url"]
+                    for call in mock_downloader.fetch_url.call_args_list]
+
+
+def test_checkpoint_saves_and_loads_crawls():
+
+    with tempfile.TemporaryDirectory() as directory:
+
+        filepath = os.path.join(directory, "checkpoint.json")
+        checkpoint = CrawlCheckpoint(filepath, interval_secs=0)
+
+        crawl = checkpoint.get_crawl("timeline", 111)
+        crawl["links_to_explore"] = deque(["link1", "link2"])
+        crawl["likers"] = set(["user1"])
+        checkpoint.get_crawl("timeline", "111")["links_explored"] = 3
+        checkpoint.save()
+
+        loaded_checkpoint = CrawlCheckpoint(filepath)
+        assert_equal(loaded_checkpoint.load(), True)
+        assert_equal(
+            loaded_checkpoint.get_crawl("timeline", 111),
+            OrderedDict([
+                ("links_to_explore", ["link1", "link2"]),
+                ("likers", ["user1"])]))
+        assert_equal(
+            loaded_checkpoint.get_crawl("timeline", "111"),
+            OrderedDict([("links_explored", 3)]))
+        assert_equal(
+            loaded_checkpoint.get_crawl("reactions", 111), OrderedDict())
+
+        checkpoint.remove()
+        assert_equal(os.listdir(directory), [])
+        assert_equal(CrawlCheckpoint(filepath).load(), False)
+
+
+def test_checkpoint_is_only_saved_every_interval_secs():
+
+    with tempfile.TemporaryDirectory() as directory:
+
+        filepath = os.path.join(directory, "checkpoint.json")
+        checkpoint = CrawlCheckpoint(filepath, interval_secs=3600)
+
+        checkpoint.save()
+        assert_equal(os.path.exists(filepath), False)
+
+        checkpoint.save(force=True)
+        assert_equal(os.path.exists(filepath), True)
+
+
+def test_fetch_articles_from_timeline_resumes_from_checkpoint():
+
+    expected_posts = fetch_timeline(TIMELINE_PAGES, None)
+
+    with tempfile.TemporaryDirectory() as directory:
+
+        filepath = os.path.join(directory, "checkpoint.json")
+
+        crashing_pages = dict(TIMELINE_PAGES)
+        crashing_pages["https://mbasic.facebook.com/Link1FromMainPage"] = \
+            Crash()
+        with assert_raises(Crash):
+            fetch_timeline(
+                crashing_pages, CrawlCheckpoint(filepath, interval_secs=0))
+
+        checkpoint = CrawlCheckpoint(filepath, interval_secs=0)
+        checkpoint.load()
+        res = fetch_timeline(TIMELINE_PAGES, checkpoint)
+
+        assert_equal(res, expected_posts)
+        assert_equal(list(res["mark"]["posts"]), [100, 200, 300, 400])
+        assert_equal(
+            fetch_timeline.urls_fetched, [
+                "https://mbasic.facebook.com/Link1FromMainPage",
+                "https://mbasic.facebook.com/ShowMore2",
+                "https://mbasic.facebook.com/profile.php?id=111&v=timeline"
+            ])
+
+
+def test_checkpoint_is_kept_when_a_timeline_page_failed():
+
+    pages = dict(TIMELINE_PAGES)
+    pages["https://mbasic.facebook.com/profile.php?id=111&v=timeline"] = \
+        "page1"
+    expected_posts = fetch_timeline(pages, None)
+
+    with tempfile.TemporaryDirectory() as directory:
+
+        filepath = os.path.join(directory, "checkpoint.json")
+
+        # e.g. the cookie expired
+        failing_pages = dict(pages)
+        failing_pages["https://mbasic.facebook.com/Link1FromMainPage"] = \
+            RuntimeError("Login page")
+        checkpoint = CrawlCheckpoint(filepath, interval_secs=3600)
+        fetch_timeline(failing_pages, checkpoint)
+
+        assert_equal(checkpoint.complete(), False)
+        assert_equal(os.path.exists(filepath), True)
+
+        checkpoint = CrawlCheckpoint(filepath, interval_secs=0)
+        checkpoint.load()
+        res = fetch_timeline(pages, checkpoint)
+
+        assert_equal(res, expected_posts)
+        assert_equal(fetch_timeline.urls_fetched[0],
+                     "https://mbasic.facebook.com/Link1FromMainPage")
+        assert_equal(checkpoint.complete(), True)
+        assert_equal(os.path.exists(filepath), False)
+
+
+def test_fetch_reactions_per_user_for_articles_resumes_from_checkpoint():
+
+    articles = [{"post_id": 100}, {"post_id": 200}]
+
+    first_page_url = \
+        "https://mbasic.facebook.com/ufi/reaction/profile/browser/fetch/?" + \
+        "limit=500&total_count=1000000&ft_ent_identifier={0}"
+    second_page_url = \
+        "https://mbasic.facebook.com/ufi/reaction/profile/browser/fetch/?" + \
+        "limit=500&shown_ids=1111&ft_ent_identifier=100"
+    pages = {
+        first_page_url.format(100): "reactions100",
+        second_page_url: "reactions100-2",
+        first_page_url.format(200): "reactions200"
+    }
+    reaction_results = {
+        "reactions100": ReactionResult(
+            likers=["1111"],
+            see_more_link="/ufi/reaction/profile/browser/fetch/?" +
+                          "limit=10&shown_ids=1111&ft_ent_identifier=100"),
+        "reactions100-2": ReactionResult(
+            likers=["2222"], see_more_link=None),
+        "reactions200": ReactionResult(
+            likers=["2222", "3333"], see_more_link=None)
+    }
+
+    def fetch_reactions(pages, checkpoint):
+
+        with create_mock_downloader() as mock_downloader:
+
+            with create_mock_facebook_parser() as mock_fb_parser:
+
+                mock_downloader.fetch_url.side_effect = \
+                    create_fake_fetch_url(pages)
+                mock_fb_parser.parse_reaction_page.side_effect = \
+                    create_fake_parse(reaction_results)
+
+                fb_fetcher = FacebookFetcher(
+                    mock_downloader, mock_fb_parser, create_fake_config())
+
+                try:
+                    return fb_fetcher.fetch_reactions_per_user_for_articles(
+                        articles, False, checkpoint)
+                finally:
+                    fetch_reactions.urls_fetched = [
+                        call[1]["url"] for call in
+                        mock_downloader.fetch_url.call_args_list]
+
+    expected_reactions = fetch_reactions(pages, None)
+
+    with tempfile.TemporaryDirectory() as directory:
+
+        filepath = os.path.join(directory, "checkpoint.json")
+
+        crashing_pages = dict(pages)
+        crashing_pages[second_page_url] = Crash()
+        with assert_raises(Crash):
+            fetch_reactions(
+                crashing_pages, CrawlCheckpoint(filepath, interval_secs=0))
+
+        checkpoint = CrawlCheckpoint(filepath, interval_secs=0)
+        checkpoint.load()
+        res = fetch_reactions(pages, checkpoint)
+
+        assert_equal(list(res.items()), list(expected_reactions.items()))
+        assert_equal(list(res.keys()), ["1111", "2222", "3333"])
+        assert_equal(
+            fetch_reactions.urls_fetched,
+            [second_page_url, first_page_url.format(200)])
+
+
+def test_checkpoint_is_kept_when_a_reaction_page_failed():
+
+    first_page_url = \
+        "https://mbasic.facebook.com/ufi/reaction/profile/browser/fetch/?" + \
+        "limit=500&total_count=1000000&ft_ent_identifier=100"
+    second_page_url = \
+        "https://mbasic.facebook.com/ufi/reaction/profile/browser/fetch/?" + \
+        "limit={0}&shown_ids=1111&ft_ent_identifier=100"
+    reaction_results = {
+        "reactions100": ReactionResult(
+            likers=["1111"],
+            see_more_link="/ufi/reaction/profile/browser/fetch/?" +
+                          "limit=10&shown_ids=1111&ft_ent_identifier=100"),
+        "reactions100-2": ReactionResult(
+            likers=["2222"], see_more_link=None),
+    }
+
+    def fetch_likers(failing, checkpoint):
+
+        with create_mock_downloader() as mock_downloader:
+
+            with create_mock_facebook_parser() as mock_fb_parser:
+
+                def fetch_url(cookie, url, timeout_secs, retries):
+                    if url == first_page_url:
+                        return create_ok_return_value("reactions100")
+                    if failing:
+                        raise RuntimeError("Login page")
+                    return create_ok_return_value("reactions100-2")
+
+                mock_downloader.fetch_url.side_effect = fetch_url
+                mock_fb_parser.parse_reaction_page.side_effect = \
+                    create_fake_parse(reaction_results)
+
+                fb_fetcher = FacebookFetcher(
+                    mock_downloader, mock_fb_parser, create_fake_config())
+                return fb_fetcher.fetch_likers_for_article(100, checkpoint)
+
+    with tempfile.TemporaryDirectory() as directory:
+
+        filepath = os.path.join(directory, "checkpoint.json")
+
+        checkpoint = CrawlCheckpoint(filepath, interval_secs=3600)
+        assert_equal(fetch_likers(True, checkpoint), set(["1111"]))
+        assert_equal(checkpoint.complete(), False)
+
+        checkpoint = CrawlCheckpoint(filepath, interval_secs=0)
+        checkpoint.load()
+        assert_equal(
+            checkpoint.get_crawl("reactions", 100)["links_to_explore"],
+            [second_page_url])
+        assert_equal(
+            fetch_likers(False, checkpoint), set(["1111", "2222"]))
+        assert_equal(checkpoint.complete(), True)
+
+
+def test_reaction_page_is_kept_to_explore_until_processed():
+
+    articles = [{"post_id": 100}]
+    first_page_url = \
+        "https://mbasic.facebook.com/ufi/reaction/profile/browser/fetch/?" + \
+        "limit=500&total_count=1000000&ft_ent_identifier=100"
+    second_page_url = \
+        "https://mbasic.facebook.com/ufi/reaction/profile/browser/fetch/?" + \
+        "limit=500&shown_ids=1111&ft_ent_identifier=100"
+    pages = {
+        first_page_url: "reactions100",
+        second_page_url: "reactions100-2",
+    }
+    reaction_results = {
+        "reactions100": ReactionResult(
+            likers=["1111"],
+            see_more_link="/ufi/reaction/profile/browser/fetch/?" +
+                          "limit=10&shown_ids=1111&ft_ent_identifier=100"),
+        "reactions100-2": ReactionResult(
+            likers=["2222"], see_more_link=None),
+    }
+
+    def fetch_reactions(checkpoint, crash):
+
+        with create_mock_downloader() as mock_downloader:
+
+            with create_mock_facebook_parser() as mock_fb_parser:
+
+                parse = create_fake_parse(reaction_results)
+
+                def parse_then_crash(content):
+                    if crash and content == "reactions100-2":
+                        # Saved by the crawl of another article, between the
+                        # fetch and the parse of the page
+                        thread = threading.Thread(
+                            target=checkpoint.save, args=(True,))
+                        thread.start()
+                        thread.join()
+                        raise Crash()
+                    return parse(content)
+
+                mock_downloader.fetch_url.side_effect = \
+                    create_fake_fetch_url(pages)
+                mock_fb_parser.parse_reaction_page.side_effect = \
+                    parse_then_crash
+
+                fb_fetcher = FacebookFetcher(
+                    mock_downloader, mock_fb_parser, create_fake_config(),
+                    workers=2)
+                return fb_fetcher.fetch_reactions_per_user_for_articles(
+                    articles, False, checkpoint)
+
+    with tempfile.TemporaryDirectory() as directory:
+
+        filepath = os.path.join(directory, "checkpoint.json")
+
+        with assert_raises(Crash):
+            fetch_reactions(
+                CrawlCheckpoint(filepath, interval_secs=3600), True)
+
+        checkpoint = CrawlCheckpoint(filepath, interval_secs=0)
+        checkpoint.load()
+        assert_equal(
+            checkpoint.get_crawl("reactions", 100)["links_to_explore"],
+            [second_page_url.replace("limit=500", "limit={0}")])
+        res = fetch_reactions(checkpoint, False)
+
+        assert_equal(list(res.keys()), ["1111", "2222"])
@@ -0,0 +1,172 @@
+from core.crawl_progress import CrawlProgress
+from core.facebook_fetcher import FacebookFetcher
+from core.facebook_soup_parser import GenericResult, TimelineResult
+from tests.mocks import create_mock_downloader, create_mock_facebook_parser
+from tests.fakes import create_fake_config, create_fake_fetch_url, \
+    create_fake_parse
+
+from collections import OrderedDict
+from nose.tools import assert_equal
+import io
+import json
+import os
+import tempfile
+
+
+def create_post(post_id):
+    return OrderedDict([("post_id", post_id), ("date", str(post_id))])
+
+
+TIMELINE_PAGES = {
+    "https://mbasic.facebook.com/mark?v=timeline": "mainPage",
+    "https://mbasic.facebook.com/ShowMore1": "page1",
+    "https://mbasic.facebook.com/Link1FromMainPage": "page2",
+}
+
+TIMELINE_RESULTS = {
+    "mainPage": TimelineResult(
+        articles=OrderedDict([(100, create_post(100))]),
+        show_more_link="/ShowMore1"),
+    "page1": TimelineResult(
+        articles=OrderedDict([(200, create_post(200)),
+                              (300, create_post(300))]),
+        show_more_link=""),
+    "page2": TimelineResult(
+        articles=OrderedDict([(400, create_post(400))]),
+        show_more_link=""),
+}
+
+
+def test_progress_of_timeline_crawls_is_written_to_stats_file():
+
+    for workers in [1, 2]:
+        with tempfile.TemporaryDirectory() as directory:
+
+            filepath = os.path.join(directory, "progress.json")
+            progress = CrawlProgress(stats_filepath=filepath, interval_secs=0)
+
+            with create_mock_downloader() as mock_downloader:
+
+                with create_mock_facebook_parser() as mock_fb_parser:
+
+                    mock_downloader.fetch_url.side_effect = \
+                        create_fake_fetch_url(TIMELINE_PAGES)
+                    mock_fb_parser.parse_timeline_years_links.return_value = \
+                        ["/Link1FromMainPage"]
+                    mock_fb_parser.parse_timeline_page.side_effect = \
+                        create_fake_parse(TIMELINE_RESULTS)
+
+                    fb_fetcher = FacebookFetcher(
+                        mock_downloader, mock_fb_parser, create_fake_config(),
+                        workers, progress)
+                    fb_fetcher.fetch_articles_from_timeline(["mark"])
+
+            with open(filepath) as f:
+                stats = json.load(f)
+
+            assert_equal(
+                (stats["pages_done"], stats["items_found"],
+                 stats["frontier"], stats["crawls_running"]),
+                (3, 4, 0, 0))
+            assert_equal(
+                stats["units"], {"name": "users", "done": 1, "total": 1})
+            assert_equal(stats["eta_secs"], 0)
+
+
+def test_progress_counts_items_of_recursive_crawls():
+
+    pages = {
+        "https://mbasic.facebook.com/friends": "content1",
+        "https://mbasic.facebook.com/friends?startindex=1": "content2",
+    }
+    parse = create_fake_parse({
+        "content1": GenericResult(
+            content=OrderedDict([
+                ('friends', OrderedDict([
+                    ('friend1', 'Friend 1'), ('friend2', 'Friend 2')]))]),
+            see_more_links=['/friends?startindex=1']),
+        "content2": GenericResult(
+            content=OrderedDict([
+                ('friends', OrderedDict([('friend3', 'Friend 3')]))]),
+            see_more_links=[])
+    })
+    progress = CrawlProgress()
+
+    with create_mock_downloader() as mock_downloader:
+
+        with create_mock_facebook_parser() as mock_fb_parser:
+
+            fb_fetcher = FacebookFetcher(
+                mock_downloader, mock_fb_parser, create_fake_config(),
+                progress=progress)
+            mock_downloader.fetch_url.side_effect = \
+                create_fake_fetch_url(pages)
+
+            fb_fetcher.fetch_content_recursively(
+                "https://mbasic.facebook.com/friends", parse)
+
+    stats = progress.get_stats()
+    assert_equal(
+        (stats["pages_done"], stats["items_found"], stats["crawls_done"]),
+        (2, 3, 1))
+
+
+def test_crawls_stopped_early_are_finished():
+
+    pages = {
+        "https://mbasic.facebook.com/friends": "content1",
+        "https://mbasic.facebook.com/friends?startindex=1": "content2",
+    }
+    parse = create_fake_parse({
+        "content1": GenericResult(
+            content=OrderedDict([
+                ('friends', OrderedDict([('friend1', 'Friend 1')]))]),
+            see_more_links=['/friends?startindex=1']),
+        "content2": GenericResult(
+            content=OrderedDict([
+                ('friends', OrderedDict([('friend2', 'Friend 2')]))]),
+            see_more_links=[])
+    })
+    progress = CrawlProgress()
+
+    with create_mock_downloader() as mock_downloader:
+
+        with create_mock_facebook_parser() as mock_fb_parser:
+
+            fb_fetcher = FacebookFetcher(
+                mock_downloader, mock_fb_parser, create_fake_config(),
+                progress=progress)
+            mock_downloader.fetch_url.side_effect = \
+                create_fake_fetch_url(pages)
+
+            results = fb_fetcher.iter_content_recursively(
+                "https://mbasic.facebook.com/friends", parse)
+            next(results)
+            results.close()
+
+    stats = progress.get_stats()
+    assert_equal(
+        (stats["pages_done"], stats["frontier"], stats["crawls_running"],
+         stats["crawls_done"]),
+        (1, 0, 0, 1))
+
+
+def test_status_line_is_only_written_every_interval_secs():
+
+    now = [0.0]
+    status_file = io.StringIO()
+    progress = CrawlProgress(
+        status_file, interval_secs=10, clock=lambda: now[0])
+
+    crawl_id = progress.start_crawl()
+    progress.record_page(crawl_id, items=5, frontier=1)
+    assert_equal(status_file.getvalue(), "")
+
+    now[0] = 10.0
+    progress.record_page(crawl_id, items=5, frontier=0)
+    progress.finish_crawl(crawl_id)
+    progress.close()
+
+    assert_equal(status_file.getvalue().splitlines(), [
+        "Crawl: 2 page(s), 0 left, 10 item(s), 0.2 pages/s, 1.0 items/s, "
+        "ETA 0:00:00"] * 2)
@@ -1,19 +1,24 @@
 from collections import namedtuple
+from core.download_metrics import DownloadMetrics
 from core.downloader import Downloader
+from core.page_cache import PageCache
 from tests.fakes import \
     create_ok_return_value, create_ok_return_value_without_text, \
     create_not_found_return_value, create_service_unavailable_return_value, \
-    create_internal_server_error_return_value
+    create_internal_server_error_return_value, \
+    create_bad_gateway_return_value, create_too_many_requests_return_value, \
+    create_fake_retry_policy
 
-from unittest.mock import call, patch, ANY
+from unittest.mock import call, patch, Mock, ANY
 
+import datetime
 import requests
 
 FAKE_URL = "http://fake.url"
 FAKE_COOKIE = "fake cookie"
 
 
-@patch("core.downloader.requests.get")
+@patch("core.downloader.requests.Session.get")
 def test_url_is_passed(mock_requests):
     downloader = Downloader()
 
@@ -24,7 +29,7 @@ def test_url_is_passed(mock_requests):
         url=FAKE_URL, headers=ANY, allow_redirects=ANY, timeout=ANY)
 
 
-@patch("core.downloader.requests.get")
+@patch("core.downloader.requests.Session.get")
 def test_cookie_is_passed_in_headers(mock_requests):
     downloader = Downloader()
 
@@ -45,7 +50,7 @@ def test_cookie_is_passed_in_headers(mock_requests):
         allow_redirects=ANY, timeout=ANY)
 
 
-@patch("core.downloader.requests.get")
+@patch("core.downloader.requests.Session.get")
 def test_redirect_is_enabled(mock_requests):
     downloader = Downloader()
 
@@ -56,7 +61,7 @@ def test_redirect_is_enabled(mock_requests):
         allow_redirects=True, url=ANY, headers=ANY, timeout=ANY)
 
 
-@patch("core.downloader.requests.get")
+@patch("core.downloader.requests.Session.get")
 def test_default_timeout_is_passed(mock_requests):
     downloader = Downloader()
 
@@ -67,7 +72,7 @@ def test_default_timeout_is_passed(mock_requests):
         timeout=15, url=ANY, headers=ANY, allow_redirects=ANY)
 
 
-@patch("core.downloader.requests.get")
+@patch("core.downloader.requests.Session.get")
 def test_timeout_is_passed(mock_requests):
     downloader = Downloader()
 
@@ -78,7 +83,7 @@ def test_timeout_is_passed(mock_requests):
         timeout=3600, url=ANY, headers=ANY, allow_redirects=ANY)
 
 
-@patch("core.downloader.requests.get")
+@patch("core.downloader.requests.Session.get")
 def test_response_is_returned(mock_requests):
     downloader = Downloader()
 
@@ -91,7 +96,7 @@ def test_response_is_returned(mock_requests):
         url=ANY, headers=ANY, allow_redirects=ANY, timeout=ANY)
 
 
-@patch("core.downloader.requests.get")
+@patch("core.downloader.requests.Session.get")
 def test_status_code_different_from_200_causes_exception(mock_requests):
     downloader = Downloader()
 
@@ -107,7 +112,7 @@ def test_status_code_different_from_200_causes_exception(mock_requests):
     assert got_ex
 
 
-@patch("core.downloader.requests.get")
+@patch("core.downloader.requests.Session.get")
 def test_empty_returned_text_causes_exception(mock_requests):
     downloader = Downloader()
 
@@ -123,7 +128,7 @@ def test_empty_returned_text_causes_exception(mock_requests):
     assert got_ex
 
 
-@patch("core.downloader.requests.get")
+@patch("core.downloader.requests.Session.get")
 def test_exceptions_from_get_are_propagated(mock_requests):
     downloader = Downloader()
 
@@ -140,7 +145,7 @@ def test_exceptions_from_get_are_propagated(mock_requests):
     assert got_ex
 
 
-@patch("core.downloader.requests.get")
+@patch("core.downloader.requests.Session.get")
 def test_timeout_is_propagated_when_retries_are_disabled(mock_requests):
     downloader = Downloader()
 
@@ -157,9 +162,9 @@ def test_timeout_is_propagated_when_retries_are_disabled(mock_requests):
     assert got_ex
 
 
-@patch("core.downloader.requests.get")
+@patch("core.downloader.requests.Session.get")
 def test_retries_when_timeout_then_ok(mock_requests):
-    downloader = Downloader()
+    downloader = Downloader(retry_policy=create_fake_retry_policy())
 
     mock_requests.side_effect = [
         requests.exceptions.Timeout(),
@@ -176,7 +181,7 @@ def test_retries_when_timeout_then_ok(mock_requests):
     ])
 
 
-@patch("core.downloader.requests.get")
+@patch("core.downloader.requests.Session.get")
 def test_exceptions_when_internal_server_error(mock_requests):
     downloader = Downloader()
 
@@ -193,9 +198,9 @@ def test_exceptions_when_internal_server_error(mock_requests):
     assert got_ex
 
 
-@patch("core.downloader.requests.get")
+@patch("core.downloader.requests.Session.get")
 def test_retries_when_service_unavailable_then_ok(mock_requests):
-    downloader = Downloader()
+    downloader = Downloader(retry_policy=create_fake_retry_policy())
 
     mock_requests.side_effect = [
         create_service_unavailable_return_value(),
@@ -212,9 +217,9 @@ def test_retries_when_service_unavailable_then_ok(mock_requests):
     ])
 
 
-@patch("core.downloader.requests.get")
+@patch("core.downloader.requests.Session.get")
 def test_timeout_is_propagated_after_last_retry_failed(mock_requests):
-    downloader = Downloader()
+    downloader = Downloader(retry_policy=create_fake_retry_policy())
 
     mock_requests.side_effect = [
         requests.exceptions.Timeout(),
@@ -233,3 +238,250 @@ def test_timeout_is_propagated_after_last_retry_failed(mock_requests):
         call(url=ANY, headers=ANY, allow_redirects=ANY, timeout=ANY)
     ])
     assert got_ex
+
+
+@patch("core.downloader.requests.Session.get")
+def test_same_session_is_used_for_all_calls(mock_requests):
+    downloader = Downloader()
+    session = downloader.session
+
+    mock_requests.return_value = create_ok_return_value()
+    downloader.fetch_url(FAKE_COOKIE, FAKE_URL)
+    downloader.fetch_url(FAKE_COOKIE, FAKE_URL)
+
+    assert downloader.session is session
+    assert mock_requests.call_count == 2
+
+
+def test_pool_size_is_configurable():
+    downloader = Downloader(pool_size=3)
+
+    adapter = downloader.session.get_adapter("https://mbasic.facebook.com")
+
+    assert adapter._pool_maxsize == 3
+
+
+@patch("core.downloader.requests.Session.get")
+def test_every_attempt_waits_for_the_rate_limiter(mock_requests):
+    rate_limiter = Mock()
+    downloader = Downloader(
+        rate_limiter=rate_limiter, retry_policy=create_fake_retry_policy())
+
+    mock_requests.side_effect = [
+        requests.exceptions.Timeout(),
+        create_ok_return_value()
+    ]
+    downloader.fetch_url(FAKE_COOKIE, FAKE_URL, retries=2)
+
+    rate_limiter.wait.assert_has_calls([call(FAKE_URL), call(FAKE_URL)])
+
+
+@patch("core.downloader.requests.Session.get")
+def test_retries_follow_exponential_backoff_up_to_cap(mock_requests):
+    retry_policy = create_fake_retry_policy(base_secs=1, cap_secs=5)
+    downloader = Downloader(retry_policy=retry_policy)
+
+    mock_requests.side_effect = [
+        requests.exceptions.Timeout(),
+        create_internal_server_error_return_value(),
+        create_bad_gateway_return_value(),
+        create_service_unavailable_return_value(),
+        requests.exceptions.ConnectionError(),
+        create_ok_return_value()
+    ]
+    res = downloader.fetch_url(FAKE_COOKIE, FAKE_URL, retries=6)
+
+    assert res == create_ok_return_value()
+    assert retry_policy.delays == [1.0, 2.0, 4.0, 5.0, 5.0]
+
+
+@patch("core.downloader.requests.Session.get")
+def test_retries_honor_retry_after(mock_requests):
+    retry_policy = create_fake_retry_policy(
+        base_secs=1, cap_secs=5, max_retry_after_secs=60)
+    downloader = Downloader(retry_policy=retry_policy)
+
+    mock_requests.side_effect = [
+        create_too_many_requests_return_value(retry_after="30"),
+        create_too_many_requests_return_value(),
+        create_ok_return_value()
+    ]
+    res = downloader.fetch_url(FAKE_COOKIE, FAKE_URL, retries=3)
+
+    assert res == create_ok_return_value()
+    assert retry_policy.delays == [30.0, 2.0]
+
+
+@patch("core.downloader.requests.Session.get")
+def test_retry_after_is_capped(mock_requests):
+    retry_policy = create_fake_retry_policy(base_secs=1, cap_secs=5)
+    downloader = Downloader(retry_policy=retry_policy)
+
+    mock_requests.side_effect = [
+        create_too_many_requests_return_value(retry_after="86400"),
+        create_ok_return_value()
+    ]
+    res = downloader.fetch_url(FAKE_COOKIE, FAKE_URL, retries=3)
+
+    assert res == create_ok_return_value()
+    assert retry_policy.delays == [5.0]
+
+
+@patch("core.downloader.requests.Session.get")
+def test_jitter_spreads_delays(mock_requests):
+    retry_policy = create_fake_retry_policy(
+        base_secs=2, cap_secs=60, jitter=1, random=lambda: 0.25)
+    downloader = Downloader(retry_policy=retry_policy)
+
+    mock_requests.side_effect = [
+        create_service_unavailable_return_value(),
+        create_service_unavailable_return_value(),
+        create_ok_return_value()
+    ]
+    downloader.fetch_url(FAKE_COOKIE, FAKE_URL, retries=3)
+
+    assert retry_policy.delays == [1.5, 3.0]
+
+
+@patch("core.downloader.requests.Session.get")
+def test_non_retryable_status_is_not_retried(mock_requests):
+    retry_policy = create_fake_retry_policy()
+    downloader = Downloader(retry_policy=retry_policy)
+
+    mock_requests.return_value = create_not_found_return_value()
+    got_ex = False
+    try:
+        downloader.fetch_url(FAKE_COOKIE, FAKE_URL, retries=5)
+
+    except RuntimeError:
+        got_ex = True
+
+    assert got_ex
+    assert mock_requests.call_count == 1
+    assert retry_policy.delays == []
+
+
+@patch("core.downloader.requests.Session.get")
+def test_server_error_is_raised_after_last_retry(mock_requests):
+    retry_policy = create_fake_retry_policy(base_secs=1)
+    downloader = Downloader(retry_policy=retry_policy)
+
+    mock_requests.return_value = create_too_many_requests_return_value()
+    got_ex = False
+    try:
+        downloader.fetch_url(FAKE_COOKIE, FAKE_URL, retries=3)
+
+    except RuntimeError:
+        got_ex = True
+
+    assert got_ex
+    assert mock_requests.call_count == 3
+    assert retry_policy.delays == [1.0, 2.0]
+
+
+@patch("core.downloader.requests.Session.get")
+def test_pages_cached_are_not_requested_again(mock_requests):
+    rate_limiter = Mock()
+    downloader = Downloader(
+        rate_limiter=rate_limiter, page_cache=PageCache(":memory:"))
+
+    mock_requests.return_value = Mock(
+        status_code=200, text="page", content=b"page", encoding="utf-8")
+    downloader.fetch_url(FAKE_COOKIE, FAKE_URL)
+    res = downloader.fetch_url(FAKE_COOKIE, FAKE_URL)
+
+    assert res.text == "page"
+    assert res.from_cache
+    mock_requests.assert_called_once()
+    rate_limiter.wait.assert_called_once_with(FAKE_URL)
+
+
+@patch("core.downloader.requests.Session.get")
+def test_failed_requests_are_not_cached(mock_requests):
+    page_cache = PageCache(":memory:")
+    downloader = Downloader(page_cache=page_cache)
+
+    mock_requests.return_value = create_not_found_return_value()
+    try:
+        downloader.fetch_url(FAKE_COOKIE, FAKE_URL)
+    except RuntimeError:
+        pass
+
+    assert page_cache.get(FAKE_URL) is None
+
+
+@patch("core.downloader.requests.Session.get")
+def test_metrics_record_attempts_retries_and_bytes_per_url_class(
+        mock_requests):
+    metrics = DownloadMetrics()
+    downloader = Downloader(
+        retry_policy=create_fake_retry_policy(), metrics=metrics)
+    about_url = "https://mbasic.facebook.com/mark/about"
+
+    mock_requests.side_effect = [
+        requests.exceptions.Timeout(),
+        Mock(status_code=503, text="Service Unavailable", content=b"",
+             headers={}, elapsed=datetime.timedelta(seconds=0.1)),
+        Mock(status_code=200, text="page", content=b"page",
+             elapsed=datetime.timedelta(seconds=0.1))
+    ]
+    downloader.fetch_url(FAKE_COOKIE, about_url, retries=3)
+
+    stats = metrics.get_stats()["about"]
+    assert stats["requests"] == 1
+    assert stats["attempts"] == 3
+    assert stats["timeouts"] == 1
+    assert stats["status_codes"] == {"503": 1, "200": 1}
+    assert stats["histograms"]["retries"]["buckets"]["2"] == 1
+    assert stats["histograms"]["retries"]["buckets"]["1"] == 0
+    assert stats["histograms"]["response_bytes"]["sum"] == 4
+
+
+@patch("core.downloader.requests.Session.get")
+def test_metrics_record_failed_requests_and_cache_hits(mock_requests):
+    metrics = DownloadMetrics()
+    downloader = Downloader(
+        page_cache=PageCache(":memory:"), metrics=metrics)
+
+    mock_requests.return_value = Mock(
+        status_code=404, text="Page not found", content=b"Page not found",
+        headers={}, elapsed=datetime.timedelta(seconds=0.1))
+    try:
+        downloader.fetch_url(FAKE_COOKIE, FAKE_URL)
+    except RuntimeError:
+        pass
+    mock_requests.return_value = Mock(
+        status_code=200, text="page", content=b"page", encoding="utf-8",
+        elapsed=datetime.timedelta(seconds=0.1))
+    downloader.fetch_url(FAKE_COOKIE, FAKE_URL + "/page")
+    downloader.fetch_url(FAKE_COOKIE, FAKE_URL + "/page")
+
+    stats = metrics.get_stats()["other"]
+    assert stats["requests"] == 3
+    assert stats["attempts"] == 2
+    assert stats["cache_hits"] == 1
+    assert stats["status_codes"] == {"404": 1, "200": 1}
+
+
+@patch("core.downloader.requests.Session.get")
+def test_metrics_record_requests_failing_without_response(mock_requests):
+    metrics = DownloadMetrics()
+    downloader = Downloader(
+        retry_policy=create_fake_retry_policy(), metrics=metrics)
+
+    mock_requests.side_effect = [
+        requests.exceptions.ConnectionError(),
+        requests.exceptions.ChunkedEncodingError()
+    ]
+    try:
+        downloader.fetch_url(FAKE_COOKIE, FAKE_URL, retries=3)
+        assert False, "Should have thrown"
+    except requests.exceptions.ChunkedEncodingError:
+        pass
+
+    stats = metrics.get_stats()["other"]
+    assert stats["requests"] == 1
+    assert stats["attempts"] == 2
+    assert stats["connection_errors"] == 1
+    assert stats["request_errors"] == 1
+    assert stats["histograms"]["retries"]["buckets"]["1"] == 1
@@ -1,12 +1,18 @@
 from core import common
+from core.downloader import DownloadError
 from core.facebook_fetcher import FacebookFetcher
 from core.facebook_soup_parser import ReactionResult, TimelineResult, \
     GenericResult
 from tests.mocks import create_mock_downloader, create_mock_facebook_parser
-from tests.fakes import create_ok_return_value, create_fake_config
+from tests.fakes import create_ok_return_value, create_fake_config, \
+    create_fake_fetch_url, create_fake_parse
 
 from collections import OrderedDict
+from datetime import datetime
 from nose.tools import assert_equal
+import itertools
+import requests
+import time
 from unittest.mock import call, Mock, ANY
 
 
@@ -269,6 +275,58 @@ def test_fetch_content_recursively_stops_when_all_links_explored():
             ])
 
 
+def test_fetch_content_recursively_fetches_every_page_once():
+
+    pages = {
+        "https://mbasic.facebook.com/likes": "content1",
+        "https://mbasic.facebook.com/likes?startindex=24&refid=17":
+            "content2",
+        "https://mbasic.facebook.com/music?refid=17": "content3"
+    }
+    parse = create_fake_parse({
+        "content1": GenericResult(
+            content=OrderedDict([
+                ('Music', OrderedDict([('band1/', 'Band 1')]))]),
+            see_more_links=[
+                '/music?refid=17', '/likes?startindex=24&refid=17']),
+        "content2": GenericResult(
+            content=OrderedDict([
+                ('Music', OrderedDict([('band2/', 'Band 2')]))]),
+            see_more_links=[
+                '/likes?refid=18', '/music?fref=none&refid=18',
+                '/likes?startindex=24']),
+        "content3": GenericResult(
+            content=OrderedDict([
+                ('Music', OrderedDict([('band3/', 'Band 3')]))]),
+            see_more_links=['/likes?startindex=24&refid=18'])
+    })
+
+    with create_mock_downloader() as mock_downloader:
+
+        with create_mock_facebook_parser() as mock_fb_parser:
+
+            fb_fetcher = FacebookFetcher(
+                mock_downloader, mock_fb_parser, create_fake_config())
+
+            mock_downloader.fetch_url.side_effect = \
+                create_fake_fetch_url(pages)
+
+            res = fb_fetcher.fetch_content_recursively(
+                "https://mbasic.facebook.com/likes", parse)
+
+            assert_equal(res, OrderedDict([
+                ('Music', OrderedDict([
+                    ('band1/', 'Band 1'), ('band2/', 'Band 2'),
+                    ('band3/', 'Band 3')]))]))
+            assert_equal(
+                [call[1]["url"]
+                    for call in mock_downloader.fetch_url.call_args_list],
+                ["https://mbasic.facebook.com/likes",
+                 "https://mbasic.facebook.com/likes?startindex=24&refid=17",
+                 "https://mbasic.facebook.com/music?refid=17"])
+            assert_equal(fb_fetcher.duplicate_links_skipped, 4)
+
+
 def test_fetch_content_recursively_is_resilient_to_downloader_exception():
 
     expected_urls = [
@@ -847,6 +905,92 @@ def test_fetch_user_infos_is_resilient_to_fb_parser_failure():
             ])
 
 
+def test_fetch_user_infos_with_workers_keeps_order_and_fallbacks():
+
+    user_refs = [110, 'paul', 'unknown', 111, 112]
+
+    pages = {
+        "https://mbasic.facebook.com/profile.php?v=info&id=110": "about110",
+        "https://mbasic.facebook.com/paul/about": "aboutPaul",
+        "https://mbasic.facebook.com/unknown/about": RuntimeError("Boom"),
+        "https://mbasic.facebook.com/profile.php?v=info&id=111": "about111",
+        "https://mbasic.facebook.com/profile.php?v=info&id=112": "about112",
+        "https://mbasic.facebook.com/profile.php?v=friends&id=110":
+            "friends110",
+        "https://mbasic.facebook.com/profile.php?v=friends&id=234":
+            "friends234",
+        "https://mbasic.facebook.com/profile.php?v=friends&id=112":
+            RuntimeError("Boom"),
+        "https://mbasic.facebook.com/profile.php?v=likes&id=110": "likes",
+        "https://mbasic.facebook.com/profile.php?v=likes&id=234": "likes",
+        "https://mbasic.facebook.com/profile.php?v=likes&id=112": "likes"
+    }
+
+    expected_infos = {
+        110: OrderedDict([
+            ('id', 110), ('name', 'Mark'),
+            ('friends', OrderedDict([('username1', {'name': 'Friend 1'})])),
+            ('friend_count', 1),
+            ('liked_pages', OrderedDict([
+                ('Music', OrderedDict([('band1/', 'Band 1')]))])),
+            ('liked_page_count', 1)]),
+        'paul': OrderedDict([
+            ('id', 234), ('name', 'Paul'),
+            ('friends', OrderedDict([('username2', {'name': 'Friend 2'})])),
+            ('friend_count', 1),
+            ('liked_pages', OrderedDict([
+                ('Music', OrderedDict([('band1/', 'Band 1')]))])),
+            ('liked_page_count', 1)]),
+        111: OrderedDict([('id', 111)]),
+        112: OrderedDict([
+            ('id', 112), ('name', 'John'),
+            ('friends', OrderedDict()),
+            ('friend_count', 0),
+            ('liked_pages', OrderedDict([
+                ('Music', OrderedDict([('band1/', 'Band 1')]))])),
+            ('liked_page_count', 1)])
+    }
+
+    with create_mock_downloader() as mock_downloader:
+
+        with create_mock_facebook_parser() as mock_fb_parser:
+
+            fb_fetcher = FacebookFetcher(
+                mock_downloader, mock_fb_parser, create_fake_config(),
+                workers=4)
+
+            mock_downloader.fetch_url.side_effect = \
+                create_fake_fetch_url(pages)
+            mock_fb_parser.parse_about_page.side_effect = create_fake_parse({
+                "about110": OrderedDict([('id', 110), ('name', 'Mark')]),
+                "aboutPaul": OrderedDict([('id', 234), ('name', 'Paul')]),
+                "about111": None,
+                "about112": OrderedDict([('id', 112), ('name', 'John')])
+            })
+            mock_fb_parser.parse_friends_page.side_effect = \
+                create_fake_parse({
+                    "friends110": GenericResult(
+                        content=OrderedDict([('friends', OrderedDict([
+                            ('username1?fref=fr_tab', 'Friend 1')]))]),
+                        see_more_links=[]),
+                    "friends234": GenericResult(
+                        content=OrderedDict([('friends', OrderedDict([
+                            ('username2?fref=fr_tab', 'Friend 2')]))]),
+                        see_more_links=[])
+                })
+            mock_fb_parser.parse_likes_page.side_effect = create_fake_parse({
+                "likes": GenericResult(
+                    content=OrderedDict([('Music', OrderedDict([
+                        ('band1/', 'Band 1')]))]),
+                    see_more_links=[])
+            })
+
+            res = fb_fetcher.fetch_user_infos(user_refs, True, True, False)
+
+            assert_equal(res, expected_infos)
+            assert_equal(list(res.keys()), [110, 'paul', 111, 112])
+
+
 def test_fetch_articles_from_timelines_visits_all_links():
 
     expected_urls = \
@@ -1117,11 +1261,11 @@ def test_fetch_likers_for_article_retries_5_times_while_decreasing_max_likes():
         "https://mbasic.facebook.com/ufi/reaction/profile/browser/fetch/?" +
         "limit=250&total_count=1000000&ft_ent_identifier=100",
         "https://mbasic.facebook.com/ufi/reaction/profile/browser/fetch/?" +
-        "limit=166&total_count=1000000&ft_ent_identifier=100",
-        "https://mbasic.facebook.com/ufi/reaction/profile/browser/fetch/?" +
         "limit=125&total_count=1000000&ft_ent_identifier=100",
         "https://mbasic.facebook.com/ufi/reaction/profile/browser/fetch/?" +
-        "limit=100&total_count=1000000&ft_ent_identifier=100"
+        "limit=62&total_count=1000000&ft_ent_identifier=100",
+        "https://mbasic.facebook.com/ufi/reaction/profile/browser/fetch/?" +
+        "limit=31&total_count=1000000&ft_ent_identifier=100"
     ]
 
     expected_likers = set([])
@@ -1134,7 +1278,7 @@ def test_fetch_likers_for_article_retries_5_times_while_decreasing_max_likes():
                 mock_downloader, mock_fb_parser, create_fake_config())
 
             mock_downloader.fetch_url.side_effect = \
-                [RuntimeError("Boom")] * len(expected_urls)
+                [DownloadError("Boom", 500)] * len(expected_urls)
 
             res = fb_fetcher.fetch_likers_for_article(100)
 
@@ -1156,11 +1300,11 @@ def test_fetch_likers_for_article_with_success_on_last_retry():
         "https://mbasic.facebook.com/ufi/reaction/profile/browser/fetch/?" +
         "limit=250&total_count=1000000&ft_ent_identifier=100",
         "https://mbasic.facebook.com/ufi/reaction/profile/browser/fetch/?" +
-        "limit=166&total_count=1000000&ft_ent_identifier=100",
-        "https://mbasic.facebook.com/ufi/reaction/profile/browser/fetch/?" +
         "limit=125&total_count=1000000&ft_ent_identifier=100",
         "https://mbasic.facebook.com/ufi/reaction/profile/browser/fetch/?" +
-        "limit=100&total_count=1000000&ft_ent_identifier=100"
+        "limit=62&total_count=1000000&ft_ent_identifier=100",
+        "https://mbasic.facebook.com/ufi/reaction/profile/browser/fetch/?" +
+        "limit=31&total_count=1000000&ft_ent_identifier=100"
     ]
 
     expected_likers = set(["username1", "username2"])
@@ -1174,7 +1318,7 @@ def test_fetch_likers_for_article_with_success_on_last_retry():
 
             fake_return_value = create_ok_return_value()
             mock_downloader.fetch_url.side_effect = \
-                [RuntimeError("Boom")] * (len(expected_urls) - 1) + \
+                [DownloadError("Boom", 500)] * (len(expected_urls) - 1) + \
                 [fake_return_value]
 
             mock_fb_parser.parse_reaction_page.side_effect = \
@@ -1210,13 +1354,13 @@ def test_fetch_likers_for_article_with_show_more_links_and_failure():
         "limit=250&shown_ids=1111%2C2222&total_count=4&" +
         "ft_ent_identifier=100",
         "https://mbasic.facebook.com/ufi/reaction/profile/browser/fetch/?" +
-        "limit=166&shown_ids=1111%2C2222&total_count=4&" +
+        "limit=125&shown_ids=1111%2C2222&total_count=4&" +
         "ft_ent_identifier=100",
         "https://mbasic.facebook.com/ufi/reaction/profile/browser/fetch/?" +
-        "limit=125&shown_ids=1111%2C2222&total_count=4&" +
+        "limit=62&shown_ids=1111%2C2222&total_count=4&" +
         "ft_ent_identifier=100",
         "https://mbasic.facebook.com/ufi/reaction/profile/browser/fetch/?" +
-        "limit=100&shown_ids=1111%2C2222&total_count=4&" +
+        "limit=31&shown_ids=1111%2C2222&total_count=4&" +
         "ft_ent_identifier=100",
     ]
 
@@ -1232,7 +1376,7 @@ def test_fetch_likers_for_article_with_show_more_links_and_failure():
             fake_return_value = create_ok_return_value()
             mock_downloader.fetch_url.side_effect = \
                 [fake_return_value] + \
-                [RuntimeError("Boom")] * (len(expected_urls) - 1)
+                [DownloadError("Boom", 500)] * (len(expected_urls) - 1)
 
             mock_fb_parser.parse_reaction_page.side_effect = \
                 [
@@ -1495,3 +1639,675 @@ def test_fetch_reactions_per_user_for_articles_can_exclude_non_users():
             ])
             mock_fb_parser.parse_reaction_page.assert_has_calls(
                 [call(fake_return_value.text)] * len(expected_urls))
+
+
+def test_iter_timeline_posts_yields_posts_as_pages_are_parsed():
+
+    pages = {
+        "https://mbasic.facebook.com/mark?v=timeline": "mainPage",
+        "https://mbasic.facebook.com/ShowMore1": "page1"
+    }
+
+    with create_mock_downloader() as mock_downloader:
+
+        with create_mock_facebook_parser() as mock_fb_parser:
+
+            fb_fetcher = FacebookFetcher(
+                mock_downloader, mock_fb_parser, create_fake_config())
+
+            mock_downloader.fetch_url.side_effect = \
+                create_fake_fetch_url(pages)
+            mock_fb_parser.parse_timeline_years_links.return_value = []
+            mock_fb_parser.parse_timeline_page.side_effect = \
+                create_fake_parse({
+                    "mainPage": TimelineResult(
+                        articles=OrderedDict([
+                            (100, OrderedDict([("someData", "1")])),
+                            (200, OrderedDict([("someData", "2")]))
+                        ]),
+                        show_more_link="/ShowMore1"),
+                    "page1": TimelineResult(
+                        articles=OrderedDict([
+                            (100, OrderedDict([("someData", "1-bis")]))
+                        ]),
+                        show_more_link="")
+                })
+
+            posts = fb_fetcher.iter_timeline_posts(["mark"])
+
+            assert_equal(
+                next(posts),
+                ("mark", 100, OrderedDict([
+                    ("someData", "1"), ("page", "mark")])))
+            assert_equal(mock_downloader.fetch_url.call_count, 1)
+
+            assert_equal(
+                [(post_id, post["someData"]) for _, post_id, post in posts],
+                [(200, "2"), (100, "1-bis")])
+            assert_equal(mock_downloader.fetch_url.call_count, 2)
+
+
+def test_iter_reactions_for_articles_reads_articles_lazily():
+
+    url = "https://mbasic.facebook.com/ufi/reaction/profile/browser/fetch/?" \
+          "limit=500&total_count=1000000&ft_ent_identifier={0}"
+    articles_read = []
+
+    def read_articles():
+        for post_id in [100, 200]:
+            articles_read.append(post_id)
+            yield OrderedDict([("post_id", post_id)])
+
+    with create_mock_downloader() as mock_downloader:
+
+        with create_mock_facebook_parser() as mock_fb_parser:
+
+            fb_fetcher = FacebookFetcher(
+                mock_downloader, mock_fb_parser, create_fake_config())
+
+            mock_downloader.fetch_url.side_effect = create_fake_fetch_url({
+                url.format(100): "reactions100",
+                url.format(200): "reactions200"
+            })
+            mock_fb_parser.parse_reaction_page.side_effect = \
+                create_fake_parse({
+                    "reactions100": ReactionResult(
+                        likers=["user1", "page1/", "user1"],
+                        see_more_link=None),
+                    "reactions200": ReactionResult(
+                        likers=["user2"], see_more_link=None)
+                })
+
+            reactions = fb_fetcher.iter_reactions_for_articles(
+                read_articles(), True)
+
+            assert_equal(
+                next(reactions), ("user1", OrderedDict([("post_id", 100)])))
+            assert_equal(articles_read, [100])
+
+            assert_equal(
+                list(reactions),
+                [("user2", OrderedDict([("post_id", 200)]))])
+            assert_equal(articles_read, [100, 200])
+
+
+def test_iter_reactions_for_articles_skips_invalid_articles():
+
+    url = "https://mbasic.facebook.com/ufi/reaction/profile/browser/fetch/?" \
+          "limit=500&total_count=1000000&ft_ent_identifier=200"
+
+    with create_mock_downloader() as mock_downloader:
+
+        with create_mock_facebook_parser() as mock_fb_parser:
+
+            fb_fetcher = FacebookFetcher(
+                mock_downloader, mock_fb_parser, create_fake_config())
+
+            mock_downloader.fetch_url.side_effect = create_fake_fetch_url({
+                url: "reactions200"
+            })
+            mock_fb_parser.parse_reaction_page.side_effect = \
+                create_fake_parse({
+                    "reactions200": ReactionResult(
+                        likers=["user2"], see_more_link=None)
+                })
+
+            articles = [100, {"id": 100}, {"post_id": 200}]
+            assert_equal(
+                list(fb_fetcher.iter_reactions_for_articles(articles, True)),
+                [("user2", {"post_id": 200})])
+            assert_equal(
+                fb_fetcher.fetch_reactions_per_user_for_articles(
+                    articles, True),
+                OrderedDict())
+
+
+def test_iter_user_friend_list_yields_every_friend_once():
+
+    pages = {
+        "https://mbasic.facebook.com/profile.php?v=friends&id=123": "page1",
+        "https://mbasic.facebook.com/friends?startindex=2": "page2"
+    }
+
+    with create_mock_downloader() as mock_downloader:
+
+        with create_mock_facebook_parser() as mock_fb_parser:
+
+            fb_fetcher = FacebookFetcher(
+                mock_downloader, mock_fb_parser, create_fake_config())
+
+            mock_downloader.fetch_url.side_effect = \
+                create_fake_fetch_url(pages)
+            mock_fb_parser.parse_friends_page.side_effect = \
+                create_fake_parse({
+                    "page1": GenericResult(
+                        content=OrderedDict([
+                            ('friends', OrderedDict([
+                                ('username1?fref=fr_tab', 'Mark'),
+                                ('username2?fref=fr_tab', 'Dave')]))]),
+                        see_more_links=["/friends?startindex=2"]),
+                    "page2": GenericResult(
+                        content=OrderedDict([
+                            ('friends', OrderedDict([
+                                ('username2?fref=fr_tab', 'Dave'),
+                                ('username3?fref=fr_tab', 'John')]))]),
+                        see_more_links=[])
+                })
+
+            assert_equal(
+                list(fb_fetcher.iter_user_friend_list()), [
+                    ('username1', {'name': 'Mark'}),
+                    ('username2', {'name': 'Dave'}),
+                    ('username3', {'name': 'John'})
+                ])
+
+
+def test_iter_timeline_pages_stops_the_crawl_when_stopped():
+
+    pages = {
+        "https://mbasic.facebook.com/mark?v=timeline": "mainPage",
+        "https://mbasic.facebook.com/ShowMore1": "page1",
+        "https://mbasic.facebook.com/Link1FromMainPage": "page2"
+    }
+
+    with create_mock_downloader() as mock_downloader:
+
+        with create_mock_facebook_parser() as mock_fb_parser:
+
+            fb_fetcher = FacebookFetcher(
+                mock_downloader, mock_fb_parser, create_fake_config())
+
+            mock_downloader.fetch_url.side_effect = \
+                create_fake_fetch_url(pages)
+            mock_fb_parser.parse_timeline_years_links.return_value = \
+                ["/Link1FromMainPage"]
+            mock_fb_parser.parse_timeline_page.side_effect = \
+                create_fake_parse({
+                    "mainPage": TimelineResult(
+                        articles=OrderedDict([
+                            (100, OrderedDict()), (200, OrderedDict())]),
+                        show_more_link="/ShowMore1"),
+                    "page1": TimelineResult(
+                        articles=OrderedDict([(300, OrderedDict())]),
+                        show_more_link=""),
+                    "page2": TimelineResult(
+                        articles=OrderedDict([(400, OrderedDict())]),
+                        show_more_link="")
+                })
+
+            first_pages = list(itertools.islice(
+                fb_fetcher.iter_timeline_pages(["mark"]), 2))
+
+            assert_equal(
+                [(user_ref, list(articles))
+                 for user_ref, articles in first_pages],
+                [("mark", [100, 200]), ("mark", [300])])
+            assert_equal(mock_downloader.fetch_url.call_count, 2)
+
+
+def test_iter_reaction_pages_yields_the_likers_of_every_page():
+
+    url = "https://mbasic.facebook.com/ufi/reaction/profile/browser/fetch/?" \
+          "limit=500&total_count=1000000&ft_ent_identifier=100"
+    see_more_url = \
+        "https://mbasic.facebook.com/ufi/reaction/profile/browser/fetch/?" \
+        "limit=500&shown_ids=1111&ft_ent_identifier=100"
+
+    with create_mock_downloader() as mock_downloader:
+
+        with create_mock_facebook_parser() as mock_fb_parser:
+
+            fb_fetcher = FacebookFetcher(
+                mock_downloader, mock_fb_parser, create_fake_config())
+
+            mock_downloader.fetch_url.side_effect = create_fake_fetch_url({
+                url: "reactions1",
+                see_more_url: "reactions2"
+            })
+            mock_fb_parser.parse_reaction_page.side_effect = \
+                create_fake_parse({
+                    "reactions1": ReactionResult(
+                        likers=["1111", "page1/"],
+                        see_more_link="/ufi/reaction/profile/browser/fetch/"
+                                      "?limit=10&shown_ids=1111&"
+                                      "ft_ent_identifier=100"),
+                    "reactions2": ReactionResult(
+                        likers=["1111", "2222"], see_more_link=None)
+                })
+
+            article = OrderedDict([("post_id", 100)])
+            reaction_pages = fb_fetcher.iter_reaction_pages([article], True)
+
+            assert_equal(next(reaction_pages), (article, ["1111"]))
+            assert_equal(mock_downloader.fetch_url.call_count, 1)
+            assert_equal(list(reaction_pages), [(article, ["2222"])])
+
+
+def test_iter_user_infos_with_workers_only_fetches_users_ahead():
+
+    user_refs = [110, 111, 112, 113, 114, 115]
+
+    with create_mock_downloader() as mock_downloader:
+
+        with create_mock_facebook_parser() as mock_fb_parser:
+
+            fb_fetcher = FacebookFetcher(
+                mock_downloader, mock_fb_parser, create_fake_config(),
+                workers=2)
+
+            mock_downloader.fetch_url.return_value = create_ok_return_value()
+            mock_fb_parser.parse_about_page.return_value = \
+                OrderedDict([('id', 110)])
+
+            user_infos = fb_fetcher.iter_user_infos(
+                user_refs, False, False, False)
+            assert_equal(next(user_infos)[0], 110)
+            user_infos.close()
+
+            # The first user and up to 2 users ahead of it
+            assert_equal(mock_downloader.fetch_url.call_count, 3)
+
+
+def test_fetch_reactions_remembers_and_grows_back_page_size():
+
+    first_page_url = \
+        "https://mbasic.facebook.com/ufi/reaction/profile/browser/fetch/?" \
+        "limit={0}&total_count=1000000&ft_ent_identifier={1}"
+    second_page_url = \
+        "https://mbasic.facebook.com/ufi/reaction/profile/browser/fetch/?" \
+        "limit={0}&shown_ids=1111&ft_ent_identifier=100"
+
+    pages = {
+        first_page_url.format(500, 100): DownloadError("Too large", 500),
+        first_page_url.format(250, 100): "reactions100",
+        second_page_url.format(312): "reactions100-2",
+        first_page_url.format(390, 200): "reactions200"
+    }
+
+    with create_mock_downloader() as mock_downloader:
+
+        with create_mock_facebook_parser() as mock_fb_parser:
+
+            fb_fetcher = FacebookFetcher(
+                mock_downloader, mock_fb_parser, create_fake_config())
+
+            mock_downloader.fetch_url.side_effect = \
+                create_fake_fetch_url(pages)
+            mock_fb_parser.parse_reaction_page.side_effect = \
+                create_fake_parse({
+                    "reactions100": ReactionResult(
+                        likers=["1111"],
+                        see_more_link="/ufi/reaction/profile/browser/fetch/"
+                                      "?limit=10&shown_ids=1111&"
+                                      "ft_ent_identifier=100"),
+                    "reactions100-2": ReactionResult(
+                        likers=["2222"], see_more_link=None),
+                    "reactions200": ReactionResult(
+                        likers=["3333"], see_more_link=None)
+                })
+
+            res = fb_fetcher.fetch_reactions_per_user_for_articles(
+                [{"post_id": 100}, {"post_id": 200}], False)
+
+            assert_equal(list(res), ["1111", "2222", "3333"])
+            assert_equal(
+                [call[1]["url"]
+                 for call in mock_downloader.fetch_url.call_args_list], [
+                    first_page_url.format(500, 100),
+                    first_page_url.format(250, 100),
+                    second_page_url.format(312),
+                    first_page_url.format(390, 200)
+                ])
+
+            stats = fb_fetcher.page_size_controller.get_stats()
+            assert_equal(
+                (stats["pages_fetched"], stats["failures"],
+                 stats["likers_found"], stats["page_size"]),
+                (3, 1, 3, 487))
+
+
+def test_fetch_reactions_decreases_page_size_when_a_page_fails_to_parse():
+
+    first_page_url = \
+        "https://mbasic.facebook.com/ufi/reaction/profile/browser/fetch/?" \
+        "limit={0}&total_count=1000000&ft_ent_identifier={1}"
+
+    pages = {
+        first_page_url.format(500, 100): "reactions100",
+        first_page_url.format(250, 200): "reactions200"
+    }
+
+    with create_mock_downloader() as mock_downloader:
+
+        with create_mock_facebook_parser() as mock_fb_parser:
+
+            fb_fetcher = FacebookFetcher(
+                mock_downloader, mock_fb_parser, create_fake_config())
+
+            mock_downloader.fetch_url.side_effect = \
+                create_fake_fetch_url(pages)
+            mock_fb_parser.parse_reaction_page.side_effect = \
+                create_fake_parse({
+                    # Truncated page
+                    "reactions100": None,
+                    "reactions200": ReactionResult(
+                        likers=["3333"], see_more_link=None)
+                })
+
+            res = fb_fetcher.fetch_reactions_per_user_for_articles(
+                [{"post_id": 100}, {"post_id": 200}], False)
+
+            assert_equal(list(res), ["3333"])
+            stats = fb_fetcher.page_size_controller.get_stats()
+            assert_equal(
+                (stats["pages_fetched"], stats["failures"],
+                 stats["likers_found"]),
+                (1, 1, 1))
+
+
+def test_fetch_reactions_keeps_page_size_after_timeouts():
+
+    url = "https://mbasic.facebook.com/ufi/reaction/profile/browser/fetch/?" \
+          "limit=500&total_count=1000000&ft_ent_identifier=100"
+
+    with create_mock_downloader() as mock_downloader:
+
+        with create_mock_facebook_parser() as mock_fb_parser:
+
+            fb_fetcher = FacebookFetcher(
+                mock_downloader, mock_fb_parser, create_fake_config())
+
+            mock_downloader.fetch_url.side_effect = [
+                requests.exceptions.Timeout(),
+                requests.exceptions.ConnectionError(),
+                create_ok_return_value("reactions100")
+            ]
+            mock_fb_parser.parse_reaction_page.return_value = \
+                ReactionResult(likers=["1111"], see_more_link=None)
+
+            res = fb_fetcher.fetch_likers_for_article(100)
+
+            assert_equal(res, set(["1111"]))
+            assert_equal(
+                [call[1]["url"]
+                 for call in mock_downloader.fetch_url.call_args_list],
+                [url] * 3)
+            assert_equal(
+                fb_fetcher.page_size_controller.get_stats()["failures"], 0)
+
+
+def test_fetch_reactions_per_user_for_articles_with_workers_keeps_order():
+
+    first_page_url = \
+        "https://mbasic.facebook.com/ufi/reaction/profile/browser/fetch/?" \
+        "limit=500&total_count=1000000&ft_ent_identifier={0}"
+    second_page_url = \
+        "https://mbasic.facebook.com/ufi/reaction/profile/browser/fetch/?" \
+        "limit=500&shown_ids=1&ft_ent_identifier={0}"
+    articles = [OrderedDict([("post_id", post_id)]) for post_id in range(6)]
+
+    pages = {}
+    reaction_results = {}
+    for post_id in range(6):
+        pages[first_page_url.format(post_id)] = "first{0}".format(post_id)
+        pages[second_page_url.format(post_id)] = "second{0}".format(post_id)
+        reaction_results["first{0}".format(post_id)] = ReactionResult(
+            likers=["user{0}".format(5 - post_id), "user9"],
+            see_more_link="/ufi/reaction/profile/browser/fetch/?limit=10&"
+                          "shown_ids=1&ft_ent_identifier={0}".format(post_id))
+        reaction_results["second{0}".format(post_id)] = ReactionResult(
+            likers=["user{0}".format(post_id)], see_more_link=None)
+
+    def fetch_reactions(workers):
+
+        with create_mock_downloader() as mock_downloader:
+
+            with create_mock_facebook_parser() as mock_fb_parser:
+
+                fb_fetcher = FacebookFetcher(
+                    mock_downloader, mock_fb_parser, create_fake_config(),
+                    workers=workers)
+
+                fetch_url = create_fake_fetch_url(pages)
+
+                def slow_first_article(cookie, url, timeout_secs, retries):
+                    if url.endswith("ft_ent_identifier=0"):
+                        time.sleep(0.05)
+                    return fetch_url(cookie, url, timeout_secs, retries)
+
+                mock_downloader.fetch_url.side_effect = slow_first_article
+                mock_fb_parser.parse_reaction_page.side_effect = \
+                    create_fake_parse(reaction_results)
+
+                return fb_fetcher.fetch_reactions_per_user_for_articles(
+                    articles, False)
+
+    expected_reactions = fetch_reactions(workers=1)
+    res = fetch_reactions(workers=4)
+
+    assert_equal(list(res.items()), list(expected_reactions.items()))
+    assert_equal(len(res["user9"]["likes"]), 6)
+
+
+def test_fetch_articles_from_timeline_with_workers_keeps_order():
+
+    pages = {
+        "https://mbasic.facebook.com/mark?v=timeline": "mainPage",
+        "https://mbasic.facebook.com/ShowMoreFromMainPage-Link1": "page1",
+        "https://mbasic.facebook.com/Link1FromMainPage": "page2",
+        "https://mbasic.facebook.com/ShowMoreFromLink1-1": "page3",
+        "https://mbasic.facebook.com/Link2FromMainPage": "page4",
+        "https://mbasic.facebook.com/ShowMoreFromLink2-1": "page5",
+        "https://mbasic.facebook.com/Link3FromMainPage": RuntimeError("Boom"),
+        "https://mbasic.facebook.com/Link4FromMainPage": "page6",
+        "https://mbasic.facebook.com/profile.php?id=111&v=timeline":
+            "mainPage111"
+    }
+
+    def create_result(post_ids, show_more_link=""):
+        return TimelineResult(
+            articles=OrderedDict([
+                (post_id, OrderedDict([("someData", str(post_id))]))
+                for post_id in post_ids]),
+            show_more_link=show_more_link)
+
+    timeline_results = {
+        "mainPage": create_result(
+            [100, 200], "/ShowMoreFromMainPage-Link1"),
+        # Same post returned twice, e.g. album updated
+        "page1": create_result([300, 500]),
+        "page2": create_result([400], "/ShowMoreFromLink1-1"),
+        "page3": create_result([500, 600]),
+        "page4": None,
+        "page5": create_result([700]),
+        "page6": create_result([800, 100]),
+        "mainPage111": create_result([900])
+    }
+
+    def fetch_timeline(workers):
+
+        with create_mock_downloader() as mock_downloader:
+
+            with create_mock_facebook_parser() as mock_fb_parser:
+
+                fb_fetcher = FacebookFetcher(
+                    mock_downloader, mock_fb_parser, create_fake_config(),
+                    workers=workers)
+
+                fetch_url = create_fake_fetch_url(pages)
+
+                def slow_first_chain(cookie, url, timeout_secs, retries):
+                    if "ShowMoreFromMainPage" in url:
+                        time.sleep(0.05)
+                    return fetch_url(cookie, url, timeout_secs, retries)
+
+                mock_downloader.fetch_url.side_effect = slow_first_chain
+                mock_fb_parser.parse_timeline_years_links.side_effect = \
+                    lambda content: [
+                        "/Link1FromMainPage", "/Link2FromMainPage",
+                        "/Link3FromMainPage", "/Link4FromMainPage"] \
+                    if content == "mainPage" else []
+                mock_fb_parser.parse_timeline_page.side_effect = \
+                    create_fake_parse(timeline_results)
+
+                return fb_fetcher.fetch_articles_from_timeline(
+                    ["mark", 111])
+
+    expected_articles = fetch_timeline(workers=1)
+    res = fetch_timeline(workers=3)
+
+    assert_equal(res, expected_articles)
+    assert_equal(
+        list(res["mark"]["posts"]), [100, 200, 300, 500, 400, 600, 800])
+    assert_equal(list(res[111]["posts"]), [900])
+
+
+def test_iter_timeline_pages_with_workers_stops_running_chains():
+
+    def fetch_url(cookie, url, timeout_secs, retries):
+        time.sleep(0.01)
+        return create_ok_return_value(url.rsplit("/", 1)[-1])
+
+    def parse_timeline_page(content):
+        # The chain of the year links every page to the next one, up to the
+        # page 100, the show more chain of the first page is a single page
+        show_more_link = ""
+        if content == "mark?v=timeline":
+            show_more_link = "/ShowMore"
+        elif content.startswith("Year-") and int(content[5:]) < 100:
+            show_more_link = "/Year-{0}".format(int(content[5:]) + 1)
+        return TimelineResult(
+            articles=OrderedDict([(content, OrderedDict())]),
+            show_more_link=show_more_link)
+
+    with create_mock_downloader() as mock_downloader:
+
+        with create_mock_facebook_parser() as mock_fb_parser:
+
+            fb_fetcher = FacebookFetcher(
+                mock_downloader, mock_fb_parser, create_fake_config(),
+                workers=2)
+
+            mock_downloader.fetch_url.side_effect = fetch_url
+            mock_fb_parser.parse_timeline_years_links.return_value = \
+                ["/Year-1"]
+            mock_fb_parser.parse_timeline_page.side_effect = \
+                parse_timeline_page
+
+            pages = fb_fetcher.iter_timeline_pages(["mark"])
+            assert_equal(list(next(pages)[1]), ["mark?v=timeline"])
+            assert_equal(list(next(pages)[1]), ["ShowMore"])
+            pages.close()
+
+            # The chain of the year stopped instead of following its show
+            # more links
+            assert mock_downloader.fetch_url.call_count < 10
+
+
+def create_dated_post(post_id, date, like_count=0):
+    return OrderedDict([
+        ("post_id", post_id), ("date", date), ("like_count", like_count)])
+
+
+def test_fetch_articles_from_timeline_stops_at_known_posts():
+
+    pages = {
+        "https://mbasic.facebook.com/mark?v=timeline": "mainPage",
+        "https://mbasic.facebook.com/ShowMore1": "page1",
+        "https://mbasic.facebook.com/ShowMore2": "page2"
+    }
+    known_articles = {
+        "mark": {"posts": {
+            "200": create_dated_post(200, "2008-05-12 10:00:00", 1),
+            "300": create_dated_post(300, "2008-05-11 10:00:00", 1),
+            "400": create_dated_post(400, "2008-05-10 10:00:00", 1)}}}
+
+    with create_mock_downloader() as mock_downloader:
+
+        with create_mock_facebook_parser() as mock_fb_parser:
+
+            fb_fetcher = FacebookFetcher(
+                mock_downloader, mock_fb_parser, create_fake_config())
+
+            mock_downloader.fetch_url.side_effect = \
+                create_fake_fetch_url(pages)
+            mock_fb_parser.parse_timeline_page.side_effect = \
+                create_fake_parse({
+                    "mainPage": TimelineResult(
+                        articles=OrderedDict([
+                            (100, create_dated_post(
+                                100, "2008-05-13 10:00:00")),
+                            (200, create_dated_post(
+                                200, "2008-05-12 10:00:00", 2))]),
+                        show_more_link="/ShowMore1"),
+                    "page1": TimelineResult(
+                        articles=OrderedDict([
+                            (300, create_dated_post(
+                                300, "2008-05-11 10:00:00", 2))]),
+                        show_more_link="/ShowMore2")
+                })
+
+            res = fb_fetcher.fetch_articles_from_timeline(
+                ["mark"], known_articles=known_articles,
+                refresh_since=datetime(2008, 5, 12))
+
+            # The years of the timeline are not explored, the crawl stops
+            # after page1 whose posts are known and older than 2008-05-12
+            mock_fb_parser.parse_timeline_years_links.assert_not_called()
+            assert_equal(mock_downloader.fetch_url.call_count, 2)
+
+            assert_equal(list(res["mark"]["posts"]), [100, 200, 300, 400])
+            assert_equal(
+                [post["like_count"] for post in res["mark"]["posts"].values()],
+                [0, 2, 2, 1])
+
+
+def test_iter_timeline_posts_refreshes_known_posts_of_the_refresh_window():
+
+    pages = {
+        "https://mbasic.facebook.com/mark?v=timeline": "mainPage",
+        "https://mbasic.facebook.com/ShowMore1": "page1",
+        "https://mbasic.facebook.com/ShowMore2": "page2"
+    }
+    known_articles = {
+        "mark": {"posts": OrderedDict(
+            (str(post_id), create_dated_post(post_id, date))
+            for post_id, date in [(100, "2008-05-13 10:00:00"),
+                                  (200, "2008-05-12 10:00:00"),
+                                  (300, "2008-05-11 10:00:00")])}}
+
+    with create_mock_downloader() as mock_downloader:
+
+        with create_mock_facebook_parser() as mock_fb_parser:
+
+            fb_fetcher = FacebookFetcher(
+                mock_downloader, mock_fb_parser, create_fake_config())
+
+            mock_downloader.fetch_url.side_effect = \
+                create_fake_fetch_url(pages)
+            mock_fb_parser.parse_timeline_page.side_effect = \
+                create_fake_parse({
+                    "mainPage": TimelineResult(
+                        articles=OrderedDict([
+                            (100, create_dated_post(
+                                100, "2008-05-13 10:00:00"))]),
+                        show_more_link="/ShowMore1"),
+                    "page1": TimelineResult(
+                        articles=OrderedDict([
+                            (200, create_dated_post(
+                                200, "2008-05-12 10:00:00"))]),
+                        show_more_link="/ShowMore2"),
+                    "page2": TimelineResult(
+                        articles=OrderedDict([
+                            (300, create_dated_post(
+                                300, "2008-05-11 10:00:00"))]),
+                        show_more_link="/ShowMore3")
+                })
+
+            posts = fb_fetcher.iter_timeline_posts(
+                ["mark"], known_articles=known_articles,
+                refresh_since=datetime(2008, 5, 12))
+
+            assert_equal(
+                [post_id for _, post_id, _ in posts], [100, 200, 300])
+            assert_equal(mock_downloader.fetch_url.call_count, 3)
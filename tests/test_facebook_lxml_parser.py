@@ -0,0 +1,63 @@
+from core import facebook_lxml_parser
+from core import facebook_soup_parser
+from core.facebook_lxml_parser import FacebookLxmlParser
+
+from nose.tools import assert_equal
+import doctest
+
+
+def create_lxml_doctests():
+    """ Return the doctests of FacebookSoupParser, run on
+    FacebookLxmlParser instead."""
+
+    tests = []
+    finder = doctest.DocTestFinder()
+    parser = doctest.DocTestParser()
+    for test in finder.find(facebook_soup_parser.FacebookSoupParser):
+        method_name = test.name.split(".")[-1]
+        if not test.examples or not method_name.startswith("parse_") or \
+           method_name == "parse_document":
+            continue
+        # Posts are passed as the article element of a full document
+        docstring = test.docstring. \
+            replace("FacebookSoupParser()", "FacebookLxmlParser()"). \
+            replace("BeautifulSoup(", "find(create_document("). \
+            replace(", 'lxml'))", "), '//article'))")
+        globs = dict(vars(facebook_lxml_parser))
+        tests.append(parser.get_doctest(
+            docstring, globs, test.name.replace("Soup", "Lxml"),
+            test.filename, test.lineno))
+    return tests
+
+
+def test_lxml_parser_passes_soup_parser_doctests():
+
+    runner = doctest.DocTestRunner()
+    tests = create_lxml_doctests()
+    for test in tests:
+        runner.run(test)
+
+    assert tests
+    assert_equal(runner.summarize(verbose=False).failed, 0)
+
+
+def test_lxml_parser_returns_plain_strings():
+
+    result = FacebookLxmlParser().parse_friends_page('''
+        <div id="objects_container">
+            <a href="/username1?fref=fr_tab">Mark</a>
+        </div>''')
+
+    for link, name in result.content["friends"].items():
+        assert_equal(type(link), str)
+        assert_equal(type(name), str)
+
+
+def test_lxml_parser_reuses_document_of_last_page():
+
+    fb_parser = FacebookLxmlParser()
+    document = fb_parser.parse_document("<p>1</p>")
+
+    assert_equal(fb_parser.parse_document("<p>1</p>") is document, True)
+    assert_equal(fb_parser.parse_document(document) is document, True)
+    assert_equal(fb_parser.parse_document("<p>2</p>") is document, False)
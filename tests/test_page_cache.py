@@ -0,0 +1,149 @@
+from core.page_cache import PageCache
+
+from nose.tools import assert_equal
+import os
+import tempfile
+
+TIMELINE_URL = "https://mbasic.facebook.com/mark?v=timeline"
+ABOUT_URL = "https://mbasic.facebook.com/mark/about"
+BUDDY_FEED_URL = "https://5-edge-chat.facebook.com/pull?channel=p_123"
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1546300800.0
+
+    def time(self):
+        return self.now
+
+
+def test_pages_are_stored_compressed_and_returned_as_downloaded():
+
+    for compression in ["zlib", "lzma"]:
+        cache = PageCache(":memory:", compression=compression)
+        content = "<html>{0}</html>".format("Posts é " * 1000).encode()
+
+        cache.put(TIMELINE_URL, content, "utf-8")
+        page = cache.get(TIMELINE_URL)
+
+        assert_equal(page.content, content)
+        assert_equal(page.text, content.decode())
+        assert_equal(page.status_code, 200)
+        assert cache.get_stats()["bytes_stored"] < len(content) / 10
+
+
+def test_identical_pages_are_stored_once():
+
+    cache = PageCache(":memory:")
+
+    cache.put(TIMELINE_URL, b"<html>Same page</html>")
+    stored_bytes = cache.get_stats()["bytes_stored"]
+    cache.put(ABOUT_URL, b"<html>Same page</html>")
+
+    assert_equal(cache.get_stats()["bytes_stored"], stored_bytes)
+    assert_equal(cache.get(ABOUT_URL).content, b"<html>Same page</html>")
+
+
+def test_pages_least_recently_used_are_evicted():
+
+    clock = FakeClock()
+    cache = PageCache(
+        ":memory:", max_bytes=2500, compression="zlib", clock=clock.time)
+    urls = [TIMELINE_URL + "&page={0}".format(page_no)
+            for page_no in range(3)]
+
+    for page_no, url in enumerate(urls):
+        clock.now += 1
+        # Random bytes do not compress
+        cache.put(url, os.urandom(1000))
+        if page_no == 1:
+            clock.now += 1
+            cache.get(urls[0])
+
+    assert cache.get(urls[0])
+    assert not cache.get(urls[1])
+    assert cache.get(urls[2])
+    assert_equal(cache.get_stats()["evictions"], 1)
+
+
+def test_pages_expire_after_the_ttl_of_their_url_class():
+
+    clock = FakeClock()
+    cache = PageCache(
+        ":memory:", default_ttl=0, ttls={"timeline": 60},
+        clock=clock.time)
+    past_year_url = TIMELINE_URL + "&timeend=1451606399&timestart=1420070400"
+
+    for url in [TIMELINE_URL, ABOUT_URL, past_year_url]:
+        cache.put(url, b"<html>Page</html>")
+    assert not cache.put(BUDDY_FEED_URL, b"{}")
+
+    clock.now += 3 * 24 * 3600 - 1
+    assert not cache.get(TIMELINE_URL)
+    assert cache.get(ABOUT_URL)
+    assert cache.get(past_year_url)
+
+    clock.now += 2
+    assert not cache.get(ABOUT_URL)
+    assert cache.get(past_year_url)
+
+
+def test_default_ttls_are_shortened_to_default_ttl():
+
+    clock = FakeClock()
+    cache = PageCache(
+        ":memory:", default_ttl=3600, ttls={"timeline": 7200},
+        clock=clock.time)
+    past_year_url = TIMELINE_URL + "&timeend=1451606399&timestart=1420070400"
+
+    for url in [TIMELINE_URL, ABOUT_URL, past_year_url]:
+        cache.put(url, b"<html>Page</html>")
+
+    clock.now += 3601
+    assert not cache.get(ABOUT_URL)
+    assert cache.get(TIMELINE_URL)
+    assert cache.get(past_year_url)
+
+
+def test_reaction_pages_are_found_whatever_their_page_size():
+
+    cache = PageCache(":memory:")
+    reaction_url = \
+        "https://mbasic.facebook.com/ufi/reaction/profile/browser/fetch/?" \
+        "limit={0}&total_count=1000000&ft_ent_identifier=100"
+
+    cache.put(reaction_url.format(500), b"<html>Likers</html>")
+
+    assert_equal(
+        cache.get(reaction_url.format(250)).content, b"<html>Likers</html>")
+
+
+def test_pages_are_kept_across_runs():
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "page_cache.sqlite")
+
+        cache = PageCache(path)
+        cache.put(TIMELINE_URL + "&refid=17", b"<html>Posts</html>")
+        cache.close()
+
+        cache = PageCache(path)
+        assert_equal(cache.get(TIMELINE_URL).content, b"<html>Posts</html>")
+        cache.close()
+
+
+def test_stats_count_hits_misses_and_bytes_saved():
+
+    cache = PageCache(":memory:")
+
+    cache.get(TIMELINE_URL)
+    cache.put(TIMELINE_URL, b"<html>Posts</html>")
+    cache.get(TIMELINE_URL)
+    cache.get(TIMELINE_URL)
+
+    stats = cache.get_stats()
+    assert_equal(
+        (stats["hits"], stats["misses"], stats["stores"],
+         stats["bytes_saved"]),
+        (2, 1, 1, 36))
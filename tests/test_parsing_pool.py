@@ -0,0 +1,79 @@
+from core.facebook_lxml_parser import FacebookLxmlParser
+from core.facebook_soup_parser import FacebookSoupParser
+from core.parsing_pool import ProcessPoolParser
+
+from nose.tools import assert_equal
+
+TIMELINE_PAGE = '''
+    <div id="tlFeed">
+        <article>
+            <div><a href="/username1?refid=18">User 1</a></div>
+            <div data-ft="foo">
+                <abbr>13 May 2008 at 10:02</abbr>
+                <span id="like_151"></span>
+            </div>
+        </article>
+        <a href="link1">2010</a>
+        <div><a href="/show_more_link">Show more</a></div>
+    </div>'''
+
+REACTION_PAGE = '''
+    <div id="objects_container">
+        <a class="bn" href="/username1">Mark</a>
+        <a class="bn" href="/username2">Paul</a>
+        <div><a href="/ufi/reaction/link"><span>See more</span></a></div>
+    </div>'''
+
+FRIENDS_PAGE = '''
+    <div id="objects_container">
+        <a href="/username1?fref=fr_tab&amp;foo">Mark</a>
+        <div id="m_more_friends"><a href="/seeMoreLink">More</a></div>
+    </div>'''
+
+
+def check_same_results_as_parser(parser_class):
+
+    fb_parser = parser_class()
+    pool_parser = ProcessPoolParser(parser_class, processes=2)
+    try:
+        assert_equal(
+            pool_parser.parse_timeline_page(TIMELINE_PAGE),
+            fb_parser.parse_timeline_page(TIMELINE_PAGE))
+        assert_equal(
+            pool_parser.parse_timeline_years_links(TIMELINE_PAGE),
+            ['link1'])
+        assert_equal(
+            pool_parser.parse_timeline_first_page(TIMELINE_PAGE),
+            (['link1'], fb_parser.parse_timeline_page(TIMELINE_PAGE)))
+        assert_equal(
+            pool_parser.parse_reaction_page(REACTION_PAGE),
+            fb_parser.parse_reaction_page(REACTION_PAGE))
+        assert_equal(
+            pool_parser.parse_friends_page(FRIENDS_PAGE),
+            fb_parser.parse_friends_page(FRIENDS_PAGE))
+        assert_equal(pool_parser.parse_reaction_page(""), None)
+    finally:
+        pool_parser.shutdown()
+
+
+def test_process_pool_parser_returns_same_results_as_soup_parser():
+    check_same_results_as_parser(FacebookSoupParser)
+
+
+def test_process_pool_parser_returns_same_results_as_lxml_parser():
+    check_same_results_as_parser(FacebookLxmlParser)
+
+
+def test_process_pool_parser_parses_submitted_pages_concurrently():
+
+    pool_parser = ProcessPoolParser(FacebookSoupParser, processes=2)
+    try:
+        futures = [
+            pool_parser.submit("parse_reaction_page", REACTION_PAGE)
+            for _ in range(10)]
+
+        for future in futures:
+            assert_equal(
+                future.result().likers, ['username1', 'username2'])
+    finally:
+        pool_parser.shutdown()
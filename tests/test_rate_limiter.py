@@ -0,0 +1,74 @@
+from core.rate_limiter import RateLimiter, TokenBucket
+
+from concurrent.futures import ThreadPoolExecutor
+from nose.tools import assert_equal
+import threading
+
+
+class FakeClock:
+    """ Time only passes when sleeping."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.lock = threading.Lock()
+
+    def time(self):
+        with self.lock:
+            return self.now
+
+    def sleep(self, secs):
+        with self.lock:
+            self.now += secs
+
+
+def test_token_bucket_allows_bursts_then_requests_per_sec():
+
+    clock = FakeClock()
+    bucket = TokenBucket(
+        requests_per_sec=4, burst=2, clock=clock.time, sleep=clock.sleep)
+
+    waits = [bucket.acquire() for _ in range(6)]
+
+    assert_equal(waits, [0.0, 0.0, 0.25, 0.25, 0.25, 0.25])
+    assert_equal(clock.now, 1.0)
+
+
+def test_concurrent_requests_wait_in_turn():
+
+    bucket = TokenBucket(requests_per_sec=10, burst=1, clock=lambda: 0.0)
+
+    with ThreadPoolExecutor(8) as executor:
+        waits = sorted(executor.map(lambda _: bucket.reserve(), range(8)))
+
+    # Every request reserved its own token, none of them was given twice
+    assert_equal([round(wait, 1) for wait in waits],
+                 [0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7])
+
+
+def test_rate_limiter_limits_url_classes_independently():
+
+    clock = FakeClock()
+    rate_limiter = RateLimiter({
+        "reactions": {"requests_per_sec": 1},
+        "about": {"requests_per_sec": 0.5, "burst": 2}
+    }, clock=clock.time, sleep=clock.sleep)
+
+    reactions_url = "https://mbasic.facebook.com/ufi/reaction/profile/" \
+        "browser/fetch/?limit=500&ft_ent_identifier=1"
+    about_url = "https://mbasic.facebook.com/mark/about"
+    friends_url = "https://mbasic.facebook.com/profile.php?v=friends&id=1"
+
+    assert_equal(rate_limiter.wait(reactions_url), 0.0)
+    assert_equal(rate_limiter.wait(about_url), 0.0)
+    assert_equal(rate_limiter.wait(about_url), 0.0)
+    assert_equal(rate_limiter.wait(reactions_url), 1.0)
+    assert_equal(rate_limiter.wait(friends_url), 0.0)
+    # 1s passed while waiting, the token of the next about page is 1s away
+    assert_equal(rate_limiter.wait(about_url), 1.0)
+
+    stats = rate_limiter.get_stats()
+    assert_equal(list(stats), ["reactions", "about", "other"])
+    assert_equal(
+        [(url_class, s["requests"], s["waits"], s["wait_secs"])
+         for url_class, s in stats.items()],
+        [("reactions", 2, 1, 1.0), ("about", 3, 1, 1.0), ("other", 1, 0, 0.0)])